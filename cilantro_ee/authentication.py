@@ -15,6 +15,26 @@ DEFAULT_DIR = pathlib.Path.home() / CERT_DIR
 DEFAULT_DOMAIN = '*'
 
 
+class CredentialsProvider:
+    # In memory allow list for ZMQ curve authentication. Keys are z85 encoded curve25519 public keys, which is the form
+    # the authenticator hands to callback.
+    def __init__(self):
+        self.keys = set()
+
+    def callback(self, domain, key):
+        return key in self.keys
+
+
+def curve_key_for(vk: str):
+    # Returns None if the VK is not within the possibility space of the ED25519 algorithm
+    try:
+        pk = crypto_sign_ed25519_pk_to_curve25519(bytes.fromhex(vk))
+    except RuntimeError:
+        return None
+
+    return z85.encode(pk)
+
+
 class SocketAuthenticator:
     def __init__(self, client: ContractingClient, ctx: zmq.asyncio.Context, bootnodes: dict={},
                  loop=asyncio.get_event_loop(), domain='*', cert_dir=CERT_DIR, debug=False):
@@ -36,6 +56,10 @@ class SocketAuthenticator:
 
         self.bootnodes = bootnodes
 
+        # VK -> z85 curve key of everyone currently allowed to connect
+        self.keys = {}
+        self.credentials = CredentialsProvider()
+
         # This should throw an exception if the socket already exist
         try:
             self.authenticator = AsyncioAuthenticator(context=self.ctx, loop=self.loop)
@@ -48,7 +72,7 @@ class SocketAuthenticator:
             for node in bootnodes.keys():
                 self.add_verifying_key(node)
 
-            self.authenticator.configure_curve(domain=self.domain, location=self.cert_dir)
+            self.configure()
 
     def refresh_governance_sockets(self):
         masternode_list = self.client.get_var(
@@ -63,35 +87,54 @@ class SocketAuthenticator:
             arguments=['members']
         )
 
-        self.flush_all_keys()
+        members = set(masternode_list) | set(delegate_list)
+        current = set(self.keys.keys())
 
-        for mn in masternode_list:
-            self.add_verifying_key(mn)
+        # Membership rarely changes, so most blocks stop here
+        if members == current:
+            return
 
-        for dl in delegate_list:
-            self.add_verifying_key(dl)
+        for vk in current - members:
+            self.remove_verifying_key(vk)
 
-        self.log.info(f'Refreshing keys for {len(masternode_list)} masters and {len(delegate_list)} delegates.')
+        for vk in members - current:
+            self.add_verifying_key(vk)
 
-        self.authenticator.configure_curve(domain=self.domain, location=self.cert_dir)
+        self.log.info(f'Refreshing keys for {len(masternode_list)} masters and {len(delegate_list)} delegates. '
+                      f'{len(members - current)} added, {len(current - members)} removed.')
 
     def add_verifying_key(self, vk: str):
-        # Convert to bytes if hex string
-        bvk = bytes.fromhex(vk)
+        zvk = curve_key_for(vk)
 
-        try:
-            pk = crypto_sign_ed25519_pk_to_curve25519(bvk)
-        # Error is thrown if the VK is not within the possibility space of the ED25519 algorithm
-        except RuntimeError:
+        if zvk is None:
             self.log.error('ED25519 Cryptographic error. The key provided is not within the cryptographic key space.')
             return
 
-        zvk = z85.encode(pk).decode('utf-8')
-        _write_key_file(self.cert_dir / f'{vk}.key', banner=_cert_public_banner, public_key=zvk)
+        self.keys[vk] = zvk
+        self.credentials.keys.add(zvk)
+
+        # The router still reads public keys from disk when connecting out. The file for a VK never changes, so it is
+        # only written once.
+        path = self.cert_dir / f'{vk}.key'
+        if not path.exists():
+            _write_key_file(path, banner=_cert_public_banner, public_key=zvk.decode('utf-8'))
+
+    def remove_verifying_key(self, vk: str):
+        zvk = self.keys.pop(vk, None)
+        if zvk is not None:
+            self.credentials.keys.discard(zvk)
+
+        try:
+            (self.cert_dir / f'{vk}.key').unlink()
+        except FileNotFoundError:
+            pass
 
     def flush_all_keys(self):
+        self.keys.clear()
+        self.credentials.keys.clear()
+
         shutil.rmtree(str(self.cert_dir))
         self.cert_dir.mkdir(parents=True, exist_ok=True)
 
     def configure(self):
-        self.authenticator.configure_curve(domain=self.domain, location=self.cert_dir)
+        self.authenticator.configure_curve_callback(domain=self.domain, credentials_provider=self.credentials)
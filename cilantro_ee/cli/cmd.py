@@ -40,6 +40,9 @@ def setup_cilparser(parser):
     start_parser.add_argument('-wp', '--webserver_port', type=int, default=18080)
     start_parser.add_argument('-p', '--pid', type=int, default=-1)
     start_parser.add_argument('-b', '--bypass_catchup', type=bool, default=False)
+    start_parser.add_argument('--metrics_port', type=int, default=None)
+    start_parser.add_argument('--profile_contracts', action='store_true')
+    start_parser.add_argument('--settle_every', type=int, default=1)
 
     flush_parser = subparser.add_parser('flush')
     flush_parser.add_argument('storage_type', type=str)
@@ -50,6 +53,9 @@ def setup_cilparser(parser):
     join_parser.add_argument('-m', '--mn_seed', type=str)
     join_parser.add_argument('-mp', '--mn_seed_port', type=int, default=18080)
     join_parser.add_argument('-wp', '--webserver_port', type=int, default=18080)
+    join_parser.add_argument('--metrics_port', type=int, default=None)
+    join_parser.add_argument('--profile_contracts', action='store_true')
+    join_parser.add_argument('--settle_every', type=int, default=1)
 
     return True
 
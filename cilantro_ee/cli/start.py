@@ -140,7 +140,8 @@ def start_node(args):
             constitution=const,
             webserver_port=args.webserver_port,
             bypass_catchup=args.bypass_catchup,
-            node_type=args.node_type
+            node_type=args.node_type,
+            settle_every=args.settle_every
         )
     elif args.node_type == 'delegate':
         n = Delegate(
@@ -150,7 +151,10 @@ def start_node(args):
             bootnodes=bootnodes,
             constitution=const,
             bypass_catchup=args.bypass_catchup,
-            node_type=args.node_type
+            node_type=args.node_type,
+            metrics_port=args.metrics_port,
+            profile_contracts=args.profile_contracts,
+            settle_every=args.settle_every
         )
 
     loop = asyncio.get_event_loop()
@@ -196,7 +200,8 @@ def join_network(args):
             webserver_port=args.webserver_port,
             bootnodes=bootnodes,
             seed=mn_seed,
-            node_type=args.node_type
+            node_type=args.node_type,
+            settle_every=args.settle_every
         )
     elif args.node_type == 'delegate':
         start_mongo()
@@ -207,7 +212,10 @@ def join_network(args):
             constitution=const,
             bootnodes=bootnodes,
             seed=mn_seed,
-            node_type=args.node_type
+            node_type=args.node_type,
+            metrics_port=args.metrics_port,
+            profile_contracts=args.profile_contracts,
+            settle_every=args.settle_every
         )
 
     loop = asyncio.get_event_loop()
@@ -5,6 +5,7 @@ import hashlib
 
 from contracting.db.encoder import encode
 
+from cilantro_ee.crypto.merkle import MerkleTree
 from cilantro_ee.logger.base import get_logger
 
 log = get_logger('CANON')
@@ -34,32 +35,12 @@ def tx_hash_from_tx(tx):
 
 
 def merklize(leaves):
-    # Make space for the parent hashes
-    nodes = [None for _ in range(len(leaves) - 1)]
-
-    # Hash all leaves so that all data is same length
-    for l in leaves:
-        h = hashlib.sha3_256()
-        h.update(l)
-        nodes.append(h.digest())
-
-    # Hash each pair of leaves together and set the hash to their parent in the list
-    for i in range((len(leaves) * 2) - 1 - len(leaves), 0, -1):
-        h = hashlib.sha3_256()
-        h.update(nodes[2 * i - 1] + nodes[2 * i])
-        true_i = i - 1
-        nodes[true_i] = h.digest()
-
-    # Return the list
-    return [n.hex() for n in nodes]
+    # Returns every node of the tree as hex, root first
+    return MerkleTree.from_leaves(leaves).to_hex()
 
 
 def verify_merkle_tree(leaves, expected_root):
-    tree = merklize(leaves)
-
-    if tree[0] == expected_root:
-        return True
-    return False
+    return MerkleTree.from_leaves(leaves).root_hex == expected_root
 
 
 def block_from_subblocks(subblocks, previous_hash: str, block_num: int) -> dict:
@@ -0,0 +1,176 @@
+import hashlib
+from collections import OrderedDict
+
+# Trees are stored as a flat list of raw 32 byte digests in heap order. The root is at index 0, the children of node
+# p are at 2p + 1 and 2p + 2, and the n leaf hashes occupy the last n slots. This is the same layout that
+# canonical.merklize has always produced, so the hex form is wire compatible with existing merkle_tree['leaves'].
+
+_sha3 = hashlib.sha3_256
+
+
+def hash_leaf(leaf: bytes):
+    return _sha3(leaf).digest()
+
+
+def hash_pair(left: bytes, right: bytes):
+    return _sha3(left + right).digest()
+
+
+def build_nodes(digests: list):
+    n = len(digests)
+
+    # Make space for the parent hashes and drop the leaf hashes in at the end
+    nodes = [None] * (n - 1) + digests
+
+    # Work up from the last parent to the root. Local bindings keep the loop tight.
+    sha3 = _sha3
+    for p in range(n - 2, -1, -1):
+        nodes[p] = sha3(nodes[2 * p + 1] + nodes[2 * p + 2]).digest()
+
+    return nodes
+
+
+class MerkleTree:
+    def __init__(self, nodes: list):
+        self.nodes = nodes
+        self._hex = None
+
+    @classmethod
+    def from_leaves(cls, leaves):
+        return cls(build_nodes([_sha3(l).digest() for l in leaves]))
+
+    @property
+    def root(self):
+        if len(self.nodes) == 0:
+            return None
+        return self.nodes[0]
+
+    @property
+    def root_hex(self):
+        if len(self.nodes) == 0:
+            return None
+        return self.to_hex()[0]
+
+    @property
+    def leaf_count(self):
+        return (len(self.nodes) + 1) // 2
+
+    def to_hex(self):
+        # Hex conversion is only done when something actually needs the strings
+        if self._hex is None:
+            self._hex = [n.hex() for n in self.nodes]
+        return self._hex
+
+    def matches(self, nodes_hex: list):
+        if len(nodes_hex) != len(self.nodes):
+            return False
+        return self.to_hex() == list(nodes_hex)
+
+    def proof(self, index: int):
+        # Returns the sibling hashes from the leaf up to (but not including) the root
+        assert 0 <= index < self.leaf_count, 'Leaf index out of range.'
+
+        path = []
+        k = self.leaf_count - 1 + index
+        while k > 0:
+            sibling = k - 1 if k % 2 == 0 else k + 1
+            path.append(self.nodes[sibling].hex())
+            k = (k - 1) // 2
+
+        return path
+
+
+class MerkleBuilder:
+    def __init__(self):
+        self.digests = []
+
+    def add(self, leaf: bytes):
+        self.digests.append(_sha3(leaf).digest())
+
+    def add_digest(self, digest: bytes):
+        self.digests.append(digest)
+
+    def extend(self, leaves):
+        sha3 = _sha3
+        self.digests.extend([sha3(l).digest() for l in leaves])
+
+    def __len__(self):
+        return len(self.digests)
+
+    def build(self):
+        return MerkleTree(build_nodes(list(self.digests)))
+
+
+def verify_proof(leaf: bytes, index: int, leaf_count: int, proof: list, root: str):
+    if not 0 <= index < leaf_count:
+        return False
+
+    h = hash_leaf(leaf)
+    k = leaf_count - 1 + index
+
+    for sibling in proof:
+        if k <= 0:
+            return False
+
+        try:
+            s = bytes.fromhex(sibling)
+        except (ValueError, TypeError):
+            return False
+
+        # Even heap indexes are right children
+        if k % 2 == 0:
+            h = hash_pair(s, h)
+        else:
+            h = hash_pair(h, s)
+
+        k = (k - 1) // 2
+
+    return k == 0 and h.hex() == root
+
+
+class MerkleCache:
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.trees = OrderedDict()
+
+    def get(self, root: str):
+        entry = self.trees.get(root)
+        if entry is None:
+            return None
+
+        self.trees.move_to_end(root)
+        return entry[0]
+
+    def put(self, tree: MerkleTree, leaves=None):
+        root = tree.root_hex
+        if root is None:
+            return
+
+        self.trees[root] = (tree, None if leaves is None else tuple(leaves))
+        self.trees.move_to_end(root)
+
+        while len(self.trees) > self.max_size:
+            self.trees.popitem(last=False)
+
+    def tree_for(self, leaves: list, root: str=None):
+        # If a tree for the claimed root was built from the exact same leaf bytes, skip all of the hashing.
+        # Comparing bytes is far cheaper than hashing them again for every delegate that sent the same result.
+        if root is not None:
+            entry = self.trees.get(root)
+            if entry is not None and entry[1] is not None and entry[1] == tuple(leaves):
+                self.trees.move_to_end(root)
+                return entry[0]
+
+        tree = MerkleTree.from_leaves(leaves)
+        self.put(tree, leaves)
+
+        return tree
+
+    def clear(self):
+        self.trees.clear()
+
+    def __len__(self):
+        return len(self.trees)
+
+    def __contains__(self, root):
+        return root in self.trees
@@ -221,3 +221,86 @@ def transaction_is_valid(transaction, expected_processor, client: ContractingCli
     name = transaction['payload']['kwargs'].get('name')
     contract_name_is_valid(contract, func, name)
 
+
+
+def validate_batch(transactions, expected_processor, client: ContractingClient, nonces: storage.NonceStorage, strict=True,
+                   tx_per_block=15):
+    # Same checks as transaction_is_valid, run over many transactions at once. Signatures are verified in one batch and
+    # each sender's nonces, balance and the stamp rate are read once. Nonces run on from earlier transactions in the
+    # batch, and only transactions that pass every check advance them.
+    #
+    # Returns (errors, pending) where errors holds the TransactionException class or None for each transaction in order
+    # and pending maps (sender, processor) -> the pending nonce to reserve for the accepted ones.
+    errors = [None] * len(transactions)
+
+    signed = []
+    for i, tx in enumerate(transactions):
+        if not check_format(tx, rules.TRANSACTION_RULES):
+            errors[i] = TransactionFormattingError
+        elif tx['payload']['processor'] != expected_processor:
+            errors[i] = TransactionProcessorInvalid
+        else:
+            signed.append(i)
+
+    verified = wallet.verify_batch([
+        (transactions[i]['payload']['sender'], encode(transactions[i]['payload']), transactions[i]['metadata']['signature'])
+        for i in signed
+    ])
+
+    for i, ok in zip(signed, verified):
+        if not ok:
+            errors[i] = TransactionSignatureInvalid
+
+    stamp_rate = client.get_var(contract='stamp_cost', variable='S', arguments=['value'], mark=False)
+    if stamp_rate is None:
+        stamp_rate = 0
+
+    # (sender, processor) -> [nonce, pending nonce]
+    pending = {}
+    balances = {}
+
+    for i, tx in enumerate(transactions):
+        if errors[i] is not None:
+            continue
+
+        payload = tx['payload']
+        sender = payload['sender']
+        key = (sender, payload['processor'])
+
+        if key not in pending:
+            pending[key] = list(get_nonces(sender, payload['processor'], nonces))
+
+        if sender not in balances:
+            balance = client.get_var(contract='currency', variable='balances', arguments=[sender], mark=False)
+            balances[sender] = 0 if balance is None else balance
+
+        amount = payload['kwargs'].get('amount')
+
+        try:
+            new_pending = get_new_pending_nonce(
+                payload['nonce'], *pending[key], strict=strict, tx_per_block=tx_per_block
+            )
+
+            has_enough_stamps(
+                balances[sender],
+                stamp_rate,
+                payload['stamps_supplied'] or 0,
+                contract=payload['contract'],
+                function=payload['function'],
+                amount=0 if amount is None else amount
+            )
+
+            contract_name_is_valid(payload['contract'], payload['function'], payload['kwargs'].get('name'))
+        except TransactionException as e:
+            errors[i] = type(e)
+            continue
+
+        pending[key][1] = new_pending
+
+    accepted = {}
+    for i, tx in enumerate(transactions):
+        if errors[i] is None:
+            key = (tx['payload']['sender'], tx['payload']['processor'])
+            accepted[key] = pending[key][1]
+
+    return errors, accepted
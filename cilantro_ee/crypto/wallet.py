@@ -3,6 +3,7 @@ import nacl.encoding
 import nacl.signing
 from zmq.utils import z85
 import secrets
+from functools import lru_cache
 from . import zbase
 
 
@@ -19,6 +20,31 @@ def verify(vk: str, msg: str, signature: str):
     return True
 
 
+@lru_cache(maxsize=1024)
+def _verify_key(vk: str):
+    return nacl.signing.VerifyKey(bytes.fromhex(vk))
+
+
+def verify_batch(items: list):
+    # Verifies a list of (vk, msg, signature) tuples in one pass and returns a list of booleans in the same order.
+    # Signers repeat every round, so their keys are only decoded once. Duplicate tuples are only checked once.
+    checked = {}
+    results = []
+
+    for item in items:
+        if item not in checked:
+            vk, msg, signature = item
+            try:
+                _verify_key(vk).verify(msg.encode(), bytes.fromhex(signature))
+                checked[item] = True
+            except (nacl.exceptions.CryptoError, ValueError, TypeError, AttributeError):
+                checked[item] = False
+
+        results.append(checked[item])
+
+    return results
+
+
 class Wallet:
     def __init__(self, seed=None):
         if isinstance(seed, str):
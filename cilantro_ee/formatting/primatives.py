@@ -3,6 +3,9 @@ import re
 TCP = 'tcp://'
 IPC = 'ipc://'
 
+IDENTIFIER = re.compile(r'[a-zA-Z][a-zA-Z0-9_]*')
+CONTRACT_NAME = re.compile(r'con_[a-zA-Z][a-zA-Z0-9_]*')
+
 
 # Recursive engine to process rules on validation. Define base rules here and reference other rule sets to make
 # object like things.
@@ -29,13 +32,72 @@ def recurse_rules(d: dict, rule: dict):
     return True
 
 
-def check_format(d: dict, rule: dict):
-    expected_keys = set(rule.keys())
+# Rule sets are compiled into validators the first time they are checked. Rules are module level constants, so the
+# rule dict itself is kept alongside its validator to make sure the id is never reused.
+_compiled = {}
 
-    if not dict_has_keys(d, expected_keys):
-        return False
+_MISSING = object()
+
+
+def _generate_validator(rule: dict, namespace: dict):
+    # Emits the source for one function that checks every field of a rule set in a straight line. Leaf checks are bound
+    # as globals of the generated code, nested rule sets get their own generated function.
+    name = f'_v{len(namespace)}'
+    namespace[name] = None
+
+    lines = [f'def {name}(d):']
+    for i, (key, subrule) in enumerate(rule.items()):
+        f = f'_f{len(namespace)}'
+        namespace[f] = subrule if callable(subrule) else namespace[_generate_validator(subrule, namespace)]
+
+        lines.append(f'    v = d.get({key!r}, _MISSING)')
+        lines.append(f'    if v is _MISSING: return False')
+        lines.append(f'    t = type(v)')
+
+        if callable(subrule):
+            lines.append(f'    if t is list:')
+            lines.append(f'        for a in v:')
+            lines.append(f'            if not {f}(a): return False')
+            lines.append(f'    elif not {f}(v): return False')
+        else:
+            lines.append(f'    if t is dict:')
+            lines.append(f'        if not {f}(v): return False')
+            lines.append(f'    elif t is list:')
+            lines.append(f'        for a in v:')
+            lines.append(f'            if type(a) is not dict or not {f}(a): return False')
+            lines.append(f'    else: return False')
+
+    lines.append('    return True')
+
+    exec('\n'.join(lines), namespace)
+    return name
+
+
+def compile_rules(rule: dict):
+    # Turns a rule set into a validator with the same meaning as check_format. The rule tree is walked once here instead
+    # of on every call. Nested values that are missing or of the wrong shape fail instead of raising.
+    if callable(rule):
+        return rule
+
+    namespace = {'_MISSING': _MISSING}
+    validator = namespace[_generate_validator(rule, namespace)]
+    expected_keys = frozenset(rule.keys())
+
+    def check(d: dict):
+        if type(d) is not dict or d.keys() != expected_keys:
+            return False
+        return validator(d)
+
+    return check
+
+
+def check_format(d: dict, rule: dict):
+    entry = _compiled.get(id(rule))
+    if entry is None or entry[0] is not rule:
+        entry = (rule, compile_rules(rule))
+        _compiled[id(rule)] = entry
 
-    return recurse_rules(d, rule)
+    return entry[1](d)
 
 
 def dict_has_keys(d: dict, keys: set):
@@ -44,47 +106,29 @@ def dict_has_keys(d: dict, keys: set):
 
 
 def identifier_is_formatted(s: str):
-    try:
-        iden = re.match(r'^[a-zA-Z][a-zA-Z0-9_]*$', s)
-        if iden is None:
-            return False
-        return True
-    except TypeError:
-        return False
+    return type(s) == str and IDENTIFIER.fullmatch(s) is not None
 
 
 def contract_name_is_formatted(s: str):
-    try:
-        func = re.match(r'^con_[a-zA-Z][a-zA-Z0-9_]*$', s)
-        if func is None:
-            return False
-        return True
-    except TypeError:
-        return False
+    return type(s) == str and CONTRACT_NAME.fullmatch(s) is not None
 
 
-def vk_is_formatted(s: str):
+def _is_hex(s: str, length: int):
+    # bytes.fromhex skips whitespace, so checking the decoded length as well makes this strict hex
+    if type(s) != str or len(s) != length:
+        return False
     try:
-        int(s, 16)
-        if len(s) != 64:
-            return False
-        return True
+        return len(bytes.fromhex(s)) * 2 == length
     except ValueError:
         return False
-    except TypeError:
-        return False
+
+
+def vk_is_formatted(s: str):
+    return _is_hex(s, 64)
 
 
 def signature_is_formatted(s: str):
-    try:
-        int(s, 16)
-        if len(s) != 128:
-            return False
-        return True
-    except ValueError:
-        return False
-    except TypeError:
-        return False
+    return _is_hex(s, 128)
 
 
 def number_is_formatted(i: int):
@@ -96,8 +140,9 @@ def number_is_formatted(i: int):
 
 
 def kwargs_are_formatted(k: dict):
+    match = IDENTIFIER.fullmatch
     for k in k.keys():
-        if not identifier_is_formatted(k):
+        if type(k) != str or match(k) is None:
             return False
     return True
 
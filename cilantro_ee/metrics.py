@@ -0,0 +1,287 @@
+import asyncio
+import time
+from contextlib import contextmanager
+
+from cilantro_ee.logger.base import get_logger
+
+# Minimal in-process metrics registry. Values are rendered in the Prometheus text exposition format so any standard
+# scraper can read them from the masternode webserver (/metrics) or from the delegate's MetricsServer.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+log = get_logger('Metrics')
+
+
+def _label_key(labelnames, labels: dict):
+    assert set(labels.keys()) == set(labelnames), f'Expected labels {labelnames}, got {tuple(labels.keys())}.'
+    return tuple(str(labels[l]) for l in labelnames)
+
+
+def format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra is not None:
+        pairs.append(extra)
+
+    if len(pairs) == 0:
+        return ''
+
+    escaped = []
+    for name, value in pairs:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation='', labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}'
+        ]
+
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        assert amount >= 0, 'Counters can only go up.'
+        key = _label_key(self.labelnames, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield '', format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value, **labels):
+        self.values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, f, **labels):
+        # Evaluated lazily on every scrape. Useful for things like queue lengths that live elsewhere.
+        self.functions[_label_key(self.labelnames, labels)] = f
+
+    def remove_function(self, **labels):
+        # Drops the function, and whatever it holds on to, so the gauge goes back to its set value
+        self.functions.pop(_label_key(self.labelnames, labels), None)
+
+    def get(self, **labels):
+        key = _label_key(self.labelnames, labels)
+        if key in self.functions:
+            return self.functions[key]()
+        return self.values.get(key, 0)
+
+    def samples(self):
+        values = dict(self.values)
+        for key, f in self.functions.items():
+            try:
+                values[key] = f()
+            except Exception as e:
+                log.error(f'Could not evaluate gauge {self.name}: {e}')
+
+        for key, value in sorted(values.items()):
+            yield '', format_labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'), )
+
+        # label key -> [bucket counts..., sum, count]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+
+        v = self.values.get(key)
+        if v is None:
+            v = [0] * (len(self.buckets) + 2)
+            self.values[key] = v
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                v[i] += 1
+                break
+
+        v[-2] += value
+        v[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def count(self, **labels):
+        v = self.values.get(_label_key(self.labelnames, labels))
+        return 0 if v is None else v[-1]
+
+    def sum(self, **labels):
+        v = self.values.get(_label_key(self.labelnames, labels))
+        return 0 if v is None else v[-2]
+
+    def samples(self):
+        for key, v in sorted(self.values.items()):
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += v[i]
+                yield '_bucket', format_labels(self.labelnames, key, ('le', _format_value(bound))), cumulative
+
+            yield '_sum', format_labels(self.labelnames, key), v[-2]
+            yield '_count', format_labels(self.labelnames, key), v[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        # Registering the same name twice returns the existing metric so modules can declare what they use
+        m = self.metrics.get(name)
+        if m is not None:
+            assert type(m) == cls, f'Metric {name} already registered as a {m.kind}.'
+            return m
+
+        m = cls(name, documentation, labelnames, **kwargs)
+        self.metrics[name] = m
+        return m
+
+    def counter(self, name, documentation='', labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation='', labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register(self, metric: Metric):
+        # For custom metrics whose samples come from somewhere else
+        assert metric.name not in self.metrics, f'Metric {metric.name} already registered.'
+        self.metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self.metrics.get(name)
+
+    def render(self):
+        return '\n'.join(m.render() for _, m in sorted(self.metrics.items())) + '\n'
+
+    def clear(self):
+        self.metrics.clear()
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    # Tiny HTTP listener for nodes that don't run the Sanic webserver (delegates). Serves GET /metrics plus any extra
+    # read only routes added with add_route.
+    def __init__(self, registry: Registry=REGISTRY, host='127.0.0.1', port=9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+        self.routes = {
+            '/metrics': (CONTENT_TYPE, self.registry.render)
+        }
+
+    def add_route(self, path, content_type, render):
+        self.routes[path] = (content_type, render)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, host=self.host, port=self.port)
+        log.info(f'Serving metrics on http://{self.host}:{self.port}/metrics')
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+
+            # Drain the headers. Nothing in them matters here.
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+
+            route = None
+            if len(parts) >= 2 and parts[0] == 'GET':
+                route = self.routes.get(parts[1].split('?')[0])
+
+            if route is not None:
+                status = '200 OK'
+                content_type, render = route
+                body = render().encode()
+            else:
+                status = '404 Not Found'
+                body = b'Not found.\n'
+                content_type = 'text/plain'
+
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
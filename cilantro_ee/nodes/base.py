@@ -1,4 +1,4 @@
-from cilantro_ee import storage, network, router, authentication, rewards, upgrade
+from cilantro_ee import storage, network, router, authentication, rewards, upgrade, metrics, tracing
 from cilantro_ee.crypto import canonical
 from cilantro_ee.crypto.wallet import Wallet
 from cilantro_ee.contracts import sync
@@ -22,6 +22,20 @@ CONTENDER_SERVICE = 'contenders'
 GET_BLOCK = 'get_block'
 GET_HEIGHT = 'get_height'
 
+BLOCKS_PROCESSED = metrics.REGISTRY.counter(
+    'cilantro_blocks_processed_total', 'Blocks received by the node, by outcome.', ('outcome', )
+)
+
+BLOCK_HEIGHT = metrics.REGISTRY.gauge('cilantro_block_height', 'Latest block height committed by the node.')
+
+STAMPS_PER_BLOCK = metrics.REGISTRY.histogram(
+    'cilantro_stamps_per_block', 'Stamps used by all transactions in a committed block.',
+    buckets=(0, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+)
+
+CATCHUP_CURRENT = metrics.REGISTRY.gauge('cilantro_catchup_current_height', 'Block the node is processing in catchup.')
+CATCHUP_TARGET = metrics.REGISTRY.gauge('cilantro_catchup_target_height', 'Block height the node is catching up to.')
+
 
 async def get_latest_block_height(wallet: Wallet, vk: str, ip: str, ctx: zmq.asyncio.Context):
     msg = {
@@ -95,7 +109,7 @@ def ensure_in_constitution(verifying_key: str, constitution: dict):
 class Node:
     def __init__(self, socket_base, ctx: zmq.asyncio.Context, wallet, constitution: dict, bootnodes={}, blocks=storage.BlockStorage(),
                  driver=ContractDriver(), debug=True, store=False, seed=None, bypass_catchup=False, node_type=None,
-                 genesis_path=cilantro_ee.contracts.__path__[0], reward_manager=rewards.RewardManager(), nonces=storage.NonceStorage()):
+                 genesis_path=cilantro_ee.contracts.__path__[0], reward_manager=None, settle_every=1, nonces=storage.NonceStorage()):
 
         self.driver = driver
         self.nonces = nonces
@@ -111,6 +125,9 @@ class Node:
         self.wallet = wallet
         self.ctx = ctx
 
+        # Per block timings of each consensus phase
+        self.tracer = tracing.Tracer(node=self.wallet.verifying_key)
+
         self.genesis_path = genesis_path
 
         self.client = ContractingClient(
@@ -118,13 +135,16 @@ class Node:
             submission_filename=genesis_path + '/submission.s.py'
         )
 
+        # Read through cache for governance state. Invalidated as blocks are committed.
+        self.governance = storage.GovernanceCache(client=self.client)
+
         self.bootnodes = bootnodes
         self.constitution = constitution
 
         self.seed_genesis_contracts()
 
         self.socket_authenticator = authentication.SocketAuthenticator(
-            bootnodes=self.bootnodes, ctx=self.ctx, client=self.client
+            bootnodes=self.bootnodes, ctx=self.ctx, client=self.governance
         )
 
         self.upgrade_manager = upgrade.UpgradeManager(client=self.client, wallet=self.wallet, node_type=node_type)
@@ -149,7 +169,10 @@ class Node:
         self.running = False
         self.upgrade = False
 
+        # settle_every has to be the same on every node, since the settlements are part of each block's state
         self.reward_manager = reward_manager
+        if self.reward_manager is None:
+            self.reward_manager = rewards.RewardManager(settle_every=settle_every)
 
         self.current_height = storage.get_latest_block_height(self.driver)
         self.current_hash = storage.get_latest_block_hash(self.driver)
@@ -166,6 +189,8 @@ class Node:
             root=self.genesis_path
         )
 
+        self.governance.clear()
+
     async def catchup(self, mn_seed, mn_vk):
         # Get the current latest block stored and the latest block of the network
         self.log.info('Running catchup.')
@@ -183,6 +208,8 @@ class Node:
             self.log.info('No need to catchup. Proceeding.')
             return
 
+        CATCHUP_TARGET.set(latest)
+
         # Increment current by one. Don't count the genesis block.
         if current == 0:
             current = 1
@@ -197,6 +224,7 @@ class Node:
                 ctx=self.ctx
             )
             self.process_new_block(block)
+            CATCHUP_CURRENT.set(i)
 
         # Process any blocks that were made while we were catching up
         while len(self.new_block_processor.q) > 0:
@@ -251,37 +279,47 @@ class Node:
                 nonces=self.nonces
             )
 
+            self.governance.invalidate_block(block)
+
             self.log.info('Issuing rewards.')
             # Calculate and issue the rewards for the governance nodes
             self.reward_manager.issue_rewards(
                 block=block,
-                client=self.client
+                client=self.governance
             )
 
+            BLOCKS_PROCESSED.inc(outcome='stored')
+            STAMPS_PER_BLOCK.observe(sum(tx['stamps_used'] for sb in block['subblocks'] for tx in sb['transactions']))
+        else:
+            BLOCKS_PROCESSED.inc(outcome='skipped')
+
         self.log.info('Updating metadata.')
         self.current_height = storage.get_latest_block_height(self.driver)
         self.current_hash = storage.get_latest_block_hash(self.driver)
 
+        BLOCK_HEIGHT.set(self.current_height)
+
         self.new_block_processor.clean(self.current_height)
 
     def process_new_block(self, block):
-        # Update the state and refresh the sockets so new nodes can join
-        self.update_state(block)
-        self.socket_authenticator.refresh_governance_sockets()
+        with self.tracer.span('process_new_block', block=block.get('number')):
+            # Update the state and refresh the sockets so new nodes can join
+            self.update_state(block)
+            self.socket_authenticator.refresh_governance_sockets()
 
-        # Store the block if it's a masternode
-        if self.store:
-            encoded_block = encode(block)
-            encoded_block = json.loads(encoded_block)
+            # Store the block if it's a masternode
+            if self.store:
+                encoded_block = encode(block)
+                encoded_block = json.loads(encoded_block)
 
-            self.blocks.store_block(encoded_block)
+                self.blocks.store_block(encoded_block)
 
-        # Prepare for the next block by flushing out driver and notification state
-        # self.new_block_processor.clean()
+            # Prepare for the next block by flushing out driver and notification state
+            # self.new_block_processor.clean()
 
-        # Finally, check and initiate an upgrade if one needs to be done
-        self.driver.commit()
-        self.driver.clear_pending_state()
+            # Finally, check and initiate an upgrade if one needs to be done
+            self.driver.commit()
+            self.driver.clear_pending_state()
 
     async def start(self):
         asyncio.ensure_future(self.router.serve())
@@ -328,7 +366,7 @@ class Node:
         self.running = False
 
     def _get_member_peers(self, contract_name):
-        members = self.client.get_var(
+        members = self.governance.get_var(
             contract=contract_name,
             variable='S',
             arguments=['members']
@@ -1,5 +1,5 @@
 from cilantro_ee.nodes.delegate import execution, work
-from cilantro_ee import router, storage, network, upgrade
+from cilantro_ee import router, storage, network, upgrade, metrics, profiling
 from cilantro_ee.nodes import base
 from cilantro_ee.logger.base import get_logger
 import asyncio
@@ -104,10 +104,22 @@ class WorkProcessor(router.Processor):
 
 
 class Delegate(base.Node):
-    def __init__(self, parallelism=4, *args, **kwargs):
+    def __init__(self, parallelism=4, metrics_port=None, metrics_host='127.0.0.1', profile_contracts=False,
+                 profile_sample_rate=1.0, *args, **kwargs):
 
         super().__init__(*args, **kwargs)
 
+        # Contract profiling is off unless asked for. Results show up in the metrics output.
+        profiling.PROFILER.enabled = profile_contracts
+        profiling.PROFILER.sample_rate = profile_sample_rate
+
+        # Delegates have no webserver. Serve metrics on a small local listener if a port is given.
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = metrics.MetricsServer(host=metrics_host, port=metrics_port)
+            self.metrics_server.add_route('/trace', 'application/json', self.tracer.dumps)
+            self.metrics_server.add_route('/profile', 'application/json', profiling.PROFILER.dumps)
+
         # Number of core / processes we push to
         self.parallelism = parallelism
         self.executor = Executor(driver=self.driver)
@@ -123,13 +135,16 @@ class Delegate(base.Node):
         self.log.debug('Starting')
         await super().start()
 
-        members = self.driver.get_var(contract='delegates', variable='S', arguments=['members'])
+        members = self.governance.get_var(contract='delegates', variable='S', arguments=['members'])
         assert self.wallet.verifying_key in members, 'You are not a delegate!'
 
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+
         asyncio.ensure_future(self.run())
 
     async def acquire_work(self):
-        current_masternodes = self.client.get_var(contract='masternodes', variable='S', arguments=['members'])
+        current_masternodes = self.governance.get_var(contract='masternodes', variable='S', arguments=['members'])
 
         w = await self.work_processor.accept_work(expected_batched=len(current_masternodes), masters=current_masternodes)
 
@@ -169,7 +184,9 @@ class Delegate(base.Node):
         if len(self.get_masternode_peers()) == 0:
             return
 
+        acquire_started = time.time()
         filtered_work = await self.acquire_work()
+        acquire_ended = time.time()
 
         # Run mini catch up here to prevent 'desyncing'
         self.log.info(f'{len(self.new_block_processor.q)} new block(s) to process before execution.')
@@ -178,24 +195,30 @@ class Delegate(base.Node):
             block = self.new_block_processor.q.pop(0)
             self.process_new_block(block)
 
-        results = execution.execute_work(
-            executor=self.executor,
-            driver=self.driver,
-            work=filtered_work,
-            wallet=self.wallet,
-            previous_block_hash=self.current_hash,
-            current_height=self.current_height,
-            stamp_cost=self.client.get_var(contract='stamp_cost', variable='S', arguments=['value'])
-        )
-
-        await router.secure_multicast(
-            msg=results,
-            service=base.CONTENDER_SERVICE,
-            cert_dir=self.socket_authenticator.cert_dir,
-            wallet=self.wallet,
-            peer_map=self.get_masternode_peers(),
-            ctx=self.ctx
-        )
+        # Catch up can move the height, so the round's block is only known now. All three spans are tagged with it.
+        block_num = self.current_height + 1
+        self.tracer.record('acquire_work', acquire_started, acquire_ended, block=block_num)
+
+        with self.tracer.span('execute_work', block=block_num):
+            results = execution.execute_work(
+                executor=self.executor,
+                driver=self.driver,
+                work=filtered_work,
+                wallet=self.wallet,
+                previous_block_hash=self.current_hash,
+                current_height=self.current_height,
+                stamp_cost=self.governance.get_var(contract='stamp_cost', variable='S', arguments=['value'])
+            )
+
+        with self.tracer.span('contender_multicast', block=block_num):
+            await router.secure_multicast(
+                msg=results,
+                service=base.CONTENDER_SERVICE,
+                cert_dir=self.socket_authenticator.cert_dir,
+                wallet=self.wallet,
+                peer_map=self.get_masternode_peers(),
+                ctx=self.ctx
+            )
 
         self.log.info(f'Work execution complete. Sending to masters.')
 
@@ -218,3 +241,6 @@ class Delegate(base.Node):
 
     def stop(self):
         self.router.stop()
+
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
@@ -3,13 +3,27 @@ from contracting.stdlib.bridge.time import Datetime
 from contracting.db.encoder import encode, safe_repr
 from cilantro_ee.crypto.canonical import tx_hash_from_tx, format_dictionary, merklize
 from cilantro_ee.logger.base import get_logger
+from cilantro_ee import metrics
+from cilantro_ee.profiling import PROFILER
+import time
 from datetime import datetime
 
 log = get_logger('EXE')
 
+BATCH_EXECUTION_TIME = metrics.REGISTRY.histogram(
+    'cilantro_tx_batch_execution_seconds', 'Time spent executing a single batch of transactions.'
+)
+
+TRANSACTIONS_EXECUTED = metrics.REGISTRY.counter(
+    'cilantro_transactions_executed_total', 'Transactions executed, by status.', ('status', )
+)
+
 
 def execute_tx(executor: Executor, transaction, stamp_cost, environment: dict={}):
     # Deserialize Kwargs. Kwargs should be serialized JSON moving into the future for DX.
+    profile = PROFILER.should_sample()
+    if profile:
+        started = time.perf_counter()
 
     output = executor.execute(
         sender=transaction['payload']['sender'],
@@ -22,6 +36,12 @@ def execute_tx(executor: Executor, transaction, stamp_cost, environment: dict={}
         auto_commit=False
     )
 
+    # Only the execution itself is timed, not the logging and hashing below
+    if profile:
+        elapsed = time.perf_counter() - started
+
+    TRANSACTIONS_EXECUTED.inc(status='success' if output['status_code'] == 0 else 'failure')
+
     if output['status_code'] == 0:
         log.info(f'TX executed successfully. '
                  f'{output["stamps_used"]} stamps used. '
@@ -37,6 +57,16 @@ def execute_tx(executor: Executor, transaction, stamp_cost, environment: dict={}
 
     tx_hash = tx_hash_from_tx(transaction)
 
+    if profile:
+        PROFILER.record(
+            contract=transaction['payload']['contract'],
+            function=transaction['payload']['function'],
+            seconds=elapsed,
+            stamps=output['stamps_used'],
+            writes=len(output['writes']),
+            tx_hash=tx_hash
+        )
+
     # Only apply the writes if the tx passes
     if output['status_code'] == 0:
         writes = [{'key': k, 'value': v} for k, v in output['writes'].items()]
@@ -77,12 +107,13 @@ def execute_tx_batch(executor, driver, batch, timestamp, input_hash, stamp_cost,
 
     # Each TX Batch is basically a subblock from this point of view and probably for the near future
     tx_data = []
-    for transaction in batch['transactions']:
-        tx_data.append(execute_tx(executor=executor,
-                                  transaction=transaction,
-                                  environment=environment,
-                                  stamp_cost=stamp_cost)
-                       )
+    with BATCH_EXECUTION_TIME.time():
+        for transaction in batch['transactions']:
+            tx_data.append(execute_tx(executor=executor,
+                                      transaction=transaction,
+                                      environment=environment,
+                                      stamp_cost=stamp_cost)
+                           )
 
     return tx_data
 
@@ -0,0 +1,96 @@
+from collections import deque
+from cilantro_ee import metrics
+import math
+import time
+
+# Admission control for the transaction queue driven by how long transactions actually wait, after CoDel. Every time
+# the batcher takes transactions off the queue the controller measures how long the newest of them sat there. Once
+# that wait has stayed above target for a whole interval the queue is standing rather than absorbing a burst, and new
+# submissions are shed until a batch leaves below target again.
+
+QUEUE_DELAY = metrics.REGISTRY.gauge('cilantro_webserver_queue_delay_seconds', 'Wait of the last batched transaction.')
+SHEDDING = metrics.REGISTRY.gauge('cilantro_webserver_shedding', '1 while new transactions are being shed.')
+
+
+class AdmissionController:
+    def __init__(self, target=2.0, interval=10.0, max_retry_after=60, clock=time.monotonic):
+        self.target = target
+        self.interval = interval
+        self.max_retry_after = max_retry_after
+        self.clock = clock
+
+        # [arrival time, count] in queue order. Runs of arrivals in the same instant share an entry.
+        self.arrivals = deque()
+
+        self.first_above = None
+        self.shedding = False
+
+        # Transactions per second leaving the queue, smoothed
+        self.throughput = None
+        self.last_dequeue = None
+
+    def enqueued(self, n=1):
+        if n == 0:
+            return
+
+        now = self.clock()
+        if len(self.arrivals) > 0 and self.arrivals[-1][0] == now:
+            self.arrivals[-1][1] += n
+        else:
+            self.arrivals.append([now, n])
+
+    def dequeued(self, n):
+        now = self.clock()
+
+        if self.last_dequeue is not None and n > 0 and now > self.last_dequeue:
+            rate = n / (now - self.last_dequeue)
+            self.throughput = rate if self.throughput is None else 0.8 * self.throughput + 0.2 * rate
+        self.last_dequeue = now
+
+        newest = None
+        while n > 0 and len(self.arrivals) > 0:
+            head = self.arrivals[0]
+            taken = min(n, head[1])
+            head[1] -= taken
+            n -= taken
+            newest = head[0]
+
+            if head[1] == 0:
+                self.arrivals.popleft()
+
+        if newest is None:
+            # Nothing was waiting, so there is no standing queue
+            self.first_above = None
+            self.shedding = False
+        else:
+            self.observe(now - newest, now)
+
+        SHEDDING.set(1 if self.shedding else 0)
+
+    def observe(self, delay, now):
+        QUEUE_DELAY.set(delay)
+
+        if delay < self.target:
+            self.first_above = None
+            self.shedding = False
+        elif self.first_above is None:
+            self.first_above = now + self.interval
+        elif now >= self.first_above:
+            self.shedding = True
+
+    def admit(self):
+        if self.shedding:
+            return False
+
+        # If batching stalls nothing gets dequeued and measured, so also look at how long the head has been waiting
+        if len(self.arrivals) > 0 and self.clock() - self.arrivals[0][0] > self.target + self.interval:
+            return False
+
+        return True
+
+    def retry_after(self, queue_len):
+        # Seconds for the queue as it stands to drain at the current throughput
+        if self.throughput is None or self.throughput <= 0:
+            return math.ceil(self.interval)
+
+        return min(max(math.ceil(queue_len / self.throughput), 1), self.max_retry_after)
@@ -1,8 +1,9 @@
 from contracting.db.encoder import encode
-from collections import defaultdict
-from cilantro_ee import router
-from cilantro_ee.crypto.canonical import merklize, block_from_subblocks
-from cilantro_ee.crypto.wallet import verify
+from collections import defaultdict, OrderedDict
+from cilantro_ee import router, metrics
+from cilantro_ee.crypto.canonical import block_from_subblocks
+from cilantro_ee.crypto.merkle import MerkleCache
+from cilantro_ee.crypto.wallet import verify, verify_batch
 from cilantro_ee.logger.base import get_logger
 
 import asyncio
@@ -10,10 +11,25 @@ import time
 
 log = get_logger('Contender')
 
+DECISION_TIME = metrics.REGISTRY.histogram(
+    'cilantro_block_decision_seconds', 'Time from the start of subblock aggregation until the block is decided.'
+)
+
 class SBCInbox(router.Processor):
-    def __init__(self, expected_subblocks=4, debug=True):
+    def __init__(self, expected_subblocks=4, debug=True, max_verified_results=256):
+        # (round, subblock, signer) -> subblock contender. Round is the previous block hash the work was built on.
+        self.contenders = {}
+
+        # Keys of contenders that have not been handed to the aggregator yet, in arrival order
         self.q = []
+
         self.expected_subblocks = expected_subblocks
+        self.merkle_trees = MerkleCache()
+
+        # Result hash -> (merkle leaves, transactions) of a contender that passed the full check
+        self.verified_results = OrderedDict()
+        self.max_verified_results = max_verified_results
+
         self.log = get_logger('Subblock Gatherer')
         self.log.propagate = debug
 
@@ -24,60 +40,116 @@ class SBCInbox(router.Processor):
         if len(msg) != self.expected_subblocks:
             return
 
+        if not self.signatures_are_valid(msg):
+            return
+
         for i in range(len(msg)):
-            if not self.sbc_is_valid(msg[i], i):
+            if not self.sbc_is_valid(msg[i], i, check_signature=False):
                 return
 
-            self.q.append(msg)
+        # Only queue the contender once every subblock in it has passed
+        self.add_contender(msg)
+
+    @staticmethod
+    def contender_key(sbc):
+        return sbc.get('previous'), sbc['subblock'], sbc['signer']
+
+    def add_contender(self, sbcs):
+        for sbc in sbcs:
+            key = self.contender_key(sbc)
+
+            # Drop duplicates from the same signer for the same subblock in the same round
+            if key in self.contenders:
+                continue
+
+            self.contenders[key] = sbc
+            self.q.append(key)
 
-    def sbc_is_valid(self, sbc, sb_idx=0):
+    @staticmethod
+    def signed_message(sbc):
+        # Empty subblocks sign the input hash. Otherwise the merkle root is signed.
+        if len(sbc['transactions']) == 0:
+            return sbc['input_hash']
+        return sbc['merkle_tree']['leaves'][0]
+
+    def signatures_are_valid(self, sbcs):
+        # Check every signature in the contender in one pass before doing any of the merkle work
+        results = verify_batch([
+            (sbc['signer'], self.signed_message(sbc), sbc['merkle_tree']['signature']) for sbc in sbcs
+        ])
+
+        for sbc, valid in zip(sbcs, results):
+            if not valid:
+                self.log.error(f'Subblock Contender[{sbc["subblock"]}] from {sbc["signer"][:8]} has an invalid signature.')
+                return False
+
+        return True
+
+    def sbc_is_valid(self, sbc, sb_idx=0, check_signature=True):
         if sbc['subblock'] != sb_idx:
             self.log.error(f'Subblock Contender[{sb_idx}] is out order.')
             return False
 
         # Make sure signer is in the delegates
-        if len(sbc['transactions']) == 0:
-            message = sbc['input_hash']
-        else:
-            message = sbc['merkle_tree']['leaves'][0]
-
-        valid_sig = verify(
-            vk=sbc['signer'],
-            msg=message,
-            signature=sbc['merkle_tree']['signature']
-        )
+        if check_signature:
+            valid_sig = verify(
+                vk=sbc['signer'],
+                msg=self.signed_message(sbc),
+                signature=sbc['merkle_tree']['signature']
+            )
+
+            if not valid_sig:
+                self.log.error(f'Subblock Contender[{sb_idx}] from {sbc["signer"][:8]} has an invalid signature.')
+                return False
 
-        if not valid_sig:
-            self.log.error(f'Subblock Contender[{sb_idx}] from {sbc["signer"][:8]} has an invalid signature.')
-            return False
+        if len(sbc['merkle_tree']['leaves']) > 0 and len(sbc['transactions']) > 0:
+            result_hash = sbc['merkle_tree']['leaves'][0]
+
+            # The signature over a known good result hash is all that is left to check. Only one copy of a result
+            # ends up in the block, so swap in the copy that was verified instead of re-encoding these transactions.
+            known = self.verified_results.get(result_hash)
+            if known is not None:
+                sbc['merkle_tree']['leaves'], sbc['transactions'] = known
+                self.log.info(f'Subblock[{sbc["subblock"]}] from {sbc["signer"][:8]} matches a verified result.')
+                return True
 
-        if len(sbc['merkle_tree']['leaves']) > 0:
             txs = [encode(tx).encode() for tx in sbc['transactions']]
-            expected_tree = merklize(txs)
+
+            # Delegates in agreement send identical trees. Reuse the one built for the first of them.
+            expected_tree = self.merkle_trees.tree_for(txs, root=result_hash)
 
             # Missing leaves, etc
-            if len(sbc['merkle_tree']['leaves']) != len(expected_tree) and len(sbc['transactions']) > 0:
+            if len(sbc['merkle_tree']['leaves']) != len(expected_tree.nodes):
                 self.log.error('Merkle Tree Len mismatch')
                 return False
 
-            for i in range(len(expected_tree)):
-                if expected_tree[i] != sbc['merkle_tree']['leaves'][i]:
-                    self.log.error('Subblock Contender[{}] from {} has an Merkle tree proof.')
-                    return False
+            if not expected_tree.matches(sbc['merkle_tree']['leaves']):
+                self.log.error(f'Subblock Contender[{sb_idx}] from {sbc["signer"][:8]} has an invalid Merkle tree proof.')
+                return False
+
+            self.add_verified_result(result_hash, sbc)
 
         self.log.info(f'Subblock[{sbc["subblock"]}] from {sbc["signer"][:8]} is valid.')
 
         return True
 
+    def add_verified_result(self, result_hash, sbc):
+        self.verified_results[result_hash] = (sbc['merkle_tree']['leaves'], sbc['transactions'])
+
+        while len(self.verified_results) > self.max_verified_results:
+            self.verified_results.popitem(last=False)
+
     def has_sbc(self):
         return len(self.q) > 0
 
-    async def receive_sbc(self):
-        self.log.debug('Receiving Subblock Contender...')
-        while len(self.q) <= 0:
-            await asyncio.sleep(0)
+    def receive_sbcs(self):
+        # Hand over everything that arrived since the last call. Swapping the list out keeps this O(1).
+        keys, self.q = self.q, []
+        return [self.contenders[k] for k in keys]
 
-        return self.q.pop(0)
+    def clear(self):
+        self.contenders.clear()
+        self.q.clear()
 
 
 class PotentialSolution:
@@ -123,6 +195,9 @@ class SubBlockContender:
         self.required_consensus = required_consensus
         self.adequate_consensus = adequate_consensus
 
+        # True once required consensus is reached, or once the outstanding votes can no longer get any solution there
+        self.decided = False
+
         self.log = get_logger('SBC')
 
     def add_potential_solution(self, sbc):
@@ -146,6 +221,27 @@ class SubBlockContender:
 
         self.total_responses += 1
 
+        self.decided = self.is_decided()
+
+    @property
+    def remaining_responses(self):
+        return max(self.total_contacts - self.total_responses, 0)
+
+    def is_decided(self):
+        if self.best_solution is None:
+            return False
+
+        if self.has_required_consensus:
+            return True
+
+        # No solution has more votes than the best one, so if it can't reach quorum with every outstanding vote none can
+        return not self.can_reach_consensus
+
+    @property
+    def can_reach_consensus(self):
+        best = 0 if self.best_solution is None else self.best_solution.votes
+        return (best + self.remaining_responses) / self.total_contacts >= self.required_consensus
+
     @property
     def failed(self):
         # True if all responses are recorded and required consensus is not possible
@@ -180,6 +276,10 @@ class SubBlockContender:
         #if not self.has_adequate_consensus or self.failed:
         #    return None
 
+        # Quorum is out of reach, so the subblock fails instead of going out with a plurality
+        if self.decided and not self.has_required_consensus:
+            return None
+
         try:
             return self.best_solution.struct_to_dict()
         except:
@@ -244,6 +344,15 @@ class BlockContender:
 
         return True
 
+    def block_is_decided(self):
+        for sb in self.subblock_contenders:
+            if sb is None:
+                return False
+            if not sb.decided:
+                return False
+
+        return True
+
     def get_current_best_block(self):
         block = []
 
@@ -280,6 +389,9 @@ class Aggregator:
 
         self.seconds_to_timeout = seconds_to_timeout
 
+        # Seconds from the start of gather_subblocks until the block was decided or timed out
+        self.last_decision_time = None
+
         self.log = get_logger('AGG')
         self.log.propagate = debug
 
@@ -295,21 +407,22 @@ class Aggregator:
             acceptable_consensus=adequate_ratio
         )
 
-        # Add timeout condition.
+        # Add timeout condition. Stop as soon as the remaining votes can't change any subblock's outcome.
         started = time.time()
-        while (not contenders.block_has_consensus() and contenders.responses < contenders.total_contacts) and \
+        while (not contenders.block_is_decided() and contenders.responses < contenders.total_contacts) and \
                 time.time() - started < self.seconds_to_timeout:
 
             if self.sbc_inbox.has_sbc():
-                sbcs = await self.sbc_inbox.receive_sbc() # Can probably make this raw sync code
-                self.log.info('Pop it in there.')
-                contenders.add_sbcs(sbcs)
+                contenders.add_sbcs(self.sbc_inbox.receive_sbcs())
             await asyncio.sleep(0)
 
-        if time.time() - started > self.seconds_to_timeout:
+        self.last_decision_time = time.time() - started
+        DECISION_TIME.observe(self.last_decision_time)
+
+        if self.last_decision_time > self.seconds_to_timeout:
             self.log.error('Block timeout. Too many delegates are offline! Kick out the non-responsive ones!')
 
-        self.log.info('Done aggregating new block.')
+        self.log.info(f'Done aggregating new block. Decided in {self.last_decision_time:.3f}s.')
 
         block = contenders.get_current_best_block()
 
@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+from cilantro_ee import metrics
+from cilantro_ee.logger.base import get_logger
+
+# Push notifications for new blocks and transaction finality. The masternode publishes every processed block here and
+# the webserver streams the events out to subscribers as server sent events. Each subscriber has a bounded queue. A
+# subscriber that falls a full queue behind is evicted instead of letting its backlog grow without limit.
+
+log = get_logger('Feed')
+
+SUBSCRIBERS = metrics.REGISTRY.gauge('cilantro_feed_subscribers', 'Open block and transaction subscriptions.')
+EVICTIONS = metrics.REGISTRY.counter('cilantro_feed_evictions_total', 'Subscribers dropped for not keeping up.')
+
+# Sent in place of an event to tell the reader its subscription is over
+EVICTED = None
+
+
+def frame(event, data: dict):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def tx_frame(tx, number):
+    return frame('tx', {
+        'hash': tx['hash'],
+        'block': number,
+        'status': tx['status'],
+        'stamps_used': tx['stamps_used'],
+        'result': tx['result']
+    })
+
+
+def dropped_frame(h, reason):
+    return frame('tx', {'hash': h, 'status': 'dropped', 'reason': reason})
+
+
+class Subscriber:
+    def __init__(self, blocks=True, txs=(), max_queue=100):
+        self.blocks = blocks
+        self.txs = set(txs)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.evicted = False
+
+    def done(self):
+        # Subscriptions to transactions only are finished once all of them have landed
+        return not self.blocks and len(self.txs) == 0
+
+
+class Feed:
+    def __init__(self, max_queue=100, max_subscribers=10_000):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+
+        self.subscribers = set()
+
+        # tx hash -> subscribers waiting on it
+        self.waiting = {}
+
+    def subscribe(self, blocks=True, txs=()):
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+
+        sub = Subscriber(blocks=blocks, txs=txs, max_queue=self.max_queue)
+        self.subscribers.add(sub)
+
+        for h in sub.txs:
+            self.waiting.setdefault(h, set()).add(sub)
+
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+        for h in sub.txs:
+            waiting = self.waiting.get(h)
+            if waiting is None:
+                continue
+
+            waiting.discard(sub)
+            if len(waiting) == 0:
+                del self.waiting[h]
+
+    def offer(self, sub: Subscriber, event):
+        try:
+            sub.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.evict(sub)
+
+    def evict(self, sub: Subscriber):
+        self.end(sub)
+        sub.evicted = True
+        EVICTIONS.inc()
+
+    def end(self, sub: Subscriber):
+        self.unsubscribe(sub)
+
+        # Throw away the backlog so the reader sees the end next instead of working through stale events
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(EVICTED)
+
+    def publish_block(self, block):
+        # Every event is serialized once no matter how many subscribers receive it
+        txs = [tx for sb in block['subblocks'] for tx in sb['transactions']]
+
+        event = frame('block', {
+            'number': block['number'],
+            'hash': block['hash'],
+            'previous': block['previous'],
+            'transactions': len(txs)
+        })
+
+        for sub in [s for s in self.subscribers if s.blocks]:
+            self.offer(sub, event)
+
+        for tx in txs:
+            if tx['hash'] in self.waiting:
+                self.publish_tx(tx['hash'], tx_frame(tx, block['number']))
+
+    def publish_dropped(self, records: dict):
+        # tx hash -> status record, for transactions that will never make it into a block
+        for h, record in records.items():
+            if h in self.waiting:
+                self.publish_tx(h, dropped_frame(h, record['reason']))
+
+    def publish_tx(self, h, event):
+        for sub in self.waiting.pop(h, ()):
+            sub.txs.discard(h)
+            self.offer(sub, event)
+
+    def settle(self, sub: Subscriber, h, event):
+        # For a transaction that was already final when sub subscribed to it
+        if h not in sub.txs:
+            return
+
+        sub.txs.discard(h)
+
+        waiting = self.waiting.get(h)
+        if waiting is not None:
+            waiting.discard(sub)
+            if len(waiting) == 0:
+                del self.waiting[h]
+
+        self.offer(sub, event)
+
+    def close(self):
+        for sub in list(self.subscribers):
+            self.end(sub)
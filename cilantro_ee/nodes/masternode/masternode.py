@@ -1,10 +1,10 @@
 import asyncio
 import hashlib
 import time
-from cilantro_ee import router, upgrade
+from cilantro_ee import router, upgrade, metrics
 from cilantro_ee.crypto.wallet import Wallet
 from cilantro_ee.storage import BlockStorage, get_latest_block_height
-from cilantro_ee.nodes.masternode import contender, webserver
+from cilantro_ee.nodes.masternode import contender, webserver, feed
 from cilantro_ee.formatting import primatives
 from cilantro_ee.nodes import base
 from contracting.db.driver import ContractDriver
@@ -15,6 +15,15 @@ mn_logger = get_logger('Masternode')
 
 BLOCK_SERVICE = 'service'
 
+BATCH_SIZE = metrics.REGISTRY.histogram(
+    'cilantro_tx_batch_size', 'Transactions in each batch sent to the delegates.',
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+GATHER_DURATION = metrics.REGISTRY.histogram(
+    'cilantro_gather_subblocks_seconds', 'Time spent gathering subblock contenders into a block.'
+)
+
 
 class BlockService(router.Processor):
     def __init__(self, blocks: BlockStorage=None, driver=ContractDriver()):
@@ -48,15 +57,25 @@ class BlockService(router.Processor):
 class TransactionBatcher:
     def __init__(self, wallet: Wallet, queue):
         self.wallet = wallet
+
+        # (tx, tx hash) pairs. The hash is worked out once at submission and carried along for status tracking.
         self.queue = queue
 
+        self.batches_made = 0
+
     def make_batch(self, transactions):
         timestamp = int(time.time())
 
+        # Subblocks only carry the input hash back, so it has to tell apart batches from different masternodes in the
+        # same second and consecutive batches from this one
         h = hashlib.sha3_256()
         h.update('{}'.format(timestamp).encode())
+        h.update(self.wallet.verifying_key.encode())
+        h.update('{}'.format(self.batches_made).encode())
         input_hash = h.hexdigest()
 
+        self.batches_made += 1
+
         signature = self.wallet.sign(input_hash)
 
         batch = {
@@ -68,18 +87,23 @@ class TransactionBatcher:
         }
 
         mn_logger.debug(f'Made new batch of {len(transactions)} transactions.')
+        BATCH_SIZE.observe(len(transactions))
 
         return batch
 
     def pack_current_queue(self, tx_number=100):
+        # Returns the batch and the hashes of the transactions in it, in the same order
         tx_list = []
+        hashes = []
 
         while len(tx_list) < tx_number and len(self.queue) > 0:
-            tx_list.append(self.queue.pop(0))
+            tx, tx_hash = self.queue.pop(0)
+            tx_list.append(tx)
+            hashes.append(tx_hash)
 
         batch = self.make_batch(tx_list)
 
-        return batch
+        return batch, hashes
 
 
 class Masternode(base.Node):
@@ -92,7 +116,8 @@ class Masternode(base.Node):
             driver=self.driver,
             blocks=self.blocks,
             wallet=self.wallet,
-            port=self.webserver_port
+            port=self.webserver_port,
+            tracer=self.tracer
         )
         self.upgrade_manager.webserver_port = self.webserver_port
         self.upgrade_manager.node_type = 'masternode'
@@ -100,6 +125,9 @@ class Masternode(base.Node):
         self.tx_batcher = TransactionBatcher(wallet=self.wallet, queue=[])
         self.webserver.queue = self.tx_batcher.queue
 
+        # Input hash of the batch sent out for the block being built
+        self.current_batch = None
+
         self.aggregator = contender.Aggregator(
             driver=self.driver,
         )
@@ -109,12 +137,24 @@ class Masternode(base.Node):
         # Network upgrade flag
         self.active_upgrade = False
 
+    def process_new_block(self, block):
+        super().process_new_block(block)
+        self.webserver.contracts.invalidate_block(block)
+        rejected = self.webserver.tx_status.finalize_block(block)
+        self.webserver.publish_head()
+        self.webserver.feed.publish_block(block)
+        self.webserver.feed.publish_dropped(rejected)
+
     async def start(self):
         self.router.add_service(base.BLOCK_SERVICE, BlockService(self.blocks, self.driver))
 
+        # The gauges are process wide, so they are bound to this node while it runs and released when it stops
+        webserver.QUEUE_DEPTH.set_function(lambda: len(self.tx_batcher.queue))
+        feed.SUBSCRIBERS.set_function(lambda: len(self.webserver.feed.subscribers))
+
         await super().start()
 
-        members = self.driver.get_var(contract='masternodes', variable='S', arguments=['members'], mark=False)
+        members = self.governance.get_var(contract='masternodes', variable='S', arguments=['members'])
         assert self.wallet.verifying_key in members, 'You are not a masternode!'
 
         # Start the block server so others can run catchup using our node as a seed.
@@ -194,7 +234,7 @@ class Masternode(base.Node):
         # await self.hang()
         # await self.wait_for_block()
 
-        members = self.driver.get_var(contract='masternodes', variable='S', arguments=['members'], mark=False)
+        members = self.governance.get_var(contract='masternodes', variable='S', arguments=['members'])
 
         if len(members) > 1:
             while len(self.new_block_processor.q) <= 0:
@@ -217,11 +257,15 @@ class Masternode(base.Node):
         # Else, batch some more txs
         self.log.info(f'Sending {len(self.tx_batcher.queue)} transactions.')
 
-        tx_batch = self.tx_batcher.pack_current_queue()
+        tx_batch, hashes = self.tx_batcher.pack_current_queue()
+        self.webserver.admission.dequeued(len(tx_batch['transactions']))
+        self.webserver.tx_status.batched(tx_batch['input_hash'], hashes)
+        self.current_batch = tx_batch['input_hash']
 
         # LOOK AT SOCKETS CLASS
         if len(self.get_delegate_peers()) == 0:
             self.log.error('No one online!')
+            self.webserver.drop_batch(tx_batch['input_hash'], 'No delegates online to send the batch to.')
             return False
 
         await router.secure_multicast(
@@ -234,22 +278,29 @@ class Masternode(base.Node):
         )
 
     async def get_work_processed(self):
-        await self.send_work()
+        block_num = self.current_height + 1
+
+        with self.tracer.span('send_work', block=block_num):
+            await self.send_work()
 
         # this really should just give us a block straight up
-        masters = self.driver.get_var(contract='masternodes', variable='S', arguments=['members'], mark=False)
+        masters = self.governance.get_var(contract='masternodes', variable='S', arguments=['members'])
 
         self.log.info('=== ENTERING BUILD NEW BLOCK STATE ===')
 
-        block = await self.aggregator.gather_subblocks(
-            total_contacts=len(self.get_delegate_peers()),
-            expected_subblocks=len(masters),
-            current_height=self.current_height,
-            current_hash=self.current_hash
-        )
+        with self.tracer.span('gather_subblocks', block=block_num), GATHER_DURATION.time():
+            block = await self.aggregator.gather_subblocks(
+                total_contacts=len(self.get_delegate_peers()),
+                expected_subblocks=len(masters),
+                current_height=self.current_height,
+                current_hash=self.current_hash
+            )
 
         self.process_new_block(block)
 
+        # This block should hold our batch. If it doesn't, the batch's subblock failed consensus.
+        self.webserver.drop_batch(self.current_batch, f'Subblock failed consensus in block {block["number"]}.')
+
         self.new_block_processor.clean(self.current_height)
 
         return block
@@ -260,31 +311,37 @@ class Masternode(base.Node):
 
         block = await self.get_work_processed()
 
-        await router.secure_multicast(
-            msg=block,
-            service=base.NEW_BLOCK_SERVICE,
-            cert_dir=self.socket_authenticator.cert_dir,
-            wallet=self.wallet,
-            peer_map=self.get_delegate_peers(),
-            ctx=self.ctx
-        )
+        with self.tracer.span('nbn_multicast', block=block['number'], peers='delegates'):
+            await router.secure_multicast(
+                msg=block,
+                service=base.NEW_BLOCK_SERVICE,
+                cert_dir=self.socket_authenticator.cert_dir,
+                wallet=self.wallet,
+                peer_map=self.get_delegate_peers(),
+                ctx=self.ctx
+            )
 
         await self.hang()
 
-        await router.secure_multicast(
-            msg=block,
-            service=base.NEW_BLOCK_SERVICE,
-            cert_dir=self.socket_authenticator.cert_dir,
-            wallet=self.wallet,
-            peer_map=self.get_masternode_peers(),
-            ctx=self.ctx
-        )
+        with self.tracer.span('nbn_multicast', block=block['number'], peers='masternodes'):
+            await router.secure_multicast(
+                msg=block,
+                service=base.NEW_BLOCK_SERVICE,
+                cert_dir=self.socket_authenticator.cert_dir,
+                wallet=self.wallet,
+                peer_map=self.get_masternode_peers(),
+                ctx=self.ctx
+            )
 
-        self.aggregator.sbc_inbox.q.clear()
+        self.aggregator.sbc_inbox.clear()
 
     def stop(self):
         super().stop()
         self.router.socket.close()
+        self.webserver.feed.close()
+        self.webserver.simulator.shutdown()
+        webserver.QUEUE_DEPTH.remove_function()
+        feed.SUBSCRIBERS.remove_function()
         self.webserver.coroutine.result().close()
 
 
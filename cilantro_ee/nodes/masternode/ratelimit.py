@@ -0,0 +1,58 @@
+from collections import OrderedDict
+import math
+import time
+
+# Token buckets keyed by whatever the caller wants to limit on, such as a sender vk or a client IP. Each key refills
+# at rate tokens per second up to burst. Only the most recently used max_keys buckets are kept. A key that falls out
+# comes back with a full bucket, which only ever errs on the side of letting a request through.
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst, max_keys=100_000, clock=time.monotonic):
+        assert rate > 0 and burst >= 1, 'Rate must be positive and burst at least one.'
+
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+
+        # key -> [tokens, last refill time]
+        self.buckets = OrderedDict()
+
+    def _bucket(self, key):
+        now = self.clock()
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self.buckets[key] = bucket
+
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+
+        return bucket
+
+    def available(self, key):
+        return self._bucket(key)[0]
+
+    def allow(self, key, cost=1):
+        # Takes cost tokens if there are enough. Nothing is taken otherwise.
+        bucket = self._bucket(key)
+        if bucket[0] < cost:
+            return False
+
+        bucket[0] -= cost
+        return True
+
+    def take(self, key, cost=1):
+        # Takes tokens unconditionally, for work that has already been let through. Can go negative.
+        self._bucket(key)[0] -= cost
+
+    def retry_after(self, key, cost=1):
+        # Whole seconds until cost tokens will be available
+        missing = cost - self._bucket(key)[0]
+        return max(math.ceil(missing / self.rate), 1)
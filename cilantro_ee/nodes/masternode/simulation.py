@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor
+from contracting.execution.executor import Executor
+from contracting.db.driver import ContractDriver, Driver
+from contracting.db.encoder import encode, safe_repr
+from cilantro_ee.nodes.delegate.execution import generate_environment
+from cilantro_ee import metrics
+import functools
+import asyncio
+
+# Dry runs of transactions against committed state for clients that want to know what a transaction will do and how
+# many stamps it needs before signing it. Simulations run in a pool of worker processes so they never hold up the
+# node's event loop. Every worker executes with auto_commit off and throws away its cache afterwards, so nothing it
+# does is ever written back.
+
+SIMULATIONS = metrics.REGISTRY.counter(
+    'cilantro_simulations_total', 'Transactions simulated, by outcome.', ('outcome', )
+)
+
+# Per worker process, set up by init_worker
+_driver = None
+_executor = None
+
+
+def init_worker(db='state', collection='state'):
+    global _driver, _executor
+    _driver = ContractDriver(driver=Driver(db=db, collection=collection))
+    _executor = Executor(driver=_driver)
+
+
+def simulate(sender, contract, function, kwargs, stamps, stamp_cost, timestamp, block_hash, block_num):
+    # Returns the outcome encoded, since contract values don't all survive pickling back to the parent
+    if _executor is None:
+        init_worker()
+
+    try:
+        if stamps is None:
+            # Everything the sender could afford, same as the check the executor makes
+            balance = _driver.get(_driver.make_key('currency', 'balances', [sender]), mark=False)
+            stamps = int((balance or 0) * stamp_cost)
+
+        output = _executor.execute(
+            sender=sender,
+            contract_name=contract,
+            function_name=function,
+            kwargs=kwargs,
+            stamps=stamps,
+            stamp_cost=stamp_cost,
+            environment=generate_environment(_driver, timestamp, '0' * 64, block_hash, block_num),
+            auto_commit=False
+        )
+    finally:
+        _driver.clear_pending_state()
+
+    return encode({
+        'status': output['status_code'],
+        'stamps_used': output['stamps_used'],
+        'writes': [{'key': k, 'value': v} for k, v in output['writes'].items()],
+        'result': safe_repr(output['result'])
+    })
+
+
+class Simulator:
+    def __init__(self, driver: Driver, workers=2, max_pending=8):
+        # Workers open their own connection to the same collection the node commits to
+        self.driver = driver
+
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+
+        # Started on first use so a webserver that never simulates doesn't fork
+        self.pool = None
+
+    def busy(self):
+        return self.pending >= self.max_pending
+
+    async def run(self, **kwargs):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker,
+                initargs=(self.driver.db.database.name, self.driver.db.name)
+            )
+
+        self.pending += 1
+        try:
+            result = await asyncio.get_event_loop().run_in_executor(self.pool, functools.partial(simulate, **kwargs))
+        except Exception:
+            SIMULATIONS.inc(outcome='error')
+            raise
+        finally:
+            self.pending -= 1
+
+        SIMULATIONS.inc(outcome='done')
+        return result
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
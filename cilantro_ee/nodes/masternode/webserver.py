@@ -1,23 +1,77 @@
 from sanic import Sanic
 from sanic import response
+from sanic.server import HttpProtocol
+from sanic.exceptions import PayloadTooLarge
 from cilantro_ee.logger.base import get_logger
 import json as _json
 from contracting.client import ContractingClient
 from contracting.db.encoder import encode, decode
 from contracting.db.driver import ContractDriver
-from contracting.compilation import parser
-from cilantro_ee import storage
+from cilantro_ee import storage, metrics
+from cilantro_ee.nodes.masternode.feed import Feed, EVICTED, tx_frame, dropped_frame
+from cilantro_ee.nodes.masternode.simulation import Simulator
+from cilantro_ee.nodes.masternode.ratelimit import TokenBucketLimiter
+from cilantro_ee.nodes.masternode.admission import AdmissionController
 from cilantro_ee.crypto.canonical import tx_hash_from_tx
 from cilantro_ee.crypto.transaction import TransactionException
 
 import ssl
+import time
 import asyncio
 
 log = get_logger("MN-WebServer")
 
+QUEUE_DEPTH = metrics.REGISTRY.gauge('cilantro_webserver_queue_depth', 'Transactions waiting to be batched.')
+
+TRANSACTIONS_SUBMITTED = metrics.REGISTRY.counter(
+    'cilantro_webserver_transactions_total', 'Transactions submitted to the webserver, by result.', ('result', )
+)
+
+THROTTLED = metrics.REGISTRY.counter(
+    'cilantro_webserver_throttled_total', 'Transactions turned away by a rate limit, by limit.', ('limit', )
+)
+
+RATE_LIMITED = {'error': 'Rate limit exceeded. Resubmit shortly.'}
+TOO_LARGE = {'error': 'Transaction too large.'}
+
 from cilantro_ee.crypto import transaction
 
 
+def sender_of(tx):
+    # The claimed sender, before anything has been verified
+    try:
+        sender = tx['payload']['sender']
+    except (KeyError, TypeError):
+        return None
+
+    return sender if isinstance(sender, str) else None
+
+
+def sized_protocol(max_sizes: dict):
+    # Sanic only has one REQUEST_MAX_SIZE. Requests may start as large as the biggest size in max_sizes (bytes path ->
+    # bytes allowed), then are held to their own path's size, or REQUEST_MAX_SIZE, as soon as the URL is parsed. That
+    # is before the Content-Length header is checked and before any more of the body is read.
+    class SizedHttpProtocol(HttpProtocol):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.default_max_size = self.request_max_size
+            self.largest_max_size = max([self.default_max_size] + list(max_sizes.values()))
+            self.request_max_size = self.largest_max_size
+
+        def on_url(self, url):
+            super().on_url(url)
+
+            self.request_max_size = max_sizes.get(self.url.split(b'?', 1)[0], self.default_max_size)
+            if self._total_request_size > self.request_max_size:
+                self.write_error(PayloadTooLarge('Payload Too Large'))
+
+        def cleanup(self):
+            super().cleanup()
+            self.request_max_size = self.largest_max_size
+
+    return SizedHttpProtocol
+
+
 class ByteEncoder(_json.JSONEncoder):
     def default(self, o, *args):
         if isinstance(o, bytes):
@@ -26,37 +80,121 @@ class ByteEncoder(_json.JSONEncoder):
         return super().default(self, o)
 
 
+class ChainHead:
+    # Pre-serialized bodies for the latest block endpoints. The ETag changes whenever a new head is published, so
+    # pollers that send If-None-Match get an empty 304 until there's a new block.
+    def __init__(self):
+        self.etag = None
+        self.responses = {}
+
+    def publish(self, block, number, h):
+        self.responses = {
+            'block': ByteEncoder().encode(block).encode(),
+            'number': _json.dumps({'latest_block_number': number}).encode(),
+            'hash': _json.dumps({'latest_block_hash': h}).encode()
+        }
+        self.etag = f'"{number}-{h}"'
+
+    def clear(self):
+        self.etag = None
+        self.responses = {}
+
+
 class WebServer:
     def __init__(self, contracting_client: ContractingClient, driver: ContractDriver, wallet, blocks, queue=[], port=8080, ssl_port=443, ssl_enabled=False,
                  ssl_cert_file='~/.ssh/server.csr',
                  ssl_key_file='~/.ssh/server.key',
                  workers=2, debug=True, access_log=False,
                  max_queue_len=10_000,
+                 max_tx_size=10_000,
+                 max_batch_txs=500,
+                 sender_rate=5,
+                 sender_burst=15,
+                 ip_rate=50,
+                 ip_burst=200,
+                 max_rate_limit_keys=100_000,
+                 target_queue_delay=2.0,
+                 queue_delay_interval=10.0,
+                 max_header_range=1_000,
+                 max_history_page=500,
+                 max_iterate_page=1_000,
+                 max_batch_read=1_000,
+                 max_batch_read_size=250_000,
+                 max_subscribers=10_000,
+                 subscriber_queue_len=100,
+                 max_subscribed_txs=100,
+                 heartbeat=15,
+                 simulation_workers=2,
+                 max_pending_simulations=8,
+                 tx_status=None,
+                 tracer=None
                  ):
 
         # Setup base Sanic class and CORS
         self.app = Sanic(__name__)
         self.app.config.update({
-            'REQUEST_MAX_SIZE': 10000,
+            'REQUEST_MAX_SIZE': max_tx_size,
             'REQUEST_TIMEOUT': 5,
             'KEEP_ALIVE': False,
         })
+
+        # Only the routes that take many items at once get bigger bodies
+        self.protocol = sized_protocol({
+            b'/batch': max_tx_size * max_batch_txs,
+            b'/contracts/batch': max_batch_read_size
+        })
         self.cors = None
 
         # Initialize the backend data interfaces
         self.client = contracting_client
+        self.contracts = storage.ContractCache(self.client)
+        self.head = ChainHead()
         self.driver = driver
         self.nonces = storage.NonceStorage()
         self.blocks = blocks
 
+        # Mock masternodes share one Mongo, so each node keeps its statuses in its own collection
+        self.tx_status = tx_status
+        if self.tx_status is None:
+            self.tx_status = storage.TxStatusIndex(collection=f'tx_status_{wallet.verifying_key}')
+
         self.static_headers = {}
 
         self.wallet = wallet
+        # (tx, tx hash) pairs, so batching doesn't hash them again
         self.queue = queue
         self.max_queue_len = max_queue_len
+        self.max_tx_size = max_tx_size
+        self.max_batch_txs = max_batch_txs
+
+        # Sheds new transactions when the queue delay stays above target, well before the queue is full
+        self.admission = AdmissionController(target=target_queue_delay, interval=queue_delay_interval)
+
+        # Token buckets per sender vk and per client IP. A rate of None turns that limit off.
+        self.sender_limiter = None
+        if sender_rate is not None:
+            self.sender_limiter = TokenBucketLimiter(sender_rate, sender_burst, max_keys=max_rate_limit_keys)
+
+        self.ip_limiter = None
+        if ip_rate is not None:
+            self.ip_limiter = TokenBucketLimiter(ip_rate, ip_burst, max_keys=max_rate_limit_keys)
+        self.max_header_range = max_header_range
+        self.max_history_page = max_history_page
+        self.max_iterate_page = max_iterate_page
+        self.max_batch_read = max_batch_read
+
+        self.feed = Feed(max_queue=subscriber_queue_len, max_subscribers=max_subscribers)
+        self.max_subscribed_txs = max_subscribed_txs
+        self.heartbeat = heartbeat
+
+        self.simulator = Simulator(
+            self.client.raw_driver.driver, workers=simulation_workers, max_pending=max_pending_simulations
+        )
 
         self.port = port
 
+        self.tracer = tracer
+
         self.ssl_port = ssl_port
         self.ssl_enabled = ssl_enabled
         self.context = None
@@ -73,8 +211,12 @@ class WebServer:
 
         # Add Routes
         self.app.add_route(self.submit_transaction, '/', methods=['POST', 'OPTIONS'])
+        self.app.add_route(self.submit_transactions, '/batch', methods=['POST', 'OPTIONS'])
+        self.app.add_route(self.simulate, '/simulate', methods=['POST', 'OPTIONS'])
         self.app.add_route(self.ping, '/ping', methods=['GET', 'OPTIONS'])
         self.app.add_route(self.get_id, '/id', methods=['GET'])
+        self.app.add_route(self.get_metrics, '/metrics', methods=['GET'])
+        self.app.add_route(self.get_trace, '/trace', methods=['GET'])
         self.app.add_route(self.get_nonce, '/nonce/<vk>', methods=['GET'])
 
         # State Routes
@@ -84,7 +226,8 @@ class WebServer:
         self.app.add_route(self.get_contracts, '/contracts', methods=['GET'])
         self.app.add_route(self.get_contract, '/contracts/<contract>', methods=['GET'])
         self.app.add_route(self.get_constitution, '/constitution', methods=['GET'])
-        #self.app.add_route(self.iterate_variable, '/contracts/<contract>/<variable>/iterate')
+        self.app.add_route(self.get_variables_batch, '/contracts/batch', methods=['POST'])
+        self.app.add_route(self.iterate_variable, '/contracts/<contract>/<variable>/iterate', methods=['GET'])
 
         # Latest Block Routes
         self.app.add_route(self.get_latest_block, '/latest_block', methods=['GET', 'OPTIONS', ])
@@ -93,9 +236,15 @@ class WebServer:
 
         # General Block Route
         self.app.add_route(self.get_block, '/blocks', methods=['GET'])
+        self.app.add_route(self.get_block_headers, '/blocks/headers', methods=['GET'])
 
         # TX Route
         self.app.add_route(self.get_tx, '/tx', methods=['GET'])
+        self.app.add_route(self.get_tx_history, '/tx/history', methods=['GET'])
+        self.app.add_route(self.get_tx_status, '/tx/status', methods=['GET'])
+
+        # Push Route
+        self.app.add_route(self.subscribe, '/subscribe', methods=['GET'])
 
         self.coroutine = None
 
@@ -109,6 +258,7 @@ class WebServer:
                     debug=self.debug,
                     access_log=self.access_log,
                     ssl=self.context,
+                    protocol=self.protocol,
                     return_asyncio_server=True
                 )
             )
@@ -119,6 +269,7 @@ class WebServer:
                     port=self.port,
                     debug=self.debug,
                     access_log=self.access_log,
+                    protocol=self.protocol,
                     return_asyncio_server=True
                 )
             )
@@ -126,16 +277,35 @@ class WebServer:
     # Main Endpoint to Submit TXs
     async def submit_transaction(self, request):
         log.debug(f'New request: {request}')
-        # Reject TX if the queue is too large
-        if len(self.queue) >= self.max_queue_len:
-            return response.json({'error': "Queue full. Resubmit shortly."}, status=503, headers={'Access-Control-Allow-Origin': '*'})
+        # Reject TX if the queue is too large or transactions are waiting too long in it
+        overloaded = self.overloaded()
+        if overloaded is not None:
+            return overloaded
+
+        if len(request.body) > self.max_tx_size:
+            TRANSACTIONS_SUBMITTED.inc(result='malformed')
+            return response.json(TOO_LARGE, status=413, headers={'Access-Control-Allow-Origin': '*'})
+
+        throttled = self.throttle_ip(request)
+        if throttled is not None:
+            return throttled
 
         # Check that the payload is valid JSON
         tx = decode(request.body)
         if tx is None:
-
+            TRANSACTIONS_SUBMITTED.inc(result='malformed')
             return response.json({'error': 'Malformed request body.'}, headers={'Access-Control-Allow-Origin': '*'})
 
+        # Checked before the signature so spam is cheap to turn away. Tokens are only taken once the transaction is
+        # accepted, so nobody can drain another sender's bucket with transactions they didn't sign.
+        sender = sender_of(tx)
+        if self.sender_limiter is not None and sender is not None and self.sender_limiter.available(sender) < 1:
+            THROTTLED.inc(limit='sender')
+            TRANSACTIONS_SUBMITTED.inc(result='throttled')
+            return response.json(RATE_LIMITED, status=429, headers={
+                'Access-Control-Allow-Origin': '*', 'Retry-After': str(self.sender_limiter.retry_after(sender))
+            })
+
         # Check that the TX is correctly formatted
         try:
             transaction.check_tx_formatting(tx, self.wallet.verifying_key)
@@ -166,25 +336,200 @@ class WebServer:
             )
         except TransactionException as e:
             log.error(f'Tx has error: {type(e)}')
+            TRANSACTIONS_SUBMITTED.inc(result='invalid')
             return response.json(
                 transaction.EXCEPTION_MAP[type(e)], headers={'Access-Control-Allow-Origin': '*'}
             )
 
         # Add TX to the processing queue
-        self.queue.append(tx)
+        tx_hash = tx_hash_from_tx(tx)
+        self.queue.append((tx, tx_hash))
+        self.admission.enqueued()
+        TRANSACTIONS_SUBMITTED.inc(result='accepted')
+
+        if self.sender_limiter is not None:
+            self.sender_limiter.take(sender)
 
         # Return the TX hash to the user so they can track it
-        tx_hash = tx_hash_from_tx(tx)
+        self.tx_status.pending([tx_hash])
 
         return response.json({
             'success': 'Transaction successfully submitted to the network.',
             'hash': tx_hash
         }, headers={'Access-Control-Allow-Origin': '*'})
 
+    async def submit_transactions(self, request):
+        # Body is a list of signed transactions. Results come back in the same order.
+        txs = decode(request.body)
+        if not isinstance(txs, list) or not 0 < len(txs) <= self.max_batch_txs:
+            TRANSACTIONS_SUBMITTED.inc(result='malformed')
+            return response.json({'error': f'Expected a list of 1 to {self.max_batch_txs} transactions.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        overloaded = self.overloaded(n=len(txs))
+        if overloaded is not None:
+            return overloaded
+
+        throttled = self.throttle_ip(request, cost=len(txs))
+        if throttled is not None:
+            return throttled
+
+        # Entries turned away before verification: (metric result, response) or None
+        skipped = [None] * len(txs)
+
+        # The single transaction route turns away bodies over max_tx_size, so each transaction here is held to the same
+        for i, tx in enumerate(txs):
+            if len(encode(tx)) > self.max_tx_size:
+                skipped[i] = ('malformed', TOO_LARGE)
+
+        # Each sender gets as many transactions through as they have tokens. The rest are turned away unverified.
+        if self.sender_limiter is not None:
+            budget = {}
+            for i, tx in enumerate(txs):
+                sender = sender_of(tx)
+                if sender is None or skipped[i] is not None:
+                    continue
+
+                if sender not in budget:
+                    budget[sender] = int(self.sender_limiter.available(sender))
+
+                if budget[sender] < 1:
+                    skipped[i] = ('throttled', RATE_LIMITED)
+                    THROTTLED.inc(limit='sender')
+                else:
+                    budget[sender] -= 1
+
+        checked = [tx for tx, skip in zip(txs, skipped) if skip is None]
+
+        checked_errors, pending = transaction.validate_batch(
+            transactions=checked,
+            expected_processor=self.wallet.verifying_key,
+            client=self.client,
+            nonces=self.nonces
+        )
+
+        checked_errors = iter(checked_errors)
+        errors = [None if skip is not None else next(checked_errors) for skip in skipped]
+
+        # One pending nonce write per sender covers all of their accepted transactions
+        for (sender, processor), value in pending.items():
+            self.nonces.set_pending_nonce(sender=sender, processor=processor, value=value)
+
+        results = []
+        accepted = []
+        for tx, error, skip in zip(txs, errors, skipped):
+            if skip is not None:
+                TRANSACTIONS_SUBMITTED.inc(result=skip[0])
+                results.append(skip[1])
+                continue
+
+            if error is not None:
+                TRANSACTIONS_SUBMITTED.inc(result='invalid')
+                results.append(transaction.EXCEPTION_MAP.get(error, transaction.EXCEPTION_MAP[TransactionException]))
+                continue
+
+            accepted.append(tx_hash_from_tx(tx))
+            self.queue.append((tx, accepted[-1]))
+            TRANSACTIONS_SUBMITTED.inc(result='accepted')
+
+            if self.sender_limiter is not None:
+                self.sender_limiter.take(sender_of(tx))
+
+            results.append({
+                'success': 'Transaction successfully submitted to the network.',
+                'hash': accepted[-1]
+            })
+
+        self.tx_status.pending(accepted)
+        self.admission.enqueued(len(accepted))
+
+        return response.json({'results': results}, headers={'Access-Control-Allow-Origin': '*'})
+
+    def overloaded(self, n=1):
+        # Returns the 503 to send if n more transactions shouldn't be queued right now
+        if len(self.queue) + n > self.max_queue_len:
+            result = 'queue_full'
+        elif not self.admission.admit():
+            result = 'shed'
+        else:
+            return None
+
+        TRANSACTIONS_SUBMITTED.inc(n, result=result)
+        return response.json({'error': "Queue full. Resubmit shortly."}, status=503, headers={
+            'Access-Control-Allow-Origin': '*', 'Retry-After': str(self.admission.retry_after(len(self.queue)))
+        })
+
+    def throttle_ip(self, request, cost=1):
+        # Returns the response to send if the client IP is over its limit. A batch bigger than the burst costs a full
+        # bucket so it can still get through.
+        if self.ip_limiter is None:
+            return None
+
+        cost = min(cost, self.ip_limiter.burst)
+        if self.ip_limiter.allow(request.ip, cost):
+            return None
+
+        THROTTLED.inc(limit='ip')
+        TRANSACTIONS_SUBMITTED.inc(cost, result='throttled')
+        return response.json(RATE_LIMITED, status=429, headers={
+            'Access-Control-Allow-Origin': '*', 'Retry-After': str(self.ip_limiter.retry_after(request.ip, cost))
+        })
+
+    async def simulate(self, request):
+        # Body is an unsigned payload: sender, contract, function, kwargs and optionally stamps. Nothing is committed.
+        payload = decode(request.body)
+
+        well_formed = (
+            isinstance(payload, dict) and
+            isinstance(payload.get('sender'), str) and
+            isinstance(payload.get('contract'), str) and
+            isinstance(payload.get('function'), str) and
+            isinstance(payload.get('kwargs', {}), dict) and
+            (payload.get('stamps') is None or isinstance(payload['stamps'], int))
+        )
+
+        if not well_formed:
+            return response.json({'error': 'Expected sender, contract, function and kwargs.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        if self.client.raw_driver.get_contract(payload['contract']) is None:
+            return response.json({'error': '{} does not exist'.format(payload['contract'])}, status=404, headers={'Access-Control-Allow-Origin': '*'})
+
+        if self.simulator.busy():
+            return response.json({'error': 'Too many simulations running. Try again shortly.'}, status=503, headers={'Access-Control-Allow-Origin': '*'})
+
+        stamp_cost = self.client.get_var(contract='stamp_cost', variable='S', arguments=['value'], mark=False)
+
+        # Guessing a cost would report stamp usage the network doesn't agree with
+        if stamp_cost is None:
+            log.error('Stamp cost is not set. Cannot simulate.')
+            return response.json({'error': 'Stamp cost is not set on this node.'}, status=503, headers={'Access-Control-Allow-Origin': '*'})
+
+        result = await self.simulator.run(
+            sender=payload['sender'],
+            contract=payload['contract'],
+            function=payload['function'],
+            kwargs=payload.get('kwargs', {}),
+            stamps=payload.get('stamps'),
+            stamp_cost=stamp_cost,
+            timestamp=int(time.time()),
+            block_hash=storage.get_latest_block_hash(self.driver),
+            block_num=storage.get_latest_block_height(self.driver) + 1
+        )
+
+        return response.raw(result.encode(), content_type='application/json', headers={'Access-Control-Allow-Origin': '*'})
+
     # Network Status
     async def ping(self, request):
         return response.json({'status': 'online'}, headers={'Access-Control-Allow-Origin': '*'})
 
+    async def get_metrics(self, request):
+        return response.text(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+    async def get_trace(self, request):
+        if self.tracer is None:
+            return response.json({'error': 'Tracing is not enabled.'}, status=404, headers={'Access-Control-Allow-Origin': '*'})
+
+        return response.text(self.tracer.dumps(), content_type='application/json', headers={'Access-Control-Allow-Origin': '*'})
+
     # Get VK of this Masternode for Nonces
     async def get_id(self, request):
         return response.json({'verifying_key': self.wallet.verifying_key}, headers={'Access-Control-Allow-Origin': '*'})
@@ -201,36 +546,25 @@ class WebServer:
 
     # Get all Contracts in State (list of names)
     async def get_contracts(self, request):
-        contracts = self.client.get_contracts()
-        return response.json({'contracts': contracts}, headers={'Access-Control-Allow-Origin': '*'})
+        return response.raw(self.contracts.get_names(), content_type='application/json', headers={'Access-Control-Allow-Origin': '*'})
 
     # Get the source code of a specific contract
     async def get_contract(self, request, contract):
-        contract_code = self.client.raw_driver.get_contract(contract)
-
-        if contract_code is None:
-            return response.json({'error': '{} does not exist'.format(contract)}, status=404, headers={'Access-Control-Allow-Origin': '*'})
-        return response.json({'name': contract, 'code': contract_code}, status=200, headers={'Access-Control-Allow-Origin': '*'})
+        return self.contract_response(contract, 'contract')
 
     async def get_methods(self, request, contract):
-        contract_code = self.client.raw_driver.get_contract(contract)
-
-        if contract_code is None:
-            return response.json({'error': '{} does not exist'.format(contract)}, status=404, headers={'Access-Control-Allow-Origin': '*'})
-
-        funcs = parser.methods_for_contract(contract_code)
-
-        return response.json({'methods': funcs}, status=200, headers={'Access-Control-Allow-Origin': '*'})
+        return self.contract_response(contract, 'methods')
 
     async def get_variables(self, request, contract):
-        contract_code = self.client.raw_driver.get_contract(contract)
+        return self.contract_response(contract, 'variables')
 
-        if contract_code is None:
-            return response.json({'error': '{} does not exist'.format(contract)}, status=404, headers={'Access-Control-Allow-Origin': '*'})
+    def contract_response(self, contract, field):
+        entry = self.contracts.get(contract)
 
-        variables = parser.variables_for_contract(contract_code)
+        if entry is None:
+            return response.json({'error': '{} does not exist'.format(contract)}, status=404, headers={'Access-Control-Allow-Origin': '*'})
 
-        return response.json(variables, headers={'Access-Control-Allow-Origin': '*'})
+        return response.raw(entry[field], content_type='application/json', headers={'Access-Control-Allow-Origin': '*'})
 
     async def get_variable(self, request, contract, variable):
         contract_code = self.client.raw_driver.get_contract(contract)
@@ -250,25 +584,117 @@ class WebServer:
         else:
             return response.json({'value': value}, status=200, dumps=encode, headers={'Access-Control-Allow-Origin': '*'})
 
-    # async def iterate_variable(self, request, contract, variable):
-    #     contract_code = self.client.raw_driver.get_contract(contract)
-    #
-    #     if contract_code is None:
-    #         return response.json({'error': '{} does not exist'.format(contract)}, status=404)
-    #
-    #     key = request.args.get('key')
-    #     # if key is not None:
-    #     #     key = key.split(',')
-    #
-    #     k = self.client.raw_driver.make_key(contract=contract, variable=variable, args=key)
-    #
-    #     values = self.client.raw_driver.driver.iter(k, length=500)
-    #
-    #     if len(values) == 0:
-    #         return response.json({'values': None}, status=404)
-    #     return response.json({'values': values, 'next': values[-1]}, status=200)
+    def batch_keys(self, body):
+        # State keys for a batch read, or None if the body is malformed
+        reads = body.get('keys') if isinstance(body, dict) else None
+        if not isinstance(reads, list) or not 0 < len(reads) <= self.max_batch_read:
+            return None
 
-    async def get_latest_block(self, request):
+        keys = []
+        for read in reads:
+            if not isinstance(read, dict):
+                return None
+
+            key = read.get('key')
+            if isinstance(key, str):
+                key = key.split(',')
+
+            if not isinstance(read.get('contract'), str) or not isinstance(read.get('variable'), str):
+                return None
+
+            if key is not None and not isinstance(key, list):
+                return None
+
+            keys.append(self.client.raw_driver.make_key(contract=read['contract'], variable=read['variable'], args=key))
+
+        return keys
+
+    async def get_variables_batch(self, request):
+        # Body is {'keys': [{'contract': ..., 'variable': ..., 'key': [...]}, ...]}. Values come back in the same order,
+        # None for anything unset.
+        keys = self.batch_keys(request.json)
+        if keys is None:
+            return response.json({'error': f'Expected between 1 and {self.max_batch_read} keys with a contract and variable.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        # Anything the client has cached is served from there, everything else in one query off the event loop
+        cache = self.client.raw_driver.cache
+        misses = [k for k in keys if cache.get(k) is None]
+
+        found = {}
+        if len(misses) > 0:
+            found = await asyncio.get_event_loop().run_in_executor(
+                None, storage.get_many, self.client.raw_driver.driver, misses
+            )
+
+        values = [found.get(k) if cache.get(k) is None else cache[k] for k in keys]
+
+        return response.json({'values': values}, dumps=encode, headers={'Access-Control-Allow-Origin': '*'})
+
+    async def iterate_variable(self, request, contract, variable):
+        contract_code = self.client.raw_driver.get_contract(contract)
+
+        if contract_code is None:
+            return response.json({'error': '{} does not exist'.format(contract)}, status=404, headers={'Access-Control-Allow-Origin': '*'})
+
+        try:
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            return response.json({'error': 'Malformed limit.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        if not 0 < limit <= self.max_iterate_page:
+            return response.json({'error': f'Limit must be between 1 and {self.max_iterate_page}.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        # key narrows a multihash to the entries under its leading arguments
+        key = request.args.get('key')
+        if key is not None:
+            key = key.split(',')
+
+        prefix = self.client.raw_driver.make_key(contract=contract, variable=variable, args=key) + ':'
+
+        # Keys and the cursor are relative to the prefix
+        cursor = request.args.get('cursor')
+        after = None if cursor is None else prefix + cursor
+
+        # Scans can be long, so they run off the event loop
+        items = await asyncio.get_event_loop().run_in_executor(
+            None, storage.iterate_prefix, self.client.raw_driver.driver, prefix, after, limit
+        )
+
+        async def stream(r):
+            await r.write('{"values": [')
+
+            for i, (k, v) in enumerate(items):
+                await r.write((',' if i > 0 else '') + encode({'key': k[len(prefix):], 'value': v}))
+
+            nxt = items[-1][0][len(prefix):] if len(items) == limit else None
+            await r.write('], "next": ' + _json.dumps(nxt) + '}')
+
+        return response.stream(stream, content_type='application/json', headers={'Access-Control-Allow-Origin': '*'})
+
+    def drop_batch(self, key, reason):
+        # Marks a lost batch dropped and closes out anyone subscribed to its transactions
+        self.feed.publish_dropped(self.tx_status.dropped(key, reason))
+
+    def settled_tx_events(self, hashes):
+        # tx events for whatever is already in a block or dropped. Anything still pending or batched is left to the feed.
+        events = {}
+        for h in hashes:
+            record = self.tx_status.get(h)
+            if record is not None and record['status'] == storage.TX_DROPPED:
+                events[h] = dropped_frame(h, record['reason'])
+                continue
+
+            tx = self.blocks.get_tx(h, with_position=True)
+            if tx is not None:
+                events[h] = tx_frame(tx, tx[storage.TX_BLOCK])
+            elif record is None:
+                # Never submitted here and not in any block, so there will never be an event for it
+                events[h] = dropped_frame(h, 'Unknown transaction.')
+
+        return events
+
+    def publish_head(self):
+        # Called by the masternode after each block so the head endpoints are served from memory between blocks
         index = self.blocks.get_last_n(n=1, collection=storage.BlockStorage.BLOCK)
         if len(index) == 0:
             block = {
@@ -279,14 +705,32 @@ class WebServer:
             }
         else:
             block = index[0]
-        return response.json(block, dumps=ByteEncoder().encode, headers={'Access-Control-Allow-Origin': '*'})
 
-    async def get_latest_block_number(self, request):
+        self.head.publish(
+            block=block,
+            number=storage.get_latest_block_height(self.driver),
+            h=storage.get_latest_block_hash(self.driver)
+        )
+
+    def head_response(self, request, name):
+        if self.head.etag is None:
+            self.publish_head()
+
+        headers = {'Access-Control-Allow-Origin': '*', 'ETag': self.head.etag, 'Cache-Control': 'no-cache'}
 
-        return response.json({'latest_block_number': storage.get_latest_block_height(self.driver)}, headers={'Access-Control-Allow-Origin': '*'})
+        if request.headers.get('If-None-Match') == self.head.etag:
+            return response.raw(b'', status=304, headers=headers)
+
+        return response.raw(self.head.responses[name], content_type='application/json', headers=headers)
+
+    async def get_latest_block(self, request):
+        return self.head_response(request, 'block')
+
+    async def get_latest_block_number(self, request):
+        return self.head_response(request, 'number')
 
     async def get_latest_block_hash(self, request):
-        return response.json({'latest_block_hash': storage.get_latest_block_hash(self.driver)}, headers={'Access-Control-Allow-Origin': '*'})
+        return self.head_response(request, 'hash')
 
     async def get_block(self, request):
         num = request.args.get('num')
@@ -304,6 +748,24 @@ class WebServer:
 
         return response.json(block, dumps=ByteEncoder().encode, headers={'Access-Control-Allow-Origin': '*'})
 
+    async def get_block_headers(self, request):
+        try:
+            start = int(request.args.get('from'))
+            end = request.args.get('to')
+            end = start + self.max_header_range - 1 if end is None else int(end)
+        except (TypeError, ValueError):
+            return response.json({'error': 'Provide an integer from and optional to block number.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        if start < 0 or end < start:
+            return response.json({'error': 'Invalid block range.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        if end - start + 1 > self.max_header_range:
+            return response.json({'error': f'Range is limited to {self.max_header_range} blocks.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        headers = self.blocks.get_headers(start, end)
+
+        return response.json({'headers': headers}, dumps=ByteEncoder().encode, headers={'Access-Control-Allow-Origin': '*'})
+
     async def get_tx(self, request):
         _hash = request.args.get('hash')
 
@@ -321,6 +783,106 @@ class WebServer:
 
         return response.json(tx, dumps=ByteEncoder().encode, headers={'Access-Control-Allow-Origin': '*'})
 
+    async def get_tx_status(self, request):
+        _hash = request.args.get('hash')
+
+        if _hash is None:
+            return response.json({'error': 'No tx hash provided.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        status = self.tx_status.get(_hash)
+
+        if status is None:
+            return response.json({'error': 'Transaction not found.'}, status=404, headers={'Access-Control-Allow-Origin': '*'})
+
+        return response.json({'hash': _hash, **status}, headers={'Access-Control-Allow-Origin': '*'})
+
+    async def get_tx_history(self, request):
+        # Newest first. Pass the returned 'next' back as cursor to get the following page.
+        try:
+            limit = int(request.args.get('limit', 50))
+
+            cursor = request.args.get('cursor')
+            if cursor is not None:
+                block, position = cursor.split(':')
+                cursor = (int(block), int(position))
+        except ValueError:
+            return response.json({'error': 'Malformed limit or cursor.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        if not 0 < limit <= self.max_history_page:
+            return response.json({'error': f'Limit must be between 1 and {self.max_history_page}.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        # The page is read on a worker thread so the database round trips don't block the event loop
+        txs = await asyncio.get_event_loop().run_in_executor(None, lambda: list(self.blocks.get_tx_history(
+            sender=request.args.get('sender'),
+            contract=request.args.get('contract'),
+            function=request.args.get('function'),
+            before=cursor,
+            limit=limit
+        )))
+
+        nxt = None
+        if len(txs) == limit:
+            nxt = f'{txs[-1][storage.TX_BLOCK]}:{txs[-1][storage.TX_POSITION]}'
+
+        for tx in txs:
+            del tx[storage.TX_BLOCK], tx[storage.TX_POSITION]
+
+        body = ByteEncoder().encode({'transactions': txs, 'next': nxt})
+
+        return response.raw(body.encode(), content_type='application/json', headers={'Access-Control-Allow-Origin': '*'})
+
+    async def subscribe(self, request):
+        # Server sent events. blocks=false turns off new block events, tx takes a comma separated list of hashes to
+        # hear about once they are in a block or dropped.
+        blocks = request.args.get('blocks', 'true').lower() != 'false'
+
+        txs = request.args.get('tx')
+        txs = [] if txs is None else [h for h in txs.split(',') if len(h) > 0]
+
+        if len(txs) > self.max_subscribed_txs:
+            return response.json({'error': f'Can subscribe to at most {self.max_subscribed_txs} transactions.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        if not blocks and len(txs) == 0:
+            return response.json({'error': 'Nothing to subscribe to.'}, status=400, headers={'Access-Control-Allow-Origin': '*'})
+
+        sub = self.feed.subscribe(blocks=blocks, txs=txs)
+
+        if sub is None:
+            return response.json({'error': 'Too many subscribers. Try again shortly.'}, status=503, headers={'Access-Control-Allow-Origin': '*'})
+
+        # Transactions can settle before the client subscribes. Looked up after subscribing so none slip through in
+        # between, and settle skips any the feed already delivered while the lookup ran.
+        if len(txs) > 0:
+            settled = await asyncio.get_event_loop().run_in_executor(None, self.settled_tx_events, list(sub.txs))
+            for h, event in settled.items():
+                self.feed.settle(sub, h, event)
+
+        async def stream(r):
+            try:
+                await r.write(': subscribed\n\n')
+
+                while True:
+                    try:
+                        event = await asyncio.wait_for(sub.queue.get(), timeout=self.heartbeat)
+                    except asyncio.TimeoutError:
+                        # Keeps proxies from closing an idle connection and notices clients that went away
+                        await r.write(': ping\n\n')
+                        continue
+
+                    if event is EVICTED:
+                        if sub.evicted:
+                            await r.write('event: evicted\ndata: {}\n\n')
+                        break
+
+                    await r.write(event)
+
+                    if sub.done() and sub.queue.empty():
+                        break
+            finally:
+                self.feed.unsubscribe(sub)
+
+        return response.stream(stream, content_type='text/event-stream', headers={'Access-Control-Allow-Origin': '*', 'Cache-Control': 'no-cache'})
+
     async def get_constitution(self, request):
         masternodes = self.client.get_var(
             contract='masternodes',
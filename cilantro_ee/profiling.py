@@ -0,0 +1,139 @@
+import heapq
+import json
+import random
+
+from cilantro_ee import metrics
+
+# Opt in profiler for contract execution. When enabled it aggregates wall time, stamps and writes per contract and
+# function and keeps the slowest transactions seen. When disabled, the only cost per transaction is the should_sample
+# check. Results are exported through the metrics registry.
+
+
+class FunctionStats:
+    __slots__ = ('calls', 'seconds', 'max_seconds', 'stamps', 'writes')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.stamps = 0
+        self.writes = 0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'max_seconds': self.max_seconds,
+            'stamps': self.stamps,
+            'writes': self.writes
+        }
+
+
+class ContractProfiler:
+    def __init__(self, enabled=False, sample_rate=1.0, top_n=20):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+
+        # (contract, function) -> FunctionStats
+        self.stats = {}
+
+        # Min heap of (seconds, tx hash, contract, function, stamps) holding the top_n slowest transactions
+        self.slowest = []
+
+    def should_sample(self):
+        if not self.enabled:
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, contract, function, seconds, stamps, writes, tx_hash=''):
+        key = (contract, function)
+
+        s = self.stats.get(key)
+        if s is None:
+            s = FunctionStats()
+            self.stats[key] = s
+
+        s.calls += 1
+        s.seconds += seconds
+        s.stamps += stamps
+        s.writes += writes
+        if seconds > s.max_seconds:
+            s.max_seconds = seconds
+
+        entry = (seconds, tx_hash, contract, function, stamps)
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def top(self):
+        return [
+            {
+                'hash': h,
+                'contract': c,
+                'function': f,
+                'seconds': s,
+                'stamps': stamps
+            } for s, h, c, f, stamps in sorted(self.slowest, reverse=True)
+        ]
+
+    def report(self):
+        return {
+            'functions': [
+                {'contract': c, 'function': f, **s.to_dict()} for (c, f), s in sorted(self.stats.items())
+            ],
+            'slowest': self.top()
+        }
+
+    def dumps(self):
+        return json.dumps(self.report())
+
+    def reset(self):
+        self.stats.clear()
+        self.slowest.clear()
+
+
+class ProfileMetric(metrics.Metric):
+    # Exposes one field of the profiler's per function stats as a labelled series
+    def __init__(self, profiler: ContractProfiler, field, name, documentation, kind='counter'):
+        super().__init__(name, documentation, ('contract', 'function'))
+        self.profiler = profiler
+        self.field = field
+        self.kind = kind
+
+    def samples(self):
+        for key, s in sorted(self.profiler.stats.items()):
+            yield '', metrics.format_labels(self.labelnames, key), getattr(s, self.field)
+
+
+class SlowestTransactionsMetric(metrics.Metric):
+    kind = 'gauge'
+
+    def __init__(self, profiler: ContractProfiler, name, documentation):
+        super().__init__(name, documentation, ('rank', 'contract', 'function', 'hash'))
+        self.profiler = profiler
+
+    def samples(self):
+        for rank, tx in enumerate(self.profiler.top()):
+            key = (str(rank), tx['contract'], tx['function'], tx['hash'])
+            yield '', metrics.format_labels(self.labelnames, key), tx['seconds']
+
+
+def register_metrics(profiler: ContractProfiler, registry: metrics.Registry=metrics.REGISTRY):
+    registry.register(ProfileMetric(profiler, 'calls', 'cilantro_contract_calls_total',
+                                    'Profiled calls per contract function.'))
+    registry.register(ProfileMetric(profiler, 'seconds', 'cilantro_contract_seconds_total',
+                                    'Wall time spent executing each contract function.'))
+    registry.register(ProfileMetric(profiler, 'max_seconds', 'cilantro_contract_max_seconds',
+                                    'Slowest single call of each contract function.', kind='gauge'))
+    registry.register(ProfileMetric(profiler, 'stamps', 'cilantro_contract_stamps_total',
+                                    'Stamps used by each contract function.'))
+    registry.register(ProfileMetric(profiler, 'writes', 'cilantro_contract_writes_total',
+                                    'State writes made by each contract function.'))
+    registry.register(SlowestTransactionsMetric(profiler, 'cilantro_contract_slowest_tx_seconds',
+                                                'Wall time of the slowest profiled transactions.'))
+
+
+PROFILER = ContractProfiler()
+register_metrics(PROFILER)
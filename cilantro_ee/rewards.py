@@ -18,10 +18,18 @@ REQUIRED_CONTRACTS = [
 ]
 DUST_EXPONENT = 8
 
+# Rewards accumulated between settlements when settle_every > 1. Kept in state so every node settles the same amounts
+# even if it restarts part way through a period.
+PENDING_REWARDS_KEY = '__pending_rewards'
+
 log = get_logger('Rewards')
 
 
 class RewardManager:
+    def __init__(self, settle_every=1):
+        # Rewards are paid out on blocks whose number is a multiple of settle_every
+        self.settle_every = settle_every
+
     @staticmethod
     def contract_exists(name: str, client: ContractingClient):
         return client.get_contract(name) is not None
@@ -117,12 +125,87 @@ class RewardManager:
         return RewardManager.stamps_in_block(block) / client.get_var(contract='stamp_cost', variable='S', arguments=['value'])
 
     @staticmethod
-    def issue_rewards(block, client: ContractingClient):
+    def calculate_reward_deltas(block, client: ContractingClient):
+        # Every recipient's total reward for the block. Governance values are each read once.
         total_tau_to_split = RewardManager.calculate_tau_to_split(block, client)
 
-        rewards = RewardManager.calculate_all_rewards(
-            total_tau_to_split=total_tau_to_split,
-            client=client
-        )
+        master_ratio, delegate_ratio, burn_ratio, foundation_ratio = \
+            client.get_var(contract='rewards', variable='S', arguments=['value'])
+
+        masters = client.get_var(contract='masternodes', variable='S', arguments=['members'])
+        delegates = client.get_var(contract='delegates', variable='S', arguments=['members'])
+        foundation_wallet = client.get_var(contract='foundation', variable='owner')
 
-        RewardManager.distribute_rewards(*rewards, client=client)
+        master_reward = ContractingDecimal(RewardManager.calculate_participant_reward(
+            participant_ratio=master_ratio,
+            number_of_participants=len(masters),
+            total_tau_to_split=total_tau_to_split
+        ))
+
+        delegate_reward = ContractingDecimal(RewardManager.calculate_participant_reward(
+            participant_ratio=delegate_ratio,
+            number_of_participants=len(delegates),
+            total_tau_to_split=total_tau_to_split
+        ))
+
+        foundation_reward = ContractingDecimal(RewardManager.calculate_participant_reward(
+            participant_ratio=foundation_ratio,
+            number_of_participants=1,
+            total_tau_to_split=total_tau_to_split
+        ))
+
+        # burn does nothing, as the stamps are already deducted from supply
+
+        log.info(f'Master reward: {format(master_reward, ".4f")}t per master. '
+                 f'Delegate reward: {format(delegate_reward, ".4f")}t per delegate. '
+                 f'Foundation reward: {format(foundation_reward, ".4f")}t. '
+                 f'Remainder is burned.')
+
+        deltas = {}
+        for vk, amount in [(m, master_reward) for m in masters] + \
+                          [(d, delegate_reward) for d in delegates] + \
+                          [(foundation_wallet, foundation_reward)]:
+            deltas[vk] = deltas[vk] + amount if vk in deltas else amount
+
+        return deltas
+
+    @staticmethod
+    def merge_reward_deltas(a: dict, b: dict):
+        merged = dict(a)
+        for vk, amount in b.items():
+            merged[vk] = merged[vk] + amount if vk in merged else amount
+        return merged
+
+    @staticmethod
+    def apply_reward_deltas(deltas: dict, client: ContractingClient):
+        # One read and one pending write per recipient. The writes are committed with the rest of the block.
+        for vk, amount in deltas.items():
+            current_balance = client.get_var(contract='currency', variable='balances', arguments=[vk], mark=False)
+
+            if current_balance is None:
+                current_balance = ContractingDecimal(0)
+
+            client.set_var(
+                contract='currency',
+                variable='balances',
+                arguments=[vk],
+                value=amount + current_balance,
+                mark=True
+            )
+
+    def issue_rewards(self, block, client: ContractingClient):
+        deltas = RewardManager.calculate_reward_deltas(block, client)
+
+        if self.settle_every <= 1:
+            RewardManager.apply_reward_deltas(deltas, client)
+            return
+
+        pending = client.raw_driver.get(PENDING_REWARDS_KEY, mark=False) or {}
+        pending = RewardManager.merge_reward_deltas(pending, deltas)
+
+        if block['number'] % self.settle_every == 0:
+            log.info(f'Settling rewards for {len(pending)} recipients.')
+            RewardManager.apply_reward_deltas(pending, client)
+            pending = None
+
+        client.raw_driver.set(PENDING_REWARDS_KEY, pending, mark=True)
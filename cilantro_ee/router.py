@@ -6,6 +6,7 @@ from contracting.db.encoder import encode, decode
 from zmq.error import ZMQBaseError
 from zmq.auth.certs import load_certificate
 from cilantro_ee.logger.base import get_logger
+from cilantro_ee import metrics
 import pathlib
 import os
 CERT_DIR = 'cilsocks'
@@ -13,6 +14,14 @@ DEFAULT_DIR = pathlib.Path.home() / CERT_DIR
 
 logger = get_logger('Router')
 
+MESSAGES_RECEIVED = metrics.REGISTRY.counter(
+    'cilantro_router_messages_received_total', 'Messages handled by the router.', ('service', )
+)
+
+MESSAGES_SENT = metrics.REGISTRY.counter(
+    'cilantro_router_messages_sent_total', 'Messages sent to other nodes.', ('service', )
+)
+
 OK = {
     'response': 'ok'
 }
@@ -170,9 +179,12 @@ class Router(JSONAsyncInbox):
         processor = self.services.get(service)
 
         if processor is None:
+            MESSAGES_RECEIVED.inc(service='unknown')
             await super().return_msg(_id, OK)
             return
 
+        MESSAGES_RECEIVED.inc(service=service)
+
         response = await processor.process_message(request)
 
         if response is None:
@@ -217,6 +229,8 @@ async def secure_send(msg: dict, service, wallet: Wallet, vk, ip, ctx: zmq.async
     await socket.send(payload, flags=zmq.NOBLOCK)
     socket.close()
 
+    MESSAGES_SENT.inc(service=service)
+
 
 async def secure_request(msg: dict, service: str, wallet: Wallet, vk: str, ip: str, ctx: zmq.asyncio.Context,
                          linger=500, timeout=1000, cert_dir=DEFAULT_DIR):
@@ -250,6 +264,7 @@ async def secure_request(msg: dict, service: str, wallet: Wallet, vk: str, ip: s
     payload = encode(message).encode()
 
     await socket.send(payload)
+    MESSAGES_SENT.inc(service=service)
 
     event = await socket.poll(timeout=timeout, flags=zmq.POLLIN)
     msg = None
@@ -1,7 +1,15 @@
 from contracting.db.driver import ContractDriver
-from pymongo import MongoClient, DESCENDING
+from contracting.client import ContractingClient
+from contracting.db.encoder import decode
+from contracting.compilation import parser
+from pymongo import MongoClient, DESCENDING, ASCENDING, UpdateOne
+from collections import OrderedDict
+import hashlib
+import json
+import time
 
 import cilantro_ee
+from cilantro_ee import metrics
 from cilantro_ee.logger.base import get_logger
 
 BLOCK_HASH_KEY = '_current_block_hash'
@@ -11,6 +19,10 @@ PENDING_NONCE_KEY = '__pn'
 
 log = get_logger('STATE')
 
+MONGO_LATENCY = metrics.REGISTRY.histogram(
+    'cilantro_mongo_latency_seconds', 'Time spent in MongoDB calls.', ('operation', )
+)
+
 
 class NonceStorage:
     def __init__(self, port=27027, db_name='lamden', nonce_collection='nonces', pending_collection='pending_nonces', config_path=cilantro_ee.__path__[0]):
@@ -25,12 +37,13 @@ class NonceStorage:
 
     @staticmethod
     def get_one(sender, processor, db):
-        v = db.find_one(
-            {
-                'sender': sender,
-                'processor': processor
-            }
-        )
+        with MONGO_LATENCY.time(operation='get_nonce'):
+            v = db.find_one(
+                {
+                    'sender': sender,
+                    'processor': processor
+                }
+            )
 
         if v is None:
             return None
@@ -39,18 +52,19 @@ class NonceStorage:
 
     @staticmethod
     def set_one(sender, processor, value, db):
-        db.update_one(
-            {
-                'sender': sender,
-                'processor': processor
-            },
-            {
-                '$set':
-                    {
-                        'value': value
-                    }
-            }, upsert=True
-        )
+        with MONGO_LATENCY.time(operation='set_nonce'):
+            db.update_one(
+                {
+                    'sender': sender,
+                    'processor': processor
+                },
+                {
+                    '$set':
+                        {
+                            'value': value
+                        }
+                }, upsert=True
+            )
 
     def get_nonce(self, sender, processor):
         return self.get_one(sender, processor, self.nonces)
@@ -132,11 +146,285 @@ def update_state_with_block(block, driver: ContractDriver, nonces: NonceStorage)
     set_latest_block_height(block['number'], driver=driver)
 
 
+# Governance values read several times every round. Everything else passes straight through to the client.
+GOVERNANCE_VARIABLES = (
+    ('masternodes', 'S', ['members']),
+    ('delegates', 'S', ['members']),
+    ('stamp_cost', 'S', ['value']),
+    ('rewards', 'S', ['value']),
+    ('foundation', 'owner', []),
+)
+
+
+class GovernanceCache:
+    def __init__(self, client: ContractingClient, variables=GOVERNANCE_VARIABLES):
+        self.client = client
+
+        self.keys = {
+            self.client.raw_driver.make_key(contract, variable, arguments) for contract, variable, arguments in variables
+        }
+
+        # Raw state key -> value. Only holds keys in self.keys.
+        self.values = {}
+
+    def get_var(self, contract, variable, arguments=[], mark=False):
+        key = self.client.raw_driver.make_key(contract, variable, arguments)
+
+        if key not in self.keys:
+            return self.client.get_var(contract=contract, variable=variable, arguments=arguments, mark=mark)
+
+        try:
+            return self.values[key]
+        except KeyError:
+            value = self.client.get_var(contract=contract, variable=variable, arguments=arguments, mark=False)
+            self.values[key] = value
+            return value
+
+    def invalidate(self, keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def invalidate_block(self, block):
+        # Called once a block's writes have been committed. Only the governance keys it touched are dropped.
+        for sb in block['subblocks']:
+            for tx in sb['transactions']:
+                if tx['state'] is None:
+                    continue
+
+                for delta in tx['state']:
+                    self.values.pop(delta['key'], None)
+
+    def clear(self):
+        self.values.clear()
+
+    def __getattr__(self, item):
+        # Acts as the client for everything else so it can be handed to code expecting a ContractingClient
+        return getattr(self.client, item)
+
+
+CODE_SUFFIX = '.__code__'
+
+
+def code_hash(code: str):
+    return hashlib.sha3_256(code.encode()).hexdigest()
+
+
+class ContractCache:
+    # Serialized responses for the contract metadata endpoints. Code only changes when a block writes a contract's
+    # __code__ key, so entries live until invalidate_block sees that happen.
+    def __init__(self, client: ContractingClient):
+        self.client = client
+
+        # Contract name -> {'hash': code hash, 'contract': bytes, 'methods': bytes, 'variables': bytes}
+        self.entries = {}
+        self.names = None
+
+    def get(self, name):
+        entry = self.entries.get(name)
+        if entry is not None:
+            return entry
+
+        code = self.client.raw_driver.get_contract(name)
+        if code is None:
+            return None
+
+        entry = {
+            'hash': code_hash(code),
+            'contract': json.dumps({'name': name, 'code': code}).encode(),
+            'methods': json.dumps({'methods': parser.methods_for_contract(code)}).encode(),
+            'variables': json.dumps(parser.variables_for_contract(code)).encode()
+        }
+
+        self.entries[name] = entry
+        return entry
+
+    def get_names(self):
+        if self.names is None:
+            self.names = json.dumps({'contracts': self.client.get_contracts()}).encode()
+        return self.names
+
+    def invalidate_block(self, block):
+        for sb in block['subblocks']:
+            for tx in sb['transactions']:
+                if tx['state'] is None:
+                    continue
+
+                for delta in tx['state']:
+                    if not delta['key'].endswith(CODE_SUFFIX):
+                        continue
+
+                    name = delta['key'][:-len(CODE_SUFFIX)]
+                    entry = self.entries.get(name)
+
+                    # Resubmitting identical code leaves the parsed metadata valid
+                    if entry is not None and isinstance(delta['value'], str) and entry['hash'] == code_hash(delta['value']):
+                        continue
+
+                    self.entries.pop(name, None)
+                    self.names = None
+
+    def clear(self):
+        self.entries.clear()
+        self.names = None
+
+
+def header_from_block(block):
+    # Compact summary of a block for explorers and light clients that don't need the transactions
+    subblocks = []
+    transactions = 0
+    stamps_used = 0
+
+    for sb in block.get('subblocks', []):
+        txs = sb.get('transactions', [])
+        leaves = sb.get('merkle_leaves', [])
+
+        transactions += len(txs)
+        stamps_used += sum(tx.get('stamps_used', 0) for tx in txs)
+
+        subblocks.append({
+            'subblock': sb.get('subblock'),
+            'input_hash': sb.get('input_hash'),
+            'merkle_root': leaves[0] if len(leaves) > 0 else None,
+            'transactions': len(txs)
+        })
+
+    return {
+        'hash': block.get('hash'),
+        'number': block.get('number'),
+        'previous': block.get('previous'),
+        'transactions': transactions,
+        'stamps_used': stamps_used,
+        'subblocks': subblocks
+    }
+
+
+def iterate_prefix(driver, prefix, after=None, limit=100):
+    # Pages through committed state under a key prefix in key order. driver is the Mongo backed contracting Driver, not
+    # the cache in front of it. Everything under the prefix sorts between the prefix and the prefix with its last
+    # character bumped, so each page is one range scan on _id. Returns a list of (key, value) pairs.
+    assert len(prefix) > 0, 'Prefix scans need a prefix.'
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    lower = {'$gte': prefix} if after is None or after < prefix else {'$gt': after}
+
+    cur = driver.db.find({'_id': {**lower, '$lt': upper}}).sort('_id', ASCENDING).limit(limit)
+
+    with MONGO_LATENCY.time(operation='iterate_prefix'):
+        return [(entry['_id'], decode(entry['v'])) for entry in cur]
+
+
+def get_many(driver, keys):
+    # One round trip for a batch of committed state keys. Keys that don't exist are left out of the returned dict.
+    with MONGO_LATENCY.time(operation='get_many'):
+        return {entry['_id']: decode(entry['v']) for entry in driver.db.find({'_id': {'$in': list(keys)}})}
+
+
+TX_PENDING = 'pending'
+TX_BATCHED = 'batched'
+TX_IN_BLOCK = 'in_block'
+TX_DROPPED = 'dropped'
+
+
+class TxStatusIndex:
+    # Where each submitted transaction is in the pipeline, keyed by hash. Every state is kept in memory. Only in_block
+    # and dropped are written to Mongo: pending and batched transactions live in memory on this node and would be
+    # gone after a restart anyway.
+    def __init__(self, db='lamden', collection='tx_status', max_cached=100_000):
+        self.client = MongoClient()
+        self.collection = self.client.get_database(db)[collection]
+
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+
+        # Batches sent to delegates that haven't been settled by a block yet: input hash -> tx hashes. Input hashes commit
+        # to the masternode that made the batch, so a subblock from another masternode never settles one of ours.
+        self.in_flight = {}
+
+    def update(self, records: dict, persist=False):
+        now = int(time.time())
+        for h, record in records.items():
+            record['updated'] = now
+            self.cache[h] = record
+            self.cache.move_to_end(h)
+
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+
+        if persist and len(records) > 0:
+            with MONGO_LATENCY.time(operation='put_tx_status'):
+                self.collection.bulk_write(
+                    [UpdateOne({'_id': h}, {'$set': r}, upsert=True) for h, r in records.items()], ordered=False
+                )
+
+    def pending(self, hashes):
+        self.update({h: {'status': TX_PENDING} for h in hashes})
+
+    def batched(self, input_hash, hashes):
+        self.in_flight[input_hash] = set(hashes)
+        self.update({h: {'status': TX_BATCHED} for h in hashes})
+
+    def finalize_block(self, block):
+        # Everything in the block is final. When one of our batches is in it, whatever the delegates left out of its
+        # subblock was rejected. Batches of ours that aren't in this block may still be in a later one. Returns the
+        # records of the rejected transactions.
+        records = {}
+        dropped = {}
+        for sb in block['subblocks']:
+            for tx in sb['transactions']:
+                records[tx['hash']] = {'status': TX_IN_BLOCK, 'block': block['number'], 'code': tx['status']}
+
+            batch = self.in_flight.pop(sb.get('input_hash'), None)
+            if batch is None:
+                continue
+
+            for h in batch:
+                if h not in records:
+                    dropped[h] = {'status': TX_DROPPED, 'reason': f'Rejected by delegates in block {block["number"]}.'}
+
+        records.update(dropped)
+        self.update(records, persist=True)
+
+        return dropped
+
+    def dropped(self, input_hash, reason):
+        # The whole batch was lost before any of it could make it into a block. Returns the records written.
+        batch = self.in_flight.pop(input_hash, None)
+        if batch is None:
+            return {}
+
+        records = {h: {'status': TX_DROPPED, 'reason': reason} for h in batch}
+        self.update(records, persist=True)
+
+        return records
+
+    def get(self, h):
+        record = self.cache.get(h)
+        if record is not None:
+            return record
+
+        with MONGO_LATENCY.time(operation='get_tx_status'):
+            return self.collection.find_one({'_id': h}, {'_id': False})
+
+    def flush(self):
+        self.collection.drop()
+        self.cache.clear()
+        self.in_flight.clear()
+
+
+# Where a transaction sits in the chain. Stored on each tx document for the history indexes, hidden from lookups.
+TX_BLOCK = '_block'
+TX_POSITION = '_position'
+
+TX_PROJECTION = {'_id': False, TX_BLOCK: False, TX_POSITION: False}
+
+
 class BlockStorage:
     BLOCK = 0
     TX = 1
+    HEADER = 2
 
-    def __init__(self, port=27027, config_path=cilantro_ee.__path__[0], db='lamden', blocks_collection='blocks', tx_collection='tx'):
+    def __init__(self, port=27027, config_path=cilantro_ee.__path__[0], db='lamden', blocks_collection='blocks', tx_collection='tx',
+                 headers_collection='headers'):
         # Setup configuration file to read constants
         self.config_path = config_path
 
@@ -147,6 +435,24 @@ class BlockStorage:
 
         self.blocks = self.db[blocks_collection]
         self.txs = self.db[tx_collection]
+        self.headers = self.db[headers_collection]
+
+        # Created on first write so constructing storage doesn't need a live database
+        self.indexed = False
+
+    def create_indexes(self):
+        self.headers.create_index('number')
+
+        # History queries are newest first, so every index ends in the chain position
+        newest_first = [(TX_BLOCK, DESCENDING), (TX_POSITION, DESCENDING)]
+        self.txs.create_index('hash')
+        self.txs.create_index(newest_first)
+        self.txs.create_index([('transaction.payload.sender', ASCENDING)] + newest_first)
+        self.txs.create_index([('transaction.payload.contract', ASCENDING)] + newest_first)
+        self.txs.create_index([('transaction.payload.contract', ASCENDING),
+                               ('transaction.payload.function', ASCENDING)] + newest_first)
+
+        self.indexed = True
 
     def q(self, v):
         if isinstance(v, int):
@@ -158,7 +464,8 @@ class BlockStorage:
             return None
 
         q = self.q(v)
-        block = self.blocks.find_one(q)
+        with MONGO_LATENCY.time(operation='get_block'):
+            block = self.blocks.find_one(q)
 
         if block is not None:
             block.pop('_id')
@@ -166,11 +473,20 @@ class BlockStorage:
         return block
 
     def put(self, data, collection=BLOCK):
+        if not self.indexed and collection != BlockStorage.BLOCK:
+            self.create_indexes()
+
         if collection == BlockStorage.BLOCK:
-            _id = self.blocks.insert_one(data)
+            with MONGO_LATENCY.time(operation='put_block'):
+                _id = self.blocks.insert_one(data)
             del data['_id']
         elif collection == BlockStorage.TX:
-            _id = self.txs.insert_one(data)
+            with MONGO_LATENCY.time(operation='put_tx'):
+                _id = self.txs.insert_one(data)
+            del data['_id']
+        elif collection == BlockStorage.HEADER:
+            with MONGO_LATENCY.time(operation='put_header'):
+                _id = self.headers.insert_one(data)
             del data['_id']
         else:
             return False
@@ -183,11 +499,12 @@ class BlockStorage:
         else:
             return None
 
-        block_query = c.find({}, {'_id': False}).sort(
-            'number', DESCENDING
-        ).limit(n)
+        with MONGO_LATENCY.time(operation='get_last_n'):
+            block_query = c.find({}, {'_id': False}).sort(
+                'number', DESCENDING
+            ).limit(n)
 
-        blocks = [block for block in block_query]
+            blocks = [block for block in block_query]
 
         if len(blocks) > 1:
             first_block_num = blocks[0].get('number')
@@ -197,26 +514,78 @@ class BlockStorage:
 
         return blocks
 
-    def get_tx(self, h):
-        tx = self.txs.find_one({'hash': h})
+    def get_headers(self, start, end):
+        # Inclusive range of block numbers, oldest first
+        with MONGO_LATENCY.time(operation='get_headers'):
+            headers = self.headers.find(
+                {'number': {'$gte': start, '$lte': end}}, {'_id': False}
+            ).sort('number', ASCENDING)
 
-        if tx is not None:
-            tx.pop('_id')
+            return [h for h in headers]
+
+    def rebuild_indexes(self):
+        # Backfills headers and transaction chain positions from stored blocks, for databases written before they existed
+        self.headers.drop()
+        self.indexed = False
+
+        for block in self.blocks.find({}, {'_id': False}).sort('number', ASCENDING):
+            self.put(header_from_block(block), BlockStorage.HEADER)
+
+            position = 0
+            for subblock in block['subblocks']:
+                for tx in subblock['transactions']:
+                    self.txs.update_one(
+                        {'hash': tx['hash']}, {'$set': {TX_BLOCK: block['number'], TX_POSITION: position}}
+                    )
+                    position += 1
+
+    def get_tx(self, h, with_position=False):
+        # with_position keeps TX_BLOCK and TX_POSITION on the document
+        with MONGO_LATENCY.time(operation='get_tx'):
+            tx = self.txs.find_one({'hash': h}, {'_id': False} if with_position else TX_PROJECTION)
 
         return tx
 
+    def get_tx_history(self, sender=None, contract=None, function=None, before=None, limit=50):
+        # Keyset pagination. before is the (block, position) of the last transaction on the previous page, so every page
+        # is a single index range scan no matter how deep it is.
+        q = {}
+        if sender is not None:
+            q['transaction.payload.sender'] = sender
+        if contract is not None:
+            q['transaction.payload.contract'] = contract
+        if function is not None:
+            q['transaction.payload.function'] = function
+
+        if before is not None:
+            block, position = before
+            q['$or'] = [
+                {TX_BLOCK: {'$lt': block}},
+                {TX_BLOCK: block, TX_POSITION: {'$lt': position}}
+            ]
+
+        # Yields documents that still carry their chain position so the caller can build the next cursor
+        return self.txs.find(q, {'_id': False}).sort(
+            [(TX_BLOCK, DESCENDING), (TX_POSITION, DESCENDING)]
+        ).limit(limit)
+
     def drop_collections(self):
         self.blocks.drop()
         self.txs.drop()
+        self.headers.drop()
+        self.indexed = False
 
     def flush(self):
         self.drop_collections()
 
     def store_block(self, block):
         self.put(block, BlockStorage.BLOCK)
+        self.put(header_from_block(block), BlockStorage.HEADER)
         self.store_txs(block)
 
     def store_txs(self, block):
+        position = 0
         for subblock in block['subblocks']:
             for tx in subblock['transactions']:
-                self.put(tx, BlockStorage.TX)
+                self.put({**tx, TX_BLOCK: block.get('number'), TX_POSITION: position}, BlockStorage.TX)
+                position += 1
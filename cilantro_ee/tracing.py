@@ -0,0 +1,110 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Records how long each consensus phase takes for each block. Spans go into a fixed size ring buffer so tracing can be
+# left on in production. Dumps use the Chrome trace event format (chrome://tracing, Perfetto) and traces from several
+# nodes can be merged into one network wide timeline.
+
+MASTERNODE_PHASES = ('send_work', 'gather_subblocks', 'process_new_block', 'nbn_multicast')
+DELEGATE_PHASES = ('acquire_work', 'execute_work', 'contender_multicast', 'process_new_block')
+
+
+class Span:
+    __slots__ = ('name', 'start', 'end', 'block', 'tags')
+
+    def __init__(self, name, start, end, block=None, tags=None):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.block = block
+        self.tags = tags or {}
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def to_event(self, pid, node):
+        args = {'node': node, **self.tags}
+        if self.block is not None:
+            args['block'] = self.block
+
+        # Timestamps and durations are in microseconds since the epoch so separate nodes line up when merged
+        return {
+            'name': self.name,
+            'cat': 'consensus',
+            'ph': 'X',
+            'ts': int(self.start * 1_000_000),
+            'dur': int(self.duration * 1_000_000),
+            'pid': pid,
+            'tid': 0,
+            'args': args
+        }
+
+
+class Tracer:
+    def __init__(self, node='', max_spans=10_000, enabled=True):
+        self.node = node
+        self.enabled = enabled
+        self.spans = deque(maxlen=max_spans)
+
+    @contextmanager
+    def span(self, name, block=None, **tags):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.spans.append(Span(name, start, time.time(), block, tags))
+
+    def record(self, name, start, end, block=None, **tags):
+        if self.enabled:
+            self.spans.append(Span(name, start, end, block, tags))
+
+    def spans_for_block(self, block):
+        return [s for s in self.spans if s.block == block]
+
+    def to_chrome_trace(self, pid=0):
+        events = [{
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': 0,
+            'args': {'name': self.node}
+        }]
+
+        events.extend(s.to_event(pid, self.node) for s in self.spans)
+
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms'
+        }
+
+    def dumps(self, pid=0):
+        return json.dumps(self.to_chrome_trace(pid))
+
+    def dump(self, path, pid=0):
+        with open(path, 'w') as f:
+            f.write(self.dumps(pid))
+
+    def clear(self):
+        self.spans.clear()
+
+
+def merge_chrome_traces(traces: list):
+    # Each node's trace gets its own process row in the merged timeline
+    events = []
+    for pid, trace in enumerate(traces):
+        for e in trace.get('traceEvents', []):
+            e = dict(e)
+            e['pid'] = pid
+            events.append(e)
+
+    return {
+        'traceEvents': events,
+        'displayTimeUnit': 'ms'
+    }
@@ -119,7 +119,7 @@ class ComplexMockMasternode:
         self.tx_batcher = TransactionBatcher(wallet=self.wallet, queue=[])
 
     async def send_to_work_socket(self):
-        await self.delegate_work.send(self.tx_batcher.pack_current_queue())
+        await self.delegate_work.send(self.tx_batcher.pack_current_queue()[0])
 
     async def send_new_block_to_socket(self, b=None):
         if b is None:
@@ -120,7 +120,7 @@ class TestFullFlow(TestCase):
             )
 
             tx_decoded = decode(tx)
-            mn.tx_batcher.queue.append(tx_decoded)
+            mn.tx_batcher.queue.append((tx_decoded, canonical.tx_hash_from_tx(tx_decoded)))
 
             await asyncio.sleep(2)
 
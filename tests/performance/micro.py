@@ -0,0 +1,278 @@
+from cilantro_ee.crypto import canonical, transaction, wallet
+from cilantro_ee.crypto.wallet import Wallet
+from cilantro_ee.formatting import primatives, rules
+from cilantro_ee import storage
+from contracting.db.encoder import encode, decode
+from contracting.client import ContractingClient
+from contracting.db.driver import ContractDriver, InMemDriver
+from tests.performance import report
+import argparse
+import secrets
+import time
+import sys
+import os
+
+# Microbenchmarks for the pure Python functions every transaction goes through. Each benchmark reports the best seconds
+# per call over several repeats and is compared against a baseline file so regressions show up before they cost TPS.
+#
+#   python -m tests.performance.micro                  # run and compare against baseline.json
+#   python -m tests.performance.micro --save           # run and write a new baseline
+#   python -m tests.performance.micro -k merklize      # only benchmarks whose name contains 'merklize'
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+PROCESSOR = Wallet()
+
+# name -> setup function returning a zero argument callable
+BENCHMARKS = {}
+
+# Cleanups registered by the benchmark being set up, run once it has been measured
+TEARDOWNS = []
+
+
+def benchmark(name):
+    def register(f):
+        BENCHMARKS[name] = f
+        return f
+    return register
+
+
+def make_transaction(sender: Wallet=None, kwargs=None, nonce=0):
+    sender = sender or Wallet()
+    tx = transaction.build_transaction(
+        wallet=sender,
+        contract='currency',
+        function='transfer',
+        kwargs=kwargs or {'amount': 100, 'to': secrets.token_hex(32)},
+        stamps=10_000,
+        processor=PROCESSOR.verifying_key,
+        nonce=nonce
+    )
+    return decode(tx)
+
+
+def deep_kwargs(depth=5, width=3):
+    # Nested dicts with unsorted keys so format_dictionary has real work to do
+    d = {f'k{i}': i for i in reversed(range(width))}
+    for level in range(depth):
+        d = {f'level{level}_{i}': dict(d) if i == 0 else [dict(d)] for i in reversed(range(width))}
+    return d
+
+
+def make_tx_output(tx):
+    return canonical.format_dictionary({
+        'hash': canonical.tx_hash_from_tx(tx),
+        'transaction': tx,
+        'status': 0,
+        'state': [{'key': f'currency.balances:{tx["payload"]["sender"]}', 'value': 100}],
+        'stamps_used': 1000,
+        'result': 'None'
+    })
+
+
+def make_subblocks(num_txs, num_subblocks=4):
+    txs = [make_transaction() for _ in range(num_txs)]
+    per_sb = max(num_txs // num_subblocks, 1)
+
+    subblocks = []
+    for i in range(num_subblocks):
+        outputs = [make_tx_output(tx) for tx in txs[i * per_sb:(i + 1) * per_sb]]
+        leaves = [encode(o).encode() for o in outputs]
+
+        subblocks.append({
+            'input_hash': secrets.token_hex(32),
+            'transactions': outputs,
+            'merkle_leaves': canonical.merklize(leaves),
+            'signatures': [{'signer': secrets.token_hex(32), 'signature': secrets.token_hex(64)}],
+            'subblock': i,
+            'previous': secrets.token_hex(32)
+        })
+
+    return subblocks
+
+
+@benchmark('format_dictionary.tx')
+def bench_format_dictionary_tx():
+    tx = make_transaction()
+    return lambda: canonical.format_dictionary(tx)
+
+
+@benchmark('format_dictionary.deep_kwargs')
+def bench_format_dictionary_deep():
+    tx = make_transaction(kwargs=deep_kwargs())
+    return lambda: canonical.format_dictionary(tx)
+
+
+@benchmark('tx_hash_from_tx')
+def bench_tx_hash():
+    tx = make_transaction()
+    return lambda: canonical.tx_hash_from_tx(tx)
+
+
+@benchmark('tx_hash_from_tx.deep_kwargs')
+def bench_tx_hash_deep():
+    tx = make_transaction(kwargs=deep_kwargs())
+    return lambda: canonical.tx_hash_from_tx(tx)
+
+
+def _merklize(n):
+    leaves = [encode(make_tx_output(make_transaction())).encode() for _ in range(n)]
+    return lambda: canonical.merklize(leaves)
+
+
+@benchmark('merklize.1k')
+def bench_merklize_1k():
+    return _merklize(1_000)
+
+
+@benchmark('merklize.10k')
+def bench_merklize_10k():
+    return _merklize(10_000)
+
+
+def _block_from_subblocks(n):
+    subblocks = make_subblocks(n)
+    previous = secrets.token_hex(32)
+    return lambda: canonical.block_from_subblocks(subblocks, previous, 1)
+
+
+@benchmark('block_from_subblocks.1k')
+def bench_block_1k():
+    return _block_from_subblocks(1_000)
+
+
+@benchmark('block_from_subblocks.10k')
+def bench_block_10k():
+    return _block_from_subblocks(10_000)
+
+
+@benchmark('wallet.verify')
+def bench_verify():
+    w = Wallet()
+    msg = encode(make_transaction(sender=w)['payload'])
+    sig = w.sign(msg)
+    return lambda: wallet.verify(w.verifying_key, msg, sig)
+
+
+@benchmark('check_format.transaction')
+def bench_check_format():
+    tx = make_transaction()
+    return lambda: primatives.check_format(tx, rules.TRANSACTION_RULES)
+
+
+@benchmark('check_format.transaction.deep_kwargs')
+def bench_check_format_deep():
+    tx = make_transaction(kwargs=deep_kwargs())
+    return lambda: primatives.check_format(tx, rules.TRANSACTION_RULES)
+
+
+@benchmark('recurse_rules.transaction')
+def bench_recurse_rules():
+    # The uncompiled rule walker, kept here to show what compile_rules saves
+    tx = make_transaction()
+    keys = set(rules.TRANSACTION_RULES.keys())
+    return lambda: primatives.dict_has_keys(tx, keys) and primatives.recurse_rules(tx, rules.TRANSACTION_RULES)
+
+
+@benchmark('transaction_is_valid')
+def bench_transaction_is_valid():
+    sender = Wallet()
+
+    # Throwaway state so the benchmark never touches the node's real collection
+    client = ContractingClient(driver=ContractDriver(driver=InMemDriver()))
+    client.set_var(contract='currency', variable='balances', arguments=[sender.verifying_key], value=1_000_000)
+    client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=20_000)
+
+    nonces = storage.NonceStorage(nonce_collection='bench-nonces', pending_collection='bench-pending')
+    nonces.flush()
+
+    TEARDOWNS.append(client.flush)
+    TEARDOWNS.append(nonces.flush)
+
+    tx = make_transaction(sender=sender)
+
+    # Nonces are never advanced so the same transaction stays valid on every call
+    return lambda: transaction.transaction_is_valid(
+        transaction=tx,
+        expected_processor=PROCESSOR.verifying_key,
+        client=client,
+        nonces=nonces
+    )
+
+
+def measure(f, repeat=5, min_time=0.2):
+    # Scale the loop count until a single repeat takes at least min_time, then keep the best repeat
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            f()
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            f()
+        best = min(best, time.perf_counter() - start)
+
+    return best / loops
+
+
+def run(names, repeat=5, min_time=0.2):
+    results = {}
+    for name in names:
+        f = BENCHMARKS[name]()
+        try:
+            results[name] = measure(f, repeat=repeat, min_time=min_time)
+        finally:
+            while len(TEARDOWNS) > 0:
+                TEARDOWNS.pop()()
+        print(f'{name:<45} {results[name] * 1_000_000:>14.2f} us')
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the transaction hot paths.')
+    parser.add_argument('-k', '--filter', type=str, default='')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--min_time', type=float, default=0.2)
+    parser.add_argument('-b', '--baseline', type=str, default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('-o', '--output', type=str, default=None)
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if args.filter in n]
+    results = run(names, repeat=args.repeat, min_time=args.min_time)
+
+    if args.output is not None:
+        report.save({'environment': report.environment(), 'results': results}, args.output)
+
+    if args.save:
+        report.save({'environment': report.environment(), 'results': results}, args.baseline)
+        print(f'Baseline written to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}. Run with --save to create one.')
+        return
+
+    regressions = report.compare(results, report.load(args.baseline)['results'], tolerance=args.tolerance)
+
+    for name, (expected, current, change) in sorted(regressions.items()):
+        print(f'REGRESSION {name}: {expected * 1_000_000:.2f} us -> {current * 1_000_000:.2f} us (+{change:.0%})')
+
+    if len(regressions) > 0:
+        sys.exit(1)
+
+    print('No regressions against baseline.')
+
+
+if __name__ == '__main__':
+    main()
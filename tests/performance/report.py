@@ -0,0 +1,66 @@
+import json
+import math
+import platform
+import time
+
+# Helpers shared by the benchmark scripts for summarising samples and writing results to disk. Kept free of any node
+# imports so they can be used (and tested) without a running network.
+
+
+def percentile(samples, p):
+    # Nearest rank percentile. p is between 0 and 100.
+    if len(samples) == 0:
+        return None
+
+    ordered = sorted(samples)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    if len(samples) == 0:
+        return {'count': 0, 'min': None, 'mean': None, 'p50': None, 'p99': None, 'max': None}
+
+    return {
+        'count': len(samples),
+        'min': min(samples),
+        'mean': sum(samples) / len(samples),
+        'p50': percentile(samples, 50),
+        'p99': percentile(samples, 99),
+        'max': max(samples)
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'timestamp': int(time.time())
+    }
+
+
+def save(results: dict, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance=0.2):
+    # Both map benchmark name -> seconds per call. Returns {name: (baseline, current, change)} for every benchmark
+    # that got slower than the tolerance allows. Benchmarks missing from either side are ignored.
+    regressions = {}
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected is None or expected <= 0:
+            continue
+
+        change = (current - expected) / expected
+        if change > tolerance:
+            regressions[name] = (expected, current, change)
+
+    return regressions
@@ -0,0 +1,309 @@
+from cilantro_ee.crypto.wallet import Wallet
+from cilantro_ee.crypto import transaction
+from contracting.db.driver import ContractDriver, Driver
+from tests.integration.mock import mocks
+from tests.performance import report
+import multiprocessing
+import argparse
+import asyncio
+import secrets
+import psutil
+import httpx
+import time
+import zmq.asyncio
+
+# End to end throughput benchmark. Starts a local network built from the integration mocks with every node in its own
+# process, floods it with signed currency transfers and measures how long each one takes to land in a block.
+#
+#   python -m tests.performance.throughput -m 1 -d 2 -s 20 -t 50 -o throughput.json
+#
+# State lives in the local Mongo instance, one set of collections per node, exactly like the integration tests.
+
+
+def run_node(role, index, seed, bootnodes, constitution):
+    ctx = zmq.asyncio.Context()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    if role == 'masternode':
+        node = mocks.MockMaster(ctx=ctx, index=index)
+    else:
+        node = mocks.MockDelegate(ctx=ctx, index=index)
+
+    node.wallet = Wallet(seed)
+    node.set_start_variables(bootnodes=bootnodes, constitution=constitution)
+
+    loop.run_until_complete(node.start())
+    loop.run_forever()
+
+
+class BenchmarkNetwork:
+    def __init__(self, num_of_masternodes, num_of_delegates):
+        # (role, index, wallet)
+        self.nodes = []
+
+        for i in range(num_of_masternodes):
+            self.nodes.append(('masternode', i, Wallet()))
+
+        for i in range(num_of_masternodes, num_of_masternodes + num_of_delegates):
+            self.nodes.append(('delegate', i, Wallet()))
+
+        self.constitution = {
+            'masternodes': [w.verifying_key for r, _, w in self.nodes if r == 'masternode'],
+            'delegates': [w.verifying_key for r, _, w in self.nodes if r == 'delegate']
+        }
+
+        self.bootnodes = {w.verifying_key: f'tcp://127.0.0.1:{18000 + i}' for _, i, w in self.nodes}
+
+        self.processes = []
+
+    @property
+    def masternodes(self):
+        return [(i, w) for r, i, w in self.nodes if r == 'masternode']
+
+    def webserver(self, index):
+        return f'http://127.0.0.1:{18080 + index}'
+
+    def start(self):
+        for role, index, wallet in self.nodes:
+            p = multiprocessing.Process(
+                target=run_node,
+                args=(role, index, wallet.signing_key, self.bootnodes, self.constitution),
+                daemon=True
+            )
+            p.start()
+            self.processes.append((role, index, wallet, psutil.Process(p.pid), p))
+
+    async def wait_until_online(self, timeout=60):
+        deadline = time.time() + timeout
+        async with httpx.AsyncClient() as client:
+            for index, _ in self.masternodes:
+                while True:
+                    try:
+                        r = await client.get(f'{self.webserver(index)}/ping')
+                        if r.status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+
+                    assert time.time() < deadline, 'Network did not come online.'
+                    await asyncio.sleep(0.5)
+
+    def fund(self, wallets, amount):
+        # Balances are written straight into every node's state so the flood doesn't wait on funding blocks
+        for _, index, _ in self.nodes:
+            driver = ContractDriver(driver=Driver(collection=f'state-{index}'))
+            for w in wallets:
+                driver.set_var(contract='currency', variable='balances', arguments=[w.verifying_key], value=amount)
+            driver.commit()
+
+    def stop(self):
+        for _, _, _, _, p in self.processes:
+            p.terminate()
+            p.join()
+
+
+class ResourceSampler:
+    def __init__(self, processes, interval=1):
+        self.processes = processes
+        self.interval = interval
+
+        # index -> list of (cpu percent, rss bytes)
+        self.samples = {index: [] for _, index, _, _, _ in processes}
+
+    async def run(self):
+        for _, _, _, proc, _ in self.processes:
+            proc.cpu_percent(interval=None)
+
+        while True:
+            await asyncio.sleep(self.interval)
+            for _, index, _, proc, _ in self.processes:
+                try:
+                    self.samples[index].append((proc.cpu_percent(interval=None), proc.memory_info().rss))
+                except psutil.NoSuchProcess:
+                    pass
+
+    def results(self):
+        nodes = []
+        for role, index, wallet, _, _ in self.processes:
+            cpu = [c for c, _ in self.samples[index]]
+            rss = [m for _, m in self.samples[index]]
+
+            nodes.append({
+                'role': role,
+                'index': index,
+                'vk': wallet.verifying_key,
+                'cpu_percent': report.summarize(cpu),
+                'rss_bytes': report.summarize(rss)
+            })
+
+        return nodes
+
+
+class Flood:
+    def __init__(self, network: BenchmarkNetwork, senders, txs_per_sender, stamps):
+        self.network = network
+        self.senders = senders
+        self.txs_per_sender = txs_per_sender
+        self.stamps = stamps
+
+        # tx hash -> submit time / finality time
+        self.submitted = {}
+        self.finalized = {}
+
+        self.rejected = 0
+
+    async def send_all(self, client, wallet, mn_index, processor):
+        r = await client.get(f'{self.network.webserver(mn_index)}/nonce/{wallet.verifying_key}')
+        nonce = r.json()['nonce']
+
+        sent = 0
+        while sent < self.txs_per_sender:
+            tx = transaction.build_transaction(
+                wallet=wallet,
+                contract='currency',
+                function='transfer',
+                kwargs={'amount': 1, 'to': secrets.token_hex(32)},
+                stamps=self.stamps,
+                processor=processor,
+                nonce=nonce
+            )
+
+            submitted = time.time()
+            r = await client.post(f'{self.network.webserver(mn_index)}/', data=tx)
+            body = r.json()
+
+            if body.get('hash') is not None:
+                self.submitted[body['hash']] = submitted
+                nonce += 1
+                sent += 1
+            elif body == transaction.EXCEPTION_MAP[transaction.TransactionTooManyPendingException] or r.status_code == 503:
+                # Sender is at the per block pending limit or the queue is full. Back off until the next block.
+                await asyncio.sleep(0.1)
+            else:
+                self.rejected += 1
+                sent += 1
+
+    async def watch_blocks(self, client, mn_index):
+        url = self.network.webserver(mn_index)
+
+        r = await client.get(f'{url}/latest_block_num')
+        seen = r.json()['latest_block_number']
+
+        while True:
+            r = await client.get(f'{url}/latest_block_num')
+            latest = r.json()['latest_block_number']
+
+            for num in range(seen + 1, latest + 1):
+                block = (await client.get(f'{url}/blocks', params={'num': num})).json()
+                now = time.time()
+                for sb in block.get('subblocks', []):
+                    for tx in sb.get('transactions', []):
+                        self.finalized.setdefault(tx['hash'], now)
+
+            seen = latest
+            await asyncio.sleep(0.05)
+
+    def done(self):
+        return len(self.submitted) > 0 and all(h in self.finalized for h in self.submitted)
+
+    async def run(self, timeout):
+        masternodes = self.network.masternodes
+
+        async with httpx.AsyncClient(timeout=30) as client:
+            watcher = asyncio.ensure_future(self.watch_blocks(client, masternodes[0][0]))
+
+            senders = []
+            for i, wallet in enumerate(self.senders):
+                mn_index, mn_wallet = masternodes[i % len(masternodes)]
+                senders.append(self.send_all(client, wallet, mn_index, mn_wallet.verifying_key))
+
+            start = time.time()
+            await asyncio.gather(*senders)
+
+            while not self.done() and time.time() - start < timeout:
+                await asyncio.sleep(0.1)
+
+            watcher.cancel()
+
+        return start
+
+    def results(self, start):
+        latencies = [self.finalized[h] - t for h, t in self.submitted.items() if h in self.finalized]
+
+        end = max((self.finalized[h] for h in self.submitted if h in self.finalized), default=start)
+        elapsed = end - start
+
+        return {
+            'submitted': len(self.submitted),
+            'rejected': self.rejected,
+            'finalized': len(latencies),
+            'elapsed_seconds': elapsed,
+            'tps': len(latencies) / elapsed if elapsed > 0 else 0,
+            'latency_seconds': report.summarize(latencies)
+        }
+
+
+async def benchmark(args):
+    network = BenchmarkNetwork(args.masternodes, args.delegates)
+    network.start()
+
+    sampler = ResourceSampler(network.processes)
+
+    try:
+        await network.wait_until_online()
+
+        senders = [Wallet() for _ in range(args.senders)]
+        network.fund(senders, amount=args.balance)
+
+        # Let the nodes settle before load starts
+        await asyncio.sleep(args.warmup)
+
+        sampling = asyncio.ensure_future(sampler.run())
+
+        flood = Flood(network, senders, args.txs, args.stamps)
+        start = await flood.run(timeout=args.timeout)
+
+        sampling.cancel()
+    finally:
+        network.stop()
+
+    return {
+        'config': {
+            'masternodes': args.masternodes,
+            'delegates': args.delegates,
+            'senders': args.senders,
+            'txs_per_sender': args.txs,
+            'stamps': args.stamps
+        },
+        'environment': report.environment(),
+        'throughput': flood.results(start),
+        'nodes': sampler.results()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End to end throughput benchmark on a local network.')
+    parser.add_argument('-m', '--masternodes', type=int, default=1)
+    parser.add_argument('-d', '--delegates', type=int, default=2)
+    parser.add_argument('-s', '--senders', type=int, default=10)
+    parser.add_argument('-t', '--txs', type=int, default=50, help='Transactions sent by each sender.')
+    parser.add_argument('--stamps', type=int, default=10_000)
+    parser.add_argument('--balance', type=int, default=1_000_000)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('-o', '--output', type=str, default='throughput.json')
+    args = parser.parse_args()
+
+    results = asyncio.get_event_loop().run_until_complete(benchmark(args))
+    report.save(results, args.output)
+
+    t = results['throughput']
+    print(f"{t['finalized']}/{t['submitted']} transactions finalized in {t['elapsed_seconds']:.2f}s. "
+          f"{t['tps']:.2f} TPS. "
+          f"p50 {t['latency_seconds']['p50']}s, p99 {t['latency_seconds']['p99']}s.")
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
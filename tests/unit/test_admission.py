@@ -0,0 +1,75 @@
+from unittest import TestCase
+from cilantro_ee.nodes.masternode.admission import AdmissionController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdmissionController(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.controller = AdmissionController(target=2, interval=10, clock=self.clock)
+
+    def batch_after(self, seconds, n):
+        self.clock.now += seconds
+        self.controller.dequeued(n)
+
+    def test_short_waits_admit(self):
+        self.controller.enqueued(5)
+        self.batch_after(1, 5)
+
+        self.assertTrue(self.controller.admit())
+
+    def test_burst_above_target_is_tolerated_for_an_interval(self):
+        self.controller.enqueued(10)
+        self.batch_after(3, 5)
+
+        self.assertTrue(self.controller.admit())
+
+    def test_standing_queue_sheds(self):
+        self.controller.enqueued(100)
+
+        self.batch_after(3, 10)
+        self.batch_after(10, 10)
+
+        self.assertTrue(self.controller.shedding)
+        self.assertFalse(self.controller.admit())
+
+    def test_recovers_once_below_target(self):
+        self.controller.enqueued(100)
+        self.batch_after(3, 10)
+        self.batch_after(10, 10)
+
+        self.controller.enqueued(1)
+        self.batch_after(0, 81)
+
+        self.assertTrue(self.controller.admit())
+
+    def test_delay_is_measured_on_newest_dequeued(self):
+        self.controller.enqueued(1)
+        self.clock.now = 5
+        self.controller.enqueued(1)
+
+        self.batch_after(1, 2)
+
+        self.assertIsNone(self.controller.first_above)
+
+    def test_stalled_queue_sheds(self):
+        self.controller.enqueued(1)
+        self.clock.now = 13
+
+        self.assertFalse(self.controller.admit())
+
+    def test_retry_after_from_throughput(self):
+        self.controller.dequeued(0)
+        self.batch_after(1, 10)
+
+        self.assertEqual(self.controller.retry_after(50), 5)
+
+    def test_retry_after_without_throughput_is_interval(self):
+        self.assertEqual(self.controller.retry_after(50), 10)
@@ -1,7 +1,7 @@
 from unittest import TestCase
 import zmq.asyncio
 from cilantro_ee.crypto.wallet import Wallet
-from cilantro_ee.authentication import SocketAuthenticator
+from cilantro_ee.authentication import SocketAuthenticator, curve_key_for
 import os
 from nacl.signing import SigningKey
 from cilantro_ee.contracts import sync
@@ -99,3 +99,66 @@ class TestAuthenticator(TestCase):
         self.assertTrue(os.path.exists(os.path.join(s.cert_dir, f'{w1.verifying_key}.key')))
         self.assertTrue(os.path.exists(os.path.join(s.cert_dir, f'{w2.verifying_key}.key')))
         self.assertTrue(os.path.exists(os.path.join(s.cert_dir, f'{w3.verifying_key}.key')))
+
+    def set_members(self, masternodes, delegates):
+        self.c.set_var(contract='masternodes', variable='S', arguments=['members'], value=masternodes)
+        self.c.set_var(contract='delegates', variable='S', arguments=['members'], value=delegates)
+
+    def test_refresh_allows_members_through_credentials(self):
+        mn = Wallet().verifying_key
+        dl = Wallet().verifying_key
+        self.set_members([mn], [dl])
+
+        s = SocketAuthenticator(client=self.c, ctx=self.ctx)
+        s.refresh_governance_sockets()
+        s.authenticator.stop()
+
+        self.assertTrue(s.credentials.callback('*', curve_key_for(mn)))
+        self.assertTrue(s.credentials.callback('*', curve_key_for(dl)))
+        self.assertFalse(s.credentials.callback('*', curve_key_for(Wallet().verifying_key)))
+
+    def test_refresh_removes_only_departed_members(self):
+        stays = Wallet().verifying_key
+        leaves = Wallet().verifying_key
+        self.set_members([stays], [leaves])
+
+        s = SocketAuthenticator(client=self.c, ctx=self.ctx)
+        s.refresh_governance_sockets()
+
+        self.set_members([stays], [])
+        s.refresh_governance_sockets()
+        s.authenticator.stop()
+
+        self.assertTrue(os.path.exists(os.path.join(s.cert_dir, f'{stays}.key')))
+        self.assertFalse(os.path.exists(os.path.join(s.cert_dir, f'{leaves}.key')))
+        self.assertFalse(s.credentials.callback('*', curve_key_for(leaves)))
+
+    def test_refresh_unchanged_membership_does_nothing(self):
+        mn = Wallet().verifying_key
+        self.set_members([mn], [])
+
+        s = SocketAuthenticator(client=self.c, ctx=self.ctx)
+        s.refresh_governance_sockets()
+
+        added = []
+        s.add_verifying_key = added.append
+        s.remove_verifying_key = added.append
+
+        s.refresh_governance_sockets()
+        s.authenticator.stop()
+
+        self.assertEqual(added, [])
+
+    def test_refresh_drops_bootnodes_not_in_governance(self):
+        mn = Wallet().verifying_key
+        boot = Wallet().verifying_key
+        self.set_members([mn], [])
+
+        s = SocketAuthenticator(client=self.c, ctx=self.ctx, bootnodes={boot: '127.0.0.1:18000'})
+        self.assertTrue(s.credentials.callback('*', curve_key_for(boot)))
+
+        s.refresh_governance_sockets()
+        s.authenticator.stop()
+
+        self.assertFalse(s.credentials.callback('*', curve_key_for(boot)))
+        self.assertTrue(s.credentials.callback('*', curve_key_for(mn)))
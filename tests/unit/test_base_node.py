@@ -640,3 +640,18 @@ class TestNode(TestCase):
         m = node.get_masternode_peers()
 
         self.assertEqual(m, {mn_wallet.verifying_key: mn_bootnode})
+
+    def test_settle_every_reaches_reward_manager(self):
+        node = base.Node(
+            socket_base='tcp://127.0.0.1:18004',
+            ctx=self.ctx,
+            wallet=Wallet(),
+            constitution={
+                'masternodes': [Wallet().verifying_key],
+                'delegates': [Wallet().verifying_key]
+            },
+            driver=ContractDriver(driver=InMemDriver()),
+            settle_every=10
+        )
+
+        self.assertEqual(node.reward_manager.settle_every, 10)
@@ -0,0 +1,54 @@
+from unittest import TestCase
+from tests.performance import report
+import tempfile
+import os
+
+
+class TestBenchmarkReport(TestCase):
+    def test_percentile_empty_is_none(self):
+        self.assertIsNone(report.percentile([], 50))
+
+    def test_percentile_nearest_rank(self):
+        samples = list(range(1, 101))
+
+        self.assertEqual(report.percentile(samples, 50), 50)
+        self.assertEqual(report.percentile(samples, 99), 99)
+        self.assertEqual(report.percentile(samples, 100), 100)
+        self.assertEqual(report.percentile(samples, 0), 1)
+
+    def test_percentile_unsorted_input(self):
+        self.assertEqual(report.percentile([5, 1, 3], 50), 3)
+
+    def test_summarize(self):
+        s = report.summarize([1, 2, 3, 4])
+
+        self.assertEqual(s['count'], 4)
+        self.assertEqual(s['min'], 1)
+        self.assertEqual(s['max'], 4)
+        self.assertEqual(s['mean'], 2.5)
+        self.assertEqual(s['p50'], 2)
+
+    def test_summarize_empty(self):
+        self.assertEqual(report.summarize([])['count'], 0)
+
+    def test_save_and_load_round_trip(self):
+        results = {'throughput': {'tps': 123.4}, 'nodes': []}
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'results.json')
+            report.save(results, path)
+
+            self.assertEqual(report.load(path), results)
+
+    def test_compare_flags_only_regressions_past_tolerance(self):
+        baseline = {'a': 1.0, 'b': 1.0, 'c': 1.0}
+        results = {'a': 1.1, 'b': 1.5, 'c': 0.5}
+
+        regressions = report.compare(results, baseline, tolerance=0.2)
+
+        self.assertEqual(list(regressions.keys()), ['b'])
+        self.assertEqual(regressions['b'][0], 1.0)
+        self.assertEqual(regressions['b'][1], 1.5)
+
+    def test_compare_ignores_new_benchmarks(self):
+        self.assertEqual(report.compare({'new': 1.0}, {}), {})
@@ -460,7 +460,8 @@ class TestAggregator(TestCase):
               MockSBC('input_3', 'res_3', 2).to_dict(),
               MockSBC('input_4', 'res_4', 3).to_dict()]
 
-        a.sbc_inbox.q = [c1, c2, c3, c4]
+        for c in [c1, c2, c3, c4]:
+            a.sbc_inbox.add_contender(c)
 
         res = self.loop.run_until_complete(a.gather_subblocks(4))
 
@@ -492,7 +493,8 @@ class TestAggregator(TestCase):
               MockSBC('input_3', 'res_3', 2).to_dict(),
               MockSBC('input_4', 'res_X', 3).to_dict()]
 
-        a.sbc_inbox.q = [c1, c2, c3, c4]
+        for c in [c1, c2, c3, c4]:
+            a.sbc_inbox.add_contender(c)
 
         res = self.loop.run_until_complete(a.gather_subblocks(4))
 
@@ -524,7 +526,8 @@ class TestAggregator(TestCase):
                              MockSBC('input_3', 'res_3', 2).to_dict(),
                              MockSBC('input_4', 'res_X', 3).to_dict()]
 
-        a.sbc_inbox.q = [c1, c2, c3, c4]
+        for c in [c1, c2, c3, c4]:
+            a.sbc_inbox.add_contender(c)
 
         res = self.loop.run_until_complete(a.gather_subblocks(4))
 
@@ -551,7 +554,8 @@ class TestAggregator(TestCase):
                              MockSBC('input_3', 'res_3', 2).to_dict(),
                              MockSBC('input_4', 'res_X', 3).to_dict()]
 
-        a.sbc_inbox.q = [c1, c2, c3]
+        for c in [c1, c2, c3]:
+            a.sbc_inbox.add_contender(c)
 
         res = self.loop.run_until_complete(a.gather_subblocks(4, adequate_ratio=0.3))
 
@@ -787,3 +791,247 @@ class TestSBCProcessor(TestCase):
         loop.run_until_complete(s.process_message([sbc_1, sbc_2]))
 
         self.assertEqual(s.q, [])
+
+    def test_known_result_hash_skips_merkle_and_uses_verified_transactions(self):
+        tx_1 = {
+            'something': 'who_cares'
+        }
+
+        tx_2 = {
+            'something_else': 'who_cares'
+        }
+
+        txs = [encode(tx).encode() for tx in [tx_1, tx_2]]
+        expected_tree = merklize(txs)
+
+        w = Wallet()
+        w2 = Wallet()
+
+        sbc_1 = {
+            'subblock': 1,
+            'transactions': [tx_1, tx_2],
+            'input_hash': 'something',
+            'signer': w.verifying_key,
+            'merkle_tree': {
+                'signature': w.sign(expected_tree[0]),
+                'leaves': expected_tree
+            }
+        }
+
+        sbc_2 = {
+            'subblock': 1,
+            'transactions': [{'not': 'the_same'}],
+            'input_hash': 'something',
+            'signer': w2.verifying_key,
+            'merkle_tree': {
+                'signature': w2.sign(expected_tree[0]),
+                'leaves': [expected_tree[0]]
+            }
+        }
+
+        s = contender.SBCInbox()
+
+        self.assertTrue(s.sbc_is_valid(sbc_1, 1))
+        self.assertTrue(s.sbc_is_valid(sbc_2, 1))
+
+        self.assertEqual(sbc_2['transactions'], [tx_1, tx_2])
+        self.assertEqual(sbc_2['merkle_tree']['leaves'], expected_tree)
+
+    def test_known_result_hash_still_checks_signature(self):
+        tx_1 = {
+            'something': 'who_cares'
+        }
+
+        txs = [encode(tx).encode() for tx in [tx_1]]
+        expected_tree = merklize(txs)
+
+        w = Wallet()
+        w2 = Wallet()
+
+        sbc_1 = {
+            'subblock': 0,
+            'transactions': [tx_1],
+            'input_hash': 'something',
+            'signer': w.verifying_key,
+            'merkle_tree': {
+                'signature': w.sign(expected_tree[0]),
+                'leaves': expected_tree
+            }
+        }
+
+        sbc_2 = {
+            'subblock': 0,
+            'transactions': [tx_1],
+            'input_hash': 'something',
+            'signer': w2.verifying_key,
+            'merkle_tree': {
+                'signature': w.sign(expected_tree[0]),
+                'leaves': expected_tree
+            }
+        }
+
+        s = contender.SBCInbox()
+
+        self.assertTrue(s.sbc_is_valid(sbc_1, 0))
+        self.assertFalse(s.sbc_is_valid(sbc_2, 0))
+
+    def test_signatures_are_valid_fails_if_one_signature_bad(self):
+        w = Wallet()
+        w2 = Wallet()
+
+        sbc_1 = {
+            'subblock': 0,
+            'transactions': [],
+            'input_hash': 'something',
+            'signer': w.verifying_key,
+            'merkle_tree': {
+                'signature': w.sign('something'),
+                'leaves': []
+            }
+        }
+
+        sbc_2 = {
+            'subblock': 1,
+            'transactions': [],
+            'input_hash': 'something_else',
+            'signer': w.verifying_key,
+            'merkle_tree': {
+                'signature': w2.sign('something_else'),
+                'leaves': []
+            }
+        }
+
+        s = contender.SBCInbox()
+
+        self.assertTrue(s.signatures_are_valid([sbc_1]))
+        self.assertFalse(s.signatures_are_valid([sbc_1, sbc_2]))
+
+    def test_process_message_queues_each_subblock_once(self):
+        w = Wallet()
+
+        sbcs = []
+        for i in range(4):
+            input_hash = f'input_{i}'
+            sbcs.append({
+                'subblock': i,
+                'transactions': [],
+                'input_hash': input_hash,
+                'signer': w.verifying_key,
+                'previous': '0' * 64,
+                'merkle_tree': {
+                    'signature': w.sign(input_hash),
+                    'leaves': []
+                }
+            })
+
+        s = contender.SBCInbox()
+
+        loop = asyncio.get_event_loop()
+        if loop.is_closed():
+            loop = asyncio.new_event_loop()
+        loop.run_until_complete(s.process_message(sbcs))
+        loop.run_until_complete(s.process_message(sbcs))
+
+        self.assertEqual(len(s.q), 4)
+        self.assertEqual(len(s.contenders), 4)
+        self.assertEqual(s.receive_sbcs(), sbcs)
+        self.assertFalse(s.has_sbc())
+
+    def test_add_contender_dedups_on_round_subblock_and_signer(self):
+        s = contender.SBCInbox()
+
+        a = {'previous': 'a', 'subblock': 0, 'signer': 'x'}
+        b = {'previous': 'b', 'subblock': 0, 'signer': 'x'}
+        c = {'previous': 'a', 'subblock': 1, 'signer': 'x'}
+        d = {'previous': 'a', 'subblock': 0, 'signer': 'y'}
+
+        s.add_contender([a, b, c, d])
+        s.add_contender([dict(a)])
+
+        self.assertEqual(s.receive_sbcs(), [a, b, c, d])
+        self.assertEqual(s.receive_sbcs(), [])
+
+    def test_clear_removes_all_contenders(self):
+        s = contender.SBCInbox()
+
+        s.add_contender([{'previous': 'a', 'subblock': 0, 'signer': 'x'}])
+        s.clear()
+
+        self.assertFalse(s.has_sbc())
+        self.assertEqual(s.contenders, {})
+
+
+class TestDecidability(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_not_decided_without_responses(self):
+        con = contender.SubBlockContender(input_hash='a' * 64, index=0, total_contacts=3)
+        self.assertFalse(con.decided)
+
+    def test_decided_when_required_consensus_met(self):
+        con = contender.SubBlockContender(input_hash='a' * 64, index=0, total_contacts=3)
+
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+        self.assertFalse(con.decided)
+
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+        self.assertTrue(con.decided)
+
+    def test_not_decided_below_quorum_while_votes_outstanding(self):
+        con = contender.SubBlockContender(input_hash='a' * 64, index=0, total_contacts=4)
+
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+
+        self.assertFalse(con.has_required_consensus)
+        self.assertFalse(con.decided)
+
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+
+        self.assertTrue(con.decided)
+        self.assertIsNotNone(con.serialized_solution)
+
+    def test_decided_and_failed_when_quorum_out_of_reach(self):
+        con = contender.SubBlockContender(input_hash='a' * 64, index=0, total_contacts=5)
+
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+        con.add_potential_solution(MockSBC('input_1', 'res_1', 0).to_dict())
+        con.add_potential_solution(MockSBC('input_1', 'res_2', 0).to_dict())
+
+        self.assertFalse(con.decided)
+
+        con.add_potential_solution(MockSBC('input_1', 'res_3', 0).to_dict())
+
+        # 2 + 1 outstanding of 5 can't reach 0.66
+        self.assertTrue(con.decided)
+        self.assertIsNone(con.serialized_solution)
+
+    def test_block_not_decided_if_subblock_missing(self):
+        con = contender.BlockContender(total_contacts=2, total_subblocks=2)
+
+        con.add_sbcs([MockSBC('input_1', 'res_1', 0).to_dict(), MockSBC('input_1', 'res_1', 0).to_dict()])
+
+        self.assertFalse(con.block_is_decided())
+
+        con.add_sbcs([MockSBC('input_2', 'res_2', 1).to_dict(), MockSBC('input_2', 'res_2', 1).to_dict()])
+
+        self.assertTrue(con.block_is_decided())
+
+    def test_gather_subblocks_returns_early_when_delegate_offline(self):
+        a = contender.Aggregator(driver=ContractDriver(), seconds_to_timeout=6)
+
+        # Two of three delegates agree, which is quorum, so the third isn't waited on
+        for _ in range(2):
+            a.sbc_inbox.add_contender([MockSBC('input_1', 'res_1', 0).to_dict(),
+                                       MockSBC('input_2', 'res_2', 1).to_dict()])
+
+        res = self.loop.run_until_complete(a.gather_subblocks(total_contacts=3, expected_subblocks=2))
+
+        self.assertEqual(res['subblocks'][0]['merkle_leaves'][0], 'res_1')
+        self.assertEqual(res['subblocks'][1]['merkle_leaves'][0], 'res_2')
+        self.assertLess(a.last_decision_time, 1)
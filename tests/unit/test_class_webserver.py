@@ -1,6 +1,7 @@
 from unittest import TestCase
 
 from cilantro_ee.nodes.masternode.webserver import WebServer
+from cilantro_ee.nodes.masternode.ratelimit import TokenBucketLimiter
 from cilantro_ee.crypto.wallet import Wallet
 from contracting.client import ContractingClient
 from contracting.db.driver import ContractDriver, decode, encode
@@ -27,6 +28,9 @@ class TestClassWebserver(TestCase):
         self.ws.client.flush()
         self.ws.blocks.drop_collections()
 
+        # The test client runs its own server, so routes with bigger bodies need the webserver's protocol passed in
+        self.sized = {'protocol': self.ws.protocol, 'auto_reload': False}
+
     def tearDown(self):
         self.ws.client.flush()
         self.ws.blocks.drop_collections()
@@ -94,6 +98,23 @@ class TestClassWebserver(TestCase):
 
         self.assertDictEqual(response.json, {'error': 'blah does not exist'})
 
+    def test_get_contract_metadata_refreshes_after_code_write(self):
+        _, response = self.ws.app.test_client.get('/contracts')
+        self.assertDictEqual(response.json, {'contracts': ['submission']})
+
+        self._submit_balances(0)
+
+        # Still served from the cache until a block says the code changed
+        _, response = self.ws.app.test_client.get('/contracts')
+        self.assertDictEqual(response.json, {'contracts': ['submission']})
+
+        self.ws.contracts.invalidate_block({'subblocks': [{'transactions': [{
+            'state': [{'key': 'testing.__code__', 'value': self.ws.client.raw_driver.get_contract('testing')}]
+        }]}]})
+
+        _, response = self.ws.app.test_client.get('/contracts')
+        self.assertEqual(sorted(response.json['contracts']), ['submission', 'testing'])
+
     def test_get_contract_methods_returns_all_methods(self):
         _, response = self.ws.app.test_client.get('/contracts/submission/methods')
 
@@ -224,6 +245,92 @@ def get():
 
         self.assertDictEqual(response.json, {'value': 99999})
 
+    def _submit_balances(self, n):
+        code = '''
+balances = Hash(default_value=0)
+
+@construct
+def seed(n: int):
+    for i in range(n):
+        balances['acct{:03d}'.format(i)] = i
+        balances['acct{:03d}'.format(i), 'allowance'] = 1
+
+@export
+def get(k: str):
+    return balances[k]
+        '''
+
+        self.ws.client.submit(f=code, name='testing', constructor_args={'n': n})
+        self.ws.client.raw_driver.commit()
+
+    def test_iterate_variable_pages_through_hash(self):
+        self._submit_balances(5)
+
+        _, response = self.ws.app.test_client.get('/contracts/testing/balances/iterate?limit=4')
+
+        self.assertEqual([v['key'] for v in response.json['values']],
+                         ['acct000', 'acct000:allowance', 'acct001', 'acct001:allowance'])
+        self.assertEqual(response.json['values'][2]['value'], 1)
+
+        seen = [v['key'] for v in response.json['values']]
+        while response.json['next'] is not None:
+            _, response = self.ws.app.test_client.get(
+                f"/contracts/testing/balances/iterate?limit=4&cursor={response.json['next']}"
+            )
+            seen.extend(v['key'] for v in response.json['values'])
+
+        self.assertEqual(len(seen), 10)
+
+    def test_iterate_variable_narrows_by_key(self):
+        self._submit_balances(3)
+
+        _, response = self.ws.app.test_client.get('/contracts/testing/balances/iterate?key=acct001')
+
+        self.assertDictEqual(response.json, {'values': [{'key': 'allowance', 'value': 1}], 'next': None})
+
+    def test_iterate_variable_rejects_huge_limit(self):
+        self._submit_balances(1)
+
+        _, response = self.ws.app.test_client.get('/contracts/testing/balances/iterate?limit=1000000')
+
+        self.assertEqual(response.status, 400)
+
+    def test_iterate_variable_contract_does_not_exist(self):
+        _, response = self.ws.app.test_client.get('/contracts/nothing/balances/iterate')
+
+        self.assertEqual(response.status, 404)
+
+    def test_batch_read_returns_values_in_order(self):
+        self._submit_balances(3)
+
+        _, response = self.ws.app.test_client.post('/contracts/batch', data=encode({'keys': [
+            {'contract': 'testing', 'variable': 'balances', 'key': ['acct002']},
+            {'contract': 'testing', 'variable': 'balances', 'key': 'acct000,allowance'},
+            {'contract': 'testing', 'variable': 'balances', 'key': ['nobody']},
+            {'contract': 'testing', 'variable': 'balances', 'key': ['acct001']}
+        ]}))
+
+        self.assertDictEqual(response.json, {'values': [2, 1, None, 1]})
+
+    def test_batch_read_rejects_too_many_keys(self):
+        keys = [{'contract': 'testing', 'variable': 'balances', 'key': [str(i)]} for i in range(1_001)]
+
+        _, response = self.ws.app.test_client.post('/contracts/batch', data=encode({'keys': keys}), server_kwargs=self.sized)
+
+        self.assertEqual(response.status, 400)
+
+    def test_batch_read_rejects_malformed_keys(self):
+        _, response = self.ws.app.test_client.post('/contracts/batch', data=encode({'keys': [{'contract': 'testing'}]}))
+
+        self.assertEqual(response.status, 400)
+
+    def test_batch_read_rejects_wrong_types(self):
+        for body in [['testing'], {'keys': 'testing'}, {'keys': ['testing']},
+                     {'keys': [{'contract': 'testing', 'variable': 'balances', 'key': 1}]}]:
+            _, response = self.ws.app.test_client.post('/contracts/batch', data=encode(body))
+
+            self.assertEqual(response.status, 400)
+
     def test_get_variable_works_for_multihashes(self):
         code = '''
 h = Hash()
@@ -302,6 +409,39 @@ def get():
 
         self.assertDictEqual(response.json, {'latest_block_hash': h})
 
+    def test_latest_block_num_is_cached_until_published(self):
+        storage.set_latest_block_height(1, self.ws.driver)
+        self.ws.app.test_client.get('/latest_block_num')
+
+        storage.set_latest_block_height(2, self.ws.driver)
+
+        _, response = self.ws.app.test_client.get('/latest_block_num')
+        self.assertDictEqual(response.json, {'latest_block_number': 1})
+
+        self.ws.publish_head()
+
+        _, response = self.ws.app.test_client.get('/latest_block_num')
+        self.assertDictEqual(response.json, {'latest_block_number': 2})
+
+    def test_latest_block_etag_returns_not_modified(self):
+        storage.set_latest_block_height(1, self.ws.driver)
+        storage.set_latest_block_hash('a' * 64, self.ws.driver)
+
+        _, response = self.ws.app.test_client.get('/latest_block_hash')
+        etag = response.headers['ETag']
+
+        _, response = self.ws.app.test_client.get('/latest_block_hash', headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+
+        storage.set_latest_block_height(2, self.ws.driver)
+        storage.set_latest_block_hash('b' * 64, self.ws.driver)
+        self.ws.publish_head()
+
+        _, response = self.ws.app.test_client.get('/latest_block_hash', headers={'If-None-Match': etag})
+        self.assertEqual(response.status, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertDictEqual(response.json, {'latest_block_hash': 'b' * 64})
+
     def test_get_block_by_num_that_exists(self):
         block = {
             'hash': '1234',
@@ -348,6 +488,109 @@ def get():
         _, response = self.ws.app.test_client.get('/blocks')
         self.assertDictEqual(response.json, {'error': 'No number or hash provided.'})
 
+    def test_get_block_headers_range(self):
+        for i in range(1, 6):
+            self.ws.blocks.store_block({'hash': str(i), 'number': i, 'previous': str(i - 1), 'subblocks': []})
+
+        _, response = self.ws.app.test_client.get('/blocks/headers?from=2&to=4')
+
+        self.assertEqual([h['number'] for h in response.json['headers']], [2, 3, 4])
+        self.assertEqual(response.json['headers'][0]['transactions'], 0)
+
+    def test_get_block_headers_to_defaults_to_max_range(self):
+        self.ws.blocks.store_block({'hash': '1', 'number': 1, 'previous': '0', 'subblocks': []})
+
+        _, response = self.ws.app.test_client.get('/blocks/headers?from=1')
+
+        self.assertEqual(len(response.json['headers']), 1)
+
+    def test_get_block_headers_requires_from(self):
+        _, response = self.ws.app.test_client.get('/blocks/headers')
+
+        self.assertEqual(response.status, 400)
+
+    def test_get_block_headers_rejects_backwards_range(self):
+        _, response = self.ws.app.test_client.get('/blocks/headers?from=5&to=1')
+
+        self.assertEqual(response.status, 400)
+
+    def test_get_block_headers_rejects_huge_range(self):
+        _, response = self.ws.app.test_client.get('/blocks/headers?from=0&to=1000000')
+
+        self.assertEqual(response.status, 400)
+
+    def _store_history(self):
+        for i in range(1, 4):
+            self.ws.blocks.store_block({
+                'hash': str(i),
+                'number': i,
+                'previous': str(i - 1),
+                'subblocks': [{
+                    'subblock': 0,
+                    'transactions': [{
+                        'hash': f'{i}-{j}',
+                        'transaction': {'payload': {'sender': 'stu', 'contract': 'currency', 'function': 'transfer'}}
+                    } for j in range(2)]
+                }]
+            })
+
+    def test_get_tx_history_pages(self):
+        self._store_history()
+
+        _, response = self.ws.app.test_client.get('/tx/history?sender=stu&limit=4')
+
+        self.assertEqual([tx['hash'] for tx in response.json['transactions']], ['3-1', '3-0', '2-1', '2-0'])
+        self.assertNotIn(storage.TX_BLOCK, response.json['transactions'][0])
+
+        _, response = self.ws.app.test_client.get(f"/tx/history?sender=stu&limit=4&cursor={response.json['next']}")
+
+        self.assertEqual([tx['hash'] for tx in response.json['transactions']], ['1-1', '1-0'])
+        self.assertIsNone(response.json['next'])
+
+    def test_subscribe_after_tx_is_in_block_ends_stream(self):
+        self.ws.blocks.store_block({
+            'hash': '1', 'number': 1, 'previous': '0',
+            'subblocks': [{'transactions': [{'hash': 'a' * 64, 'status': 0, 'stamps_used': 10, 'result': 'None'}]}]
+        })
+
+        _, response = self.ws.app.test_client.get(f"/subscribe?blocks=false&tx={'a' * 64}")
+
+        self.assertIn('event: tx', response.text)
+        self.assertIn('"block": 1', response.text)
+        self.assertNotIn(': ping', response.text)
+
+    def test_subscribe_to_dropped_tx_ends_stream(self):
+        self.ws.tx_status.flush()
+        self.ws.tx_status.batched('i' * 64, ['b' * 64])
+        self.ws.drop_batch('i' * 64, 'Lost.')
+
+        _, response = self.ws.app.test_client.get(f"/subscribe?blocks=false&tx={'b' * 64}")
+
+        self.assertIn('"status": "dropped"', response.text)
+        self.assertIn('"reason": "Lost."', response.text)
+
+        self.ws.tx_status.flush()
+
+    def test_subscribe_to_unknown_tx_ends_stream(self):
+        _, response = self.ws.app.test_client.get(f"/subscribe?blocks=false&tx={'c' * 64}")
+
+        self.assertIn('"reason": "Unknown transaction."', response.text)
+
+    def test_get_tx_history_empty(self):
+        _, response = self.ws.app.test_client.get('/tx/history?sender=nobody')
+
+        self.assertDictEqual(response.json, {'transactions': [], 'next': None})
+
+    def test_get_tx_history_rejects_bad_cursor(self):
+        _, response = self.ws.app.test_client.get('/tx/history?cursor=abc')
+
+        self.assertEqual(response.status, 400)
+
+    def test_get_tx_history_rejects_huge_limit(self):
+        _, response = self.ws.app.test_client.get('/tx/history?limit=100000')
+
+        self.assertEqual(response.status, 400)
+
     def test_bad_transaction_returns_a_TransactionException(self):
         tx = build_transaction(
             wallet=Wallet(),
@@ -399,6 +642,194 @@ def get():
         _, response = self.ws.app.test_client.post('/', data=tx)
 
         self.assertEqual(len(self.ws.queue), 1)
+        self.assertEqual(self.ws.queue[0][1], response.json['hash'])
+
+    def test_batch_submission_reports_each_transaction(self):
+        w = Wallet()
+
+        self.ws.client.set_var(contract='currency', variable='balances', arguments=[w.verifying_key], value=1_000_000)
+        self.ws.client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=1_000_000)
+
+        txs = [decode(build_transaction(
+            wallet=w,
+            processor=self.ws.wallet.verifying_key,
+            stamps=6000,
+            nonce=nonce,
+            contract='currency',
+            function='transfer',
+            kwargs={'amount': 123, 'to': 'jeff'}
+        )) for nonce in [0, 1, 1]]
+
+        _, response = self.ws.app.test_client.post('/batch', data=encode(txs))
+
+        results = response.json['results']
+
+        self.assertEqual(len(self.ws.queue), 2)
+        self.assertIn('hash', results[0])
+        self.assertIn('hash', results[1])
+        self.assertDictEqual(results[2], {'error': 'Transaction nonce is invalid.'})
+        self.assertEqual(self.ws.nonces.get_pending_nonce(sender=w.verifying_key, processor=self.ws.wallet.verifying_key), 2)
+
+        self.ws.queue.clear()
+        self.ws.nonces.flush()
+
+    def test_batch_holds_each_transaction_to_max_tx_size(self):
+        w = Wallet()
+
+        self.ws.client.set_var(contract='currency', variable='balances', arguments=[w.verifying_key], value=1_000_000)
+        self.ws.client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=1_000_000)
+
+        txs = [decode(build_transaction(
+            wallet=w,
+            processor=self.ws.wallet.verifying_key,
+            stamps=6000,
+            nonce=0,
+            contract='currency',
+            function='transfer',
+            kwargs={'amount': 123, 'to': 'j' * 20_000}
+        ))]
+
+        _, response = self.ws.app.test_client.post('/batch', data=encode(txs), server_kwargs=self.sized)
+
+        self.assertDictEqual(response.json['results'][0], {'error': 'Transaction too large.'})
+        self.assertEqual(len(self.ws.queue), 0)
+
+        self.ws.nonces.flush()
+
+    def test_large_bodies_only_allowed_on_batch_routes(self):
+        body = encode({'sender': 'stu', 'contract': 'testing', 'function': 'get', 'kwargs': {'k': 'a' * 20_000}})
+
+        _, response = self.ws.app.test_client.post('/simulate', data=body, server_kwargs=self.sized)
+
+        self.assertEqual(response.status, 413)
+
+    def test_tx_status_follows_submission(self):
+        self.ws.tx_status.flush()
+        self.ws.tx_status.pending(['a' * 64])
+
+        _, response = self.ws.app.test_client.get(f"/tx/status?hash={'a' * 64}")
+        self.assertEqual(response.json['status'], 'pending')
+
+        self.ws.tx_status.batched('i' * 64, ['a' * 64])
+        self.ws.tx_status.dropped('i' * 64, 'Lost.')
+
+        _, response = self.ws.app.test_client.get(f"/tx/status?hash={'a' * 64}")
+        self.assertEqual(response.json['status'], 'dropped')
+
+        self.ws.tx_status.flush()
+
+    def test_tx_status_not_found(self):
+        _, response = self.ws.app.test_client.get(f"/tx/status?hash={'f' * 64}")
+
+        self.assertEqual(response.status, 404)
+
+    def test_simulate_runs_without_committing(self):
+        self._submit_balances(1)
+
+        self.ws.client.set_var(contract='currency', variable='balances', arguments=['stu'], value=100)
+        self.ws.client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=20_000)
+        self.ws.client.raw_driver.commit()
+
+        _, response = self.ws.app.test_client.post('/simulate', data=encode({
+            'sender': 'stu', 'contract': 'testing', 'function': 'get', 'kwargs': {'k': 'acct000'}
+        }))
+
+        self.ws.simulator.shutdown()
+
+        self.assertEqual(response.json['status'], 0)
+        self.assertEqual(response.json['result'], '0')
+
+    def test_simulate_unknown_contract(self):
+        _, response = self.ws.app.test_client.post('/simulate', data=encode({
+            'sender': 'stu', 'contract': 'nothing', 'function': 'get', 'kwargs': {}
+        }))
+
+        self.assertEqual(response.status, 404)
+
+    def test_simulate_malformed_payload(self):
+        for body in [{'sender': 'stu'}, ['stu'], {'sender': 'stu', 'contract': 'testing', 'function': 'get', 'kwargs': []},
+                     {'sender': 'stu', 'contract': 'testing', 'function': 'get', 'stamps': 'all'}]:
+            _, response = self.ws.app.test_client.post('/simulate', data=encode(body))
+
+            self.assertEqual(response.status, 400)
+
+    def test_simulate_fails_without_stamp_cost(self):
+        self._submit_balances(1)
+
+        _, response = self.ws.app.test_client.post('/simulate', data=encode({
+            'sender': 'stu', 'contract': 'testing', 'function': 'get', 'kwargs': {'k': 'acct000'}
+        }))
+
+        self.assertEqual(response.status, 503)
+
+    def test_shedding_returns_503_with_retry_after(self):
+        self.ws.admission.shedding = True
+
+        _, response = self.ws.app.test_client.post('/', data=encode({}))
+
+        self.assertEqual(response.status, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_ip_rate_limit_returns_429(self):
+        self.ws.ip_limiter = TokenBucketLimiter(rate=1, burst=1)
+
+        self.ws.app.test_client.post('/', data=encode({}))
+        _, response = self.ws.app.test_client.post('/', data=encode({}))
+
+        self.assertEqual(response.status, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+    def test_sender_rate_limit_checked_before_signature(self):
+        w = Wallet()
+        self.ws.sender_limiter = TokenBucketLimiter(rate=1, burst=1)
+        self.ws.sender_limiter.take(w.verifying_key)
+
+        tx = build_transaction(
+            wallet=w,
+            processor=self.ws.wallet.verifying_key,
+            stamps=6000,
+            nonce=0,
+            contract='currency',
+            function='transfer',
+            kwargs={'amount': 123, 'to': 'jeff'}
+        )
+
+        _, response = self.ws.app.test_client.post('/', data=tx)
+
+        self.assertEqual(response.status, 429)
+        self.assertEqual(len(self.ws.queue), 0)
+
+    def test_rejected_transactions_do_not_use_sender_tokens(self):
+        self.ws.sender_limiter = TokenBucketLimiter(rate=1, burst=1)
+
+        tx = build_transaction(
+            wallet=Wallet(),
+            processor='b' * 64,
+            stamps=123,
+            nonce=0,
+            contract='currency',
+            function='transfer',
+            kwargs={'amount': 123, 'to': 'jeff'}
+        )
+
+        self.ws.app.test_client.post('/', data=tx)
+        _, response = self.ws.app.test_client.post('/', data=tx)
+
+        self.assertDictEqual(response.json, {'error': 'Transaction processor does not match expected processor.'})
+
+    def test_batch_submission_rejects_non_list(self):
+        _, response = self.ws.app.test_client.post('/batch', data=encode({'not': 'a list'}))
+
+        self.assertEqual(response.status, 400)
+
+    def test_batch_submission_queue_full(self):
+        self.ws.queue.extend(range(9_999))
+
+        _, response = self.ws.app.test_client.post('/batch', data=encode([{}, {}]))
+
+        self.assertEqual(response.status, 503)
+
+        self.ws.queue.clear()
 
     def test_submit_transaction_error_if_queue_full(self):
         self.ws.queue.extend(range(10_000))
@@ -504,3 +935,14 @@ def get():
         _, response = self.ws.app.test_client.get('/tx?hash=' + 'a' * 64)
 
         self.assertDictEqual(response.json, {'error': 'Transaction not found.'})
+
+    def test_metrics_returns_prometheus_text(self):
+        self.ws.queue.extend([1, 2, 3])
+
+        _, response = self.ws.app.test_client.get('/metrics')
+
+        self.assertEqual(response.status, 200)
+        self.assertIn('# TYPE cilantro_webserver_queue_depth gauge', response.text)
+        self.assertIn('cilantro_webserver_queue_depth 3.0', response.text)
+
+        self.ws.queue.clear()
@@ -667,7 +667,7 @@ def get():
         )
 
         tx_decoded = decode(tx)
-        mn.tx_batcher.queue.append(tx_decoded)
+        mn.tx_batcher.queue.append((tx_decoded, canonical.tx_hash_from_tx(tx_decoded)))
 
         peers = {
             mw.verifying_key: ips[0],
@@ -748,7 +748,7 @@ def get():
         )
 
         tx_decoded = decode(tx)
-        mn.tx_batcher.queue.append(tx_decoded)
+        mn.tx_batcher.queue.append((tx_decoded, canonical.tx_hash_from_tx(tx_decoded)))
 
         peers = {
             mw.verifying_key: ips[0],
@@ -0,0 +1,142 @@
+from unittest import TestCase
+from cilantro_ee.nodes.masternode import feed
+import asyncio
+import json
+
+
+def block_with(number, hashes):
+    return {
+        'number': number,
+        'hash': str(number) * 4,
+        'previous': str(number - 1) * 4,
+        'subblocks': [{
+            'transactions': [{'hash': h, 'status': 0, 'stamps_used': 10, 'result': 'None'} for h in hashes]
+        }]
+    }
+
+
+def parse(event):
+    name, data = event.strip().split('\n')
+    return name[len('event: '):], json.loads(data[len('data: '):])
+
+
+class TestFeed(TestCase):
+    def test_block_subscriber_gets_block_event(self):
+        f = feed.Feed()
+        sub = f.subscribe()
+
+        f.publish_block(block_with(1, ['a']))
+
+        name, data = parse(sub.queue.get_nowait())
+        self.assertEqual(name, 'block')
+        self.assertEqual(data, {'number': 1, 'hash': '1111', 'previous': '0000', 'transactions': 1})
+
+    def test_tx_subscriber_only_gets_its_txs(self):
+        f = feed.Feed()
+        sub = f.subscribe(blocks=False, txs=['b'])
+
+        f.publish_block(block_with(1, ['a']))
+        self.assertTrue(sub.queue.empty())
+
+        f.publish_block(block_with(2, ['b', 'c']))
+
+        name, data = parse(sub.queue.get_nowait())
+        self.assertEqual(name, 'tx')
+        self.assertEqual(data['hash'], 'b')
+        self.assertEqual(data['block'], 2)
+        self.assertTrue(sub.done())
+        self.assertEqual(f.waiting, {})
+
+    def test_dropped_tx_completes_subscription(self):
+        f = feed.Feed()
+        sub = f.subscribe(blocks=False, txs=['a'])
+
+        f.publish_dropped({'a': {'status': 'dropped', 'reason': 'Lost.'}, 'b': {'status': 'dropped', 'reason': 'Lost.'}})
+
+        name, data = parse(sub.queue.get_nowait())
+        self.assertEqual(name, 'tx')
+        self.assertEqual(data, {'hash': 'a', 'status': 'dropped', 'reason': 'Lost.'})
+        self.assertTrue(sub.done())
+        self.assertEqual(f.waiting, {})
+
+    def test_settle_delivers_once(self):
+        f = feed.Feed()
+        sub = f.subscribe(blocks=False, txs=['a', 'b'])
+
+        f.publish_block(block_with(1, ['a']))
+        sub.queue.get_nowait()
+
+        # Already delivered by the block, so settling it again does nothing
+        f.settle(sub, 'a', feed.dropped_frame('a', 'Late.'))
+        self.assertTrue(sub.queue.empty())
+
+        f.settle(sub, 'b', feed.dropped_frame('b', 'Lost.'))
+
+        self.assertEqual(parse(sub.queue.get_nowait())[1]['hash'], 'b')
+        self.assertTrue(sub.done())
+        self.assertEqual(f.waiting, {})
+
+    def test_full_queue_evicts_subscriber(self):
+        f = feed.Feed(max_queue=2)
+        sub = f.subscribe()
+
+        for i in range(3):
+            f.publish_block(block_with(i + 1, []))
+
+        self.assertTrue(sub.evicted)
+        self.assertNotIn(sub, f.subscribers)
+        self.assertIs(sub.queue.get_nowait(), feed.EVICTED)
+
+    def test_max_subscribers(self):
+        f = feed.Feed(max_subscribers=1)
+
+        self.assertIsNotNone(f.subscribe())
+        self.assertIsNone(f.subscribe())
+
+    def test_unsubscribe_cleans_up_waiting(self):
+        f = feed.Feed()
+        sub = f.subscribe(txs=['a', 'b'])
+
+        f.unsubscribe(sub)
+
+        self.assertEqual(f.subscribers, set())
+        self.assertEqual(f.waiting, {})
+
+    def test_thousands_of_subscribers_with_slow_consumers(self):
+        f = feed.Feed(max_queue=10, max_subscribers=10_000)
+        blocks = 20
+
+        async def consume(sub, delay):
+            received = 0
+            while True:
+                event = await sub.queue.get()
+                if event is feed.EVICTED:
+                    return received, True
+
+                received += 1
+                if received == blocks:
+                    return received, False
+
+                await asyncio.sleep(delay)
+
+        async def run():
+            fast = [asyncio.ensure_future(consume(f.subscribe(), 0)) for _ in range(5_000)]
+
+            # Never read in time, so they fall more than a queue behind and get dropped
+            slow = [asyncio.ensure_future(consume(f.subscribe(), 60)) for _ in range(100)]
+
+            for i in range(blocks):
+                f.publish_block(block_with(i + 1, [f'{i}-{j}' for j in range(10)]))
+                await asyncio.sleep(0)
+
+            done = await asyncio.wait_for(asyncio.gather(*fast), timeout=30)
+
+            for task in slow:
+                task.cancel()
+
+            return done
+
+        done = asyncio.get_event_loop().run_until_complete(run())
+
+        self.assertTrue(all(received == blocks and not evicted for received, evicted in done))
+        self.assertEqual(len(f.subscribers), 5_000)
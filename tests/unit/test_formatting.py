@@ -505,4 +505,108 @@ class TestFormatting(TestCase):
             ]
         }
 
-        self.assertFalse(primatives.check_format(thing, test_rule))
\ No newline at end of file
+        self.assertFalse(primatives.check_format(thing, test_rule))
+
+def make_tx(**payload):
+    p = {
+        'sender': 'a' * 64,
+        'processor': 'b' * 64,
+        'stamps_supplied': 123,
+        'nonce': 0,
+        'contract': 'currency',
+        'function': 'transfer',
+        'kwargs': {
+            'amount': 123,
+            'to': 'jeff'
+        }
+    }
+    p.update(payload)
+
+    return {
+        'metadata': {
+            'signature': 'c' * 128,
+            'timestamp': 123
+        },
+        'payload': p
+    }
+
+
+def legacy_check_format(d, rule):
+    return primatives.dict_has_keys(d, set(rule.keys())) and primatives.recurse_rules(d, rule)
+
+
+class TestCompiledRules(TestCase):
+    def test_compiled_matches_recursive_engine(self):
+        txs = [
+            make_tx(),
+            make_tx(sender='x' * 64),
+            make_tx(nonce=-1),
+            make_tx(stamps_supplied='1'),
+            make_tx(contract='_private'),
+            make_tx(kwargs={'_bad': 1}),
+            make_tx(kwargs={}),
+        ]
+
+        validator = primatives.compile_rules(rules.TRANSACTION_RULES)
+
+        for tx in txs:
+            self.assertEqual(validator(tx), legacy_check_format(tx, rules.TRANSACTION_RULES))
+
+    def test_compiled_checks_lists_of_nested_rules(self):
+        block = {
+            'hash': 'a' * 64,
+            'number': 1,
+            'previous': 'b' * 64,
+            'subblocks': [{
+                'input_hash': 'c' * 64,
+                'transactions': [{
+                    'hash': 'd' * 64,
+                    'result': 'None',
+                    'stamps_used': 10,
+                    'state': [{'key': 'x', 'value': 1}],
+                    'status': 0,
+                    'transaction': make_tx()
+                }],
+                'merkle_leaves': ['e' * 64],
+                'signatures': ['f' * 128],
+                'subblock': 0,
+                'previous': 'b' * 64
+            }]
+        }
+
+        validator = primatives.compile_rules(rules.BLOCK_RULES)
+        self.assertTrue(validator(block))
+
+        block['subblocks'][0]['transactions'][0]['transaction']['payload']['nonce'] = -1
+        self.assertFalse(validator(block))
+
+    def test_missing_nested_key_fails_instead_of_raising(self):
+        tx = make_tx()
+        del tx['payload']['sender']
+
+        self.assertFalse(primatives.check_format(tx, rules.TRANSACTION_RULES))
+
+    def test_nested_rule_against_scalar_fails(self):
+        tx = make_tx()
+        tx['payload'] = 'not a dict'
+
+        self.assertFalse(primatives.check_format(tx, rules.TRANSACTION_RULES))
+
+    def test_non_dict_input_fails(self):
+        self.assertFalse(primatives.check_format(None, rules.TRANSACTION_RULES))
+        self.assertFalse(primatives.check_format([], rules.TRANSACTION_RULES))
+
+    def test_check_format_reuses_compiled_validator(self):
+        primatives.check_format(make_tx(), rules.TRANSACTION_RULES)
+        first = primatives._compiled[id(rules.TRANSACTION_RULES)][1]
+
+        primatives.check_format(make_tx(), rules.TRANSACTION_RULES)
+        self.assertIs(primatives._compiled[id(rules.TRANSACTION_RULES)][1], first)
+
+    def test_hex_checks_reject_prefixes_and_signs(self):
+        self.assertFalse(primatives.vk_is_formatted('0x' + 'a' * 62))
+        self.assertFalse(primatives.vk_is_formatted('+' + 'a' * 63))
+        self.assertFalse(primatives.signature_is_formatted('0x' + 'a' * 126))
+
+    def test_identifier_rejects_trailing_newline(self):
+        self.assertFalse(primatives.identifier_is_formatted('hello\n'))
@@ -89,7 +89,7 @@ class TestMasternode(TestCase):
 
         async def late_tx(timeout=0.2):
             await asyncio.sleep(timeout)
-            node.tx_batcher.queue.append('MOCK TX')
+            node.tx_batcher.queue.append(('MOCK TX', 'a' * 64))
 
         tasks = asyncio.gather(
             node.hang(),
@@ -196,7 +196,7 @@ class TestMasternode(TestCase):
             dl_wallet.verifying_key: dl_bootnode
         }
 
-        node.tx_batcher.queue.append('MOCK TX')
+        node.tx_batcher.queue.append(('MOCK TX', 'a' * 64))
 
         tasks = asyncio.gather(
             mn_router.serve(),
@@ -451,13 +451,13 @@ class TestMasternode(TestCase):
             dl_wallet.verifying_key: dl_bootnode
         }
 
-        node.tx_batcher.queue.append('MOCK TX')
+        node.tx_batcher.queue.append(('MOCK TX', 'a' * 64))
 
         node.running = True
 
         async def late_tx(timeout=0.2):
             await asyncio.sleep(timeout)
-            node.tx_batcher.queue.append('MOCK TX')
+            node.tx_batcher.queue.append(('MOCK TX', 'a' * 64))
 
         async def late_kill(timeout=1):
             node.running = False
@@ -474,3 +474,22 @@ class TestMasternode(TestCase):
 
         self.loop.run_until_complete(tasks)
 
+
+
+class TestTransactionBatcher(TestCase):
+    def test_pack_current_queue_returns_carried_hashes(self):
+        batcher = masternode.TransactionBatcher(wallet=Wallet(), queue=[('tx1', 'h1'), ('tx2', 'h2'), ('tx3', 'h3')])
+
+        batch, hashes = batcher.pack_current_queue(tx_number=2)
+
+        self.assertEqual(batch['transactions'], ['tx1', 'tx2'])
+        self.assertEqual(hashes, ['h1', 'h2'])
+        self.assertEqual(batcher.queue, [('tx3', 'h3')])
+
+    def test_input_hashes_unique_per_masternode_and_batch(self):
+        a = masternode.TransactionBatcher(wallet=Wallet(), queue=[])
+        b = masternode.TransactionBatcher(wallet=Wallet(), queue=[])
+
+        hashes = {a.make_batch([])['input_hash'], a.make_batch([])['input_hash'], b.make_batch([])['input_hash']}
+
+        self.assertEqual(len(hashes), 3)
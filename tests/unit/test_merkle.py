@@ -0,0 +1,178 @@
+from unittest import TestCase
+from cilantro_ee.crypto import merkle
+import hashlib
+import secrets
+
+
+def legacy_merklize(leaves):
+    nodes = [None for _ in range(len(leaves) - 1)]
+
+    for l in leaves:
+        h = hashlib.sha3_256()
+        h.update(l)
+        nodes.append(h.digest())
+
+    for i in range((len(leaves) * 2) - 1 - len(leaves), 0, -1):
+        h = hashlib.sha3_256()
+        h.update(nodes[2 * i - 1] + nodes[2 * i])
+        nodes[i - 1] = h.digest()
+
+    return [n.hex() for n in nodes]
+
+
+class TestMerkleTree(TestCase):
+    def test_same_layout_as_legacy_merklize(self):
+        for n in [0, 1, 2, 3, 4, 5, 7, 8, 13, 64, 100]:
+            leaves = [secrets.token_bytes(32) for _ in range(n)]
+
+            tree = merkle.MerkleTree.from_leaves(leaves)
+
+            self.assertEqual(tree.to_hex(), legacy_merklize(leaves))
+
+    def test_empty_tree_has_no_root(self):
+        tree = merkle.MerkleTree.from_leaves([])
+
+        self.assertIsNone(tree.root)
+        self.assertIsNone(tree.root_hex)
+        self.assertEqual(tree.to_hex(), [])
+
+    def test_root_hex_is_first_node(self):
+        leaves = [b'a', b'b', b'c']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertEqual(tree.root_hex, legacy_merklize(leaves)[0])
+        self.assertEqual(tree.root, bytes.fromhex(legacy_merklize(leaves)[0]))
+
+    def test_leaf_count(self):
+        tree = merkle.MerkleTree.from_leaves([b'a', b'b', b'c', b'd', b'e'])
+        self.assertEqual(tree.leaf_count, 5)
+
+    def test_matches_true_for_identical_hex(self):
+        leaves = [b'a', b'b', b'c']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertTrue(tree.matches(legacy_merklize(leaves)))
+
+    def test_matches_false_for_bad_node(self):
+        leaves = [b'a', b'b', b'c']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        bad = legacy_merklize(leaves)
+        bad[1] = 'crap'
+
+        self.assertFalse(tree.matches(bad))
+
+    def test_matches_false_for_missing_nodes(self):
+        leaves = [b'a', b'b', b'c']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertFalse(tree.matches(legacy_merklize(leaves)[0:1]))
+
+
+class TestMerkleBuilder(TestCase):
+    def test_builder_streaming_equals_from_leaves(self):
+        leaves = [secrets.token_bytes(16) for _ in range(11)]
+
+        b = merkle.MerkleBuilder()
+        for l in leaves[:5]:
+            b.add(l)
+        b.extend(leaves[5:])
+
+        self.assertEqual(len(b), 11)
+        self.assertEqual(b.build().to_hex(), merkle.MerkleTree.from_leaves(leaves).to_hex())
+
+    def test_add_digest_skips_hashing(self):
+        b = merkle.MerkleBuilder()
+        b.add_digest(merkle.hash_leaf(b'a'))
+        b.add(b'b')
+
+        self.assertEqual(b.build().to_hex(), legacy_merklize([b'a', b'b']))
+
+
+class TestMerkleProofs(TestCase):
+    def test_every_leaf_proves_for_many_sizes(self):
+        for n in [1, 2, 3, 5, 8, 9, 33]:
+            leaves = [secrets.token_bytes(8) for _ in range(n)]
+            tree = merkle.MerkleTree.from_leaves(leaves)
+
+            for i in range(n):
+                proof = tree.proof(i)
+                self.assertTrue(merkle.verify_proof(leaves[i], i, n, proof, tree.root_hex))
+
+    def test_proof_fails_for_wrong_leaf(self):
+        leaves = [b'a', b'b', b'c', b'd']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertFalse(merkle.verify_proof(b'x', 1, 4, tree.proof(1), tree.root_hex))
+
+    def test_proof_fails_for_wrong_index(self):
+        leaves = [b'a', b'b', b'c', b'd']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertFalse(merkle.verify_proof(b'b', 2, 4, tree.proof(1), tree.root_hex))
+
+    def test_proof_fails_if_index_out_of_range(self):
+        leaves = [b'a', b'b']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertFalse(merkle.verify_proof(b'b', 2, 2, tree.proof(1), tree.root_hex))
+
+    def test_proof_fails_for_truncated_path(self):
+        leaves = [b'a', b'b', b'c', b'd', b'e']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertFalse(merkle.verify_proof(b'e', 4, 5, tree.proof(4)[:-1], tree.root_hex))
+
+    def test_proof_fails_for_malformed_sibling(self):
+        leaves = [b'a', b'b']
+        tree = merkle.MerkleTree.from_leaves(leaves)
+
+        self.assertFalse(merkle.verify_proof(b'a', 0, 2, ['zz'], tree.root_hex))
+
+
+class TestMerkleCache(TestCase):
+    def test_tree_for_returns_cached_tree_for_same_leaves(self):
+        c = merkle.MerkleCache()
+        leaves = [b'a', b'b', b'c']
+
+        t1 = c.tree_for(leaves)
+        t2 = c.tree_for(list(leaves), root=t1.root_hex)
+
+        self.assertIs(t1, t2)
+
+    def test_tree_for_rebuilds_if_leaves_differ(self):
+        c = merkle.MerkleCache()
+
+        t1 = c.tree_for([b'a', b'b', b'c'])
+        t2 = c.tree_for([b'a', b'b', b'x'], root=t1.root_hex)
+
+        self.assertIsNot(t1, t2)
+        self.assertNotEqual(t1.root_hex, t2.root_hex)
+
+    def test_tree_for_rebuilds_if_root_unknown(self):
+        c = merkle.MerkleCache()
+
+        t1 = c.tree_for([b'a', b'b'])
+        t2 = c.tree_for([b'a', b'b'], root='0' * 64)
+
+        self.assertIsNot(t1, t2)
+        self.assertEqual(t1.to_hex(), t2.to_hex())
+
+    def test_cache_evicts_least_recent(self):
+        c = merkle.MerkleCache(max_size=2)
+
+        t1 = c.tree_for([b'1'])
+        t2 = c.tree_for([b'2'])
+        c.get(t1.root_hex)
+        t3 = c.tree_for([b'3'])
+
+        self.assertIn(t1.root_hex, c)
+        self.assertNotIn(t2.root_hex, c)
+        self.assertIn(t3.root_hex, c)
+        self.assertEqual(len(c), 2)
+
+    def test_empty_tree_not_cached(self):
+        c = merkle.MerkleCache()
+        c.tree_for([])
+
+        self.assertEqual(len(c), 0)
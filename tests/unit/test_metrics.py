@@ -0,0 +1,167 @@
+from unittest import TestCase
+from cilantro_ee import metrics
+import asyncio
+
+
+class TestCounter(TestCase):
+    def test_inc_without_labels(self):
+        r = metrics.Registry()
+        c = r.counter('things_total', 'Things.')
+
+        c.inc()
+        c.inc(2)
+
+        self.assertEqual(c.get(), 3)
+
+    def test_inc_with_labels_tracks_each_separately(self):
+        r = metrics.Registry()
+        c = r.counter('things_total', 'Things.', ('kind', ))
+
+        c.inc(kind='a')
+        c.inc(kind='b')
+        c.inc(kind='b')
+
+        self.assertEqual(c.get(kind='a'), 1)
+        self.assertEqual(c.get(kind='b'), 2)
+
+    def test_wrong_labels_raise(self):
+        r = metrics.Registry()
+        c = r.counter('things_total', 'Things.', ('kind', ))
+
+        with self.assertRaises(AssertionError):
+            c.inc(other='a')
+
+    def test_negative_inc_raises(self):
+        r = metrics.Registry()
+        c = r.counter('things_total', 'Things.')
+
+        with self.assertRaises(AssertionError):
+            c.inc(-1)
+
+
+class TestGauge(TestCase):
+    def test_set_inc_dec(self):
+        r = metrics.Registry()
+        g = r.gauge('level', 'Level.')
+
+        g.set(10)
+        g.inc(5)
+        g.dec(3)
+
+        self.assertEqual(g.get(), 12)
+
+    def test_set_function_evaluated_lazily(self):
+        r = metrics.Registry()
+        g = r.gauge('queue', 'Queue.')
+
+        q = []
+        g.set_function(lambda: len(q))
+
+        q.extend([1, 2])
+
+        self.assertEqual(g.get(), 2)
+        self.assertIn('queue 2.0', r.render())
+
+    def test_remove_function_falls_back_to_value(self):
+        r = metrics.Registry()
+        g = r.gauge('queue', 'Queue.')
+
+        g.set(3)
+        g.set_function(lambda: 10)
+        g.remove_function()
+
+        self.assertEqual(g.get(), 3)
+        self.assertEqual(g.functions, {})
+
+
+class TestHistogram(TestCase):
+    def test_observe_updates_buckets_sum_and_count(self):
+        r = metrics.Registry()
+        h = r.histogram('latency', 'Latency.', buckets=(1, 5))
+
+        h.observe(0.5)
+        h.observe(3)
+        h.observe(10)
+
+        self.assertEqual(h.count(), 3)
+        self.assertEqual(h.sum(), 13.5)
+
+        text = r.render()
+
+        self.assertIn('latency_bucket{le="1.0"} 1.0', text)
+        self.assertIn('latency_bucket{le="5.0"} 2.0', text)
+        self.assertIn('latency_bucket{le="+Inf"} 3.0', text)
+        self.assertIn('latency_count 3.0', text)
+
+    def test_time_context_manager_observes(self):
+        r = metrics.Registry()
+        h = r.histogram('latency', 'Latency.', ('op', ))
+
+        with h.time(op='x'):
+            pass
+
+        self.assertEqual(h.count(op='x'), 1)
+
+
+class TestRegistry(TestCase):
+    def test_same_name_returns_same_metric(self):
+        r = metrics.Registry()
+
+        a = r.counter('a_total', 'A.')
+        b = r.counter('a_total', 'A.')
+
+        self.assertIs(a, b)
+
+    def test_same_name_different_type_raises(self):
+        r = metrics.Registry()
+        r.counter('a_total', 'A.')
+
+        with self.assertRaises(AssertionError):
+            r.gauge('a_total', 'A.')
+
+    def test_render_has_help_type_and_escaped_labels(self):
+        r = metrics.Registry()
+        c = r.counter('a_total', 'A things.', ('service', ))
+        c.inc(service='we"ird')
+
+        text = r.render()
+
+        self.assertIn('# HELP a_total A things.', text)
+        self.assertIn('# TYPE a_total counter', text)
+        self.assertIn('a_total{service="we\\"ird"} 1.0', text)
+
+
+class TestMetricsServer(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_serves_metrics_and_404s_elsewhere(self):
+        r = metrics.Registry()
+        r.counter('served_total', 'Served.').inc()
+
+        server = metrics.MetricsServer(registry=r, port=0)
+
+        async def get(path):
+            port = server.server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+            data = await reader.read()
+            writer.close()
+            return data.decode()
+
+        async def test():
+            await server.start()
+            a = await get('/metrics')
+            b = await get('/nope')
+            server.stop()
+            return a, b
+
+        a, b = self.loop.run_until_complete(test())
+
+        self.assertTrue(a.startswith('HTTP/1.1 200 OK'))
+        self.assertIn('served_total 1.0', a)
+        self.assertTrue(b.startswith('HTTP/1.1 404'))
@@ -0,0 +1,95 @@
+from unittest import TestCase
+from cilantro_ee import profiling, metrics
+import json
+
+
+class TestContractProfiler(TestCase):
+    def test_disabled_never_samples(self):
+        p = profiling.ContractProfiler()
+        self.assertFalse(p.should_sample())
+
+    def test_enabled_full_rate_always_samples(self):
+        p = profiling.ContractProfiler(enabled=True)
+
+        for _ in range(100):
+            self.assertTrue(p.should_sample())
+
+    def test_zero_rate_never_samples(self):
+        p = profiling.ContractProfiler(enabled=True, sample_rate=0)
+
+        for _ in range(100):
+            self.assertFalse(p.should_sample())
+
+    def test_record_aggregates_per_function(self):
+        p = profiling.ContractProfiler(enabled=True)
+
+        p.record('currency', 'transfer', 0.5, stamps=10, writes=2)
+        p.record('currency', 'transfer', 1.5, stamps=20, writes=2)
+        p.record('currency', 'approve', 0.25, stamps=5, writes=1)
+
+        s = p.stats[('currency', 'transfer')]
+        self.assertEqual(s.calls, 2)
+        self.assertEqual(s.seconds, 2.0)
+        self.assertEqual(s.max_seconds, 1.5)
+        self.assertEqual(s.stamps, 30)
+        self.assertEqual(s.writes, 4)
+
+        self.assertEqual(p.stats[('currency', 'approve')].calls, 1)
+
+    def test_top_keeps_slowest_in_order(self):
+        p = profiling.ContractProfiler(enabled=True, top_n=3)
+
+        for i in range(10):
+            p.record('c', 'f', i, stamps=0, writes=0, tx_hash=str(i))
+
+        self.assertEqual([tx['hash'] for tx in p.top()], ['9', '8', '7'])
+
+    def test_dumps_is_json_report(self):
+        p = profiling.ContractProfiler(enabled=True)
+        p.record('currency', 'transfer', 0.5, stamps=10, writes=2, tx_hash='abc')
+
+        report = json.loads(p.dumps())
+
+        self.assertEqual(report['functions'][0]['contract'], 'currency')
+        self.assertEqual(report['functions'][0]['calls'], 1)
+        self.assertEqual(report['slowest'][0]['hash'], 'abc')
+
+    def test_reset_clears_everything(self):
+        p = profiling.ContractProfiler(enabled=True)
+        p.record('c', 'f', 1, stamps=0, writes=0)
+
+        p.reset()
+
+        self.assertEqual(p.stats, {})
+        self.assertEqual(p.top(), [])
+
+
+class TestProfileMetrics(TestCase):
+    def test_metrics_render_profiler_stats(self):
+        r = metrics.Registry()
+        p = profiling.ContractProfiler(enabled=True)
+        profiling.register_metrics(p, r)
+
+        p.record('currency', 'transfer', 0.5, stamps=10, writes=2, tx_hash='abc')
+
+        out = r.render()
+
+        self.assertIn('# TYPE cilantro_contract_calls_total counter', out)
+        self.assertIn('cilantro_contract_calls_total{contract="currency",function="transfer"} 1.0', out)
+        self.assertIn('cilantro_contract_stamps_total{contract="currency",function="transfer"} 10.0', out)
+        self.assertIn('# TYPE cilantro_contract_max_seconds gauge', out)
+        self.assertIn(
+            'cilantro_contract_slowest_tx_seconds{rank="0",contract="currency",function="transfer",hash="abc"} 0.5',
+            out
+        )
+
+    def test_registering_twice_fails(self):
+        r = metrics.Registry()
+        p = profiling.ContractProfiler()
+        profiling.register_metrics(p, r)
+
+        with self.assertRaises(AssertionError):
+            profiling.register_metrics(p, r)
+
+    def test_global_profiler_is_registered(self):
+        self.assertIsNotNone(metrics.REGISTRY.get('cilantro_contract_calls_total'))
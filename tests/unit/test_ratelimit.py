@@ -0,0 +1,62 @@
+from unittest import TestCase
+from cilantro_ee.nodes.masternode.ratelimit import TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucketLimiter(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.limiter = TokenBucketLimiter(rate=2, burst=4, clock=self.clock)
+
+    def test_burst_then_refuse(self):
+        for _ in range(4):
+            self.assertTrue(self.limiter.allow('a'))
+
+        self.assertFalse(self.limiter.allow('a'))
+
+    def test_refills_at_rate(self):
+        for _ in range(4):
+            self.limiter.allow('a')
+
+        self.clock.now = 1
+
+        self.assertTrue(self.limiter.allow('a'))
+        self.assertTrue(self.limiter.allow('a'))
+        self.assertFalse(self.limiter.allow('a'))
+
+    def test_never_refills_past_burst(self):
+        self.clock.now = 1000
+
+        self.assertEqual(self.limiter.available('a'), 4)
+
+    def test_keys_are_independent(self):
+        for _ in range(4):
+            self.limiter.allow('a')
+
+        self.assertTrue(self.limiter.allow('b'))
+
+    def test_refused_cost_takes_nothing(self):
+        self.assertFalse(self.limiter.allow('a', cost=5))
+        self.assertEqual(self.limiter.available('a'), 4)
+
+    def test_retry_after(self):
+        for _ in range(4):
+            self.limiter.allow('a')
+
+        self.assertEqual(self.limiter.retry_after('a'), 1)
+        self.assertEqual(self.limiter.retry_after('a', cost=4), 2)
+
+    def test_keys_are_bounded(self):
+        limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2, clock=self.clock)
+
+        for key in ['a', 'b', 'c']:
+            limiter.allow(key)
+
+        self.assertEqual(list(limiter.buckets.keys()), ['b', 'c'])
@@ -1,6 +1,8 @@
 from unittest import TestCase
 from cilantro_ee import rewards
 from contracting.client import ContractingClient
+from contracting.db.driver import ContractDriver, InMemDriver
+from contracting.stdlib.bridge.decimal import ContractingDecimal
 from cilantro_ee.contracts import sync
 import cilantro_ee
 
@@ -220,3 +222,78 @@ class TestRewards(TestCase):
         current_balance = self.client.get_var(contract='currency', variable='balances', arguments=['xxx'], mark=False)
         self.assertEqual(current_balance, f)
 
+
+
+def make_block(number, stamps):
+    return {
+        'number': number,
+        'subblocks': [{'transactions': [{'stamps_used': s} for s in stamps]}]
+    }
+
+
+class TestBatchedRewards(TestCase):
+    def setUp(self):
+        self.legacy = ContractingClient(driver=ContractDriver(driver=InMemDriver()))
+        self.batched = ContractingClient(driver=ContractDriver(driver=InMemDriver()))
+
+        for client in (self.legacy, self.batched):
+            # 'stu' is both a masternode and the foundation owner so one recipient gets two rewards
+            sync.setup_genesis_contracts(['stu', 'raghu', 'steve'], ['tejas', 'alex', 'stu'], client=client)
+            client.set_var(contract='rewards', variable='S', arguments=['value'], value=[0.37, 0.41, 0.13, 0.09])
+            client.set_var(contract='foundation', variable='owner', value='stu')
+            client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=33)
+            client.set_var(contract='currency', variable='balances', arguments=['raghu'], value=ContractingDecimal('0.12345678'))
+
+    def legacy_issue(self, block):
+        tau = rewards.RewardManager.calculate_tau_to_split(block, client=self.legacy)
+        m, d, f = rewards.RewardManager.calculate_all_rewards(tau, self.legacy)
+        rewards.RewardManager.distribute_rewards(m, d, f, self.legacy)
+
+    def assertBalancesEqual(self):
+        for vk in ['stu', 'raghu', 'steve', 'tejas', 'alex']:
+            legacy = self.legacy.get_var(contract='currency', variable='balances', arguments=[vk], mark=False)
+            batched = self.batched.get_var(contract='currency', variable='balances', arguments=[vk], mark=False)
+            self.assertEqual(str(legacy), str(batched), vk)
+
+    def test_batched_matches_legacy_exactly(self):
+        block = make_block(1, [1001, 2777, 3, 45_678])
+
+        self.legacy_issue(block)
+        rewards.RewardManager().issue_rewards(block, client=self.batched)
+
+        self.assertBalancesEqual()
+
+    def test_batched_matches_legacy_over_many_blocks(self):
+        manager = rewards.RewardManager()
+
+        for i in range(1, 21):
+            block = make_block(i, [i * 997, 13, 7 * i])
+            self.legacy_issue(block)
+            manager.issue_rewards(block, client=self.batched)
+
+        self.assertBalancesEqual()
+
+    def test_overlapping_roles_get_one_delta(self):
+        deltas = rewards.RewardManager.calculate_reward_deltas(make_block(1, [3300]), self.batched)
+
+        self.assertEqual(sorted(deltas.keys()), ['alex', 'raghu', 'steve', 'stu', 'tejas'])
+
+    def test_accumulated_rewards_settle_to_same_balances(self):
+        manager = rewards.RewardManager(settle_every=5)
+
+        for i in range(1, 11):
+            block = make_block(i, [i * 1234, 99])
+            self.legacy_issue(block)
+            manager.issue_rewards(block, client=self.batched)
+
+            if i % 5 != 0:
+                self.assertIsNotNone(self.batched.raw_driver.get(rewards.PENDING_REWARDS_KEY))
+
+        self.assertIsNone(self.batched.raw_driver.get(rewards.PENDING_REWARDS_KEY))
+        self.assertBalancesEqual()
+
+    def test_accumulated_rewards_not_paid_before_settlement(self):
+        manager = rewards.RewardManager(settle_every=5)
+        manager.issue_rewards(make_block(1, [3300]), client=self.batched)
+
+        self.assertIsNone(self.batched.get_var(contract='currency', variable='balances', arguments=['alex'], mark=False))
@@ -0,0 +1,72 @@
+from unittest import TestCase
+from cilantro_ee.nodes.masternode import simulation
+from contracting.client import ContractingClient
+from contracting.db.driver import ContractDriver, Driver
+from contracting.db.encoder import decode
+
+CODE = '''
+counter = Variable()
+
+@construct
+def seed():
+    counter.set(0)
+
+@export
+def increment(amount: int):
+    counter.set(counter.get() + amount)
+    return counter.get()
+'''
+
+
+class TestSimulate(TestCase):
+    def setUp(self):
+        self.client = ContractingClient(driver=ContractDriver(driver=Driver(collection='test-simulation')))
+        self.client.flush()
+        self.client.submit(CODE, name='testing')
+        self.client.set_var(contract='currency', variable='balances', arguments=['stu'], value=100)
+        self.client.raw_driver.commit()
+
+        simulation.init_worker(collection='test-simulation')
+
+    def tearDown(self):
+        self.client.flush()
+
+    def simulate(self, **kwargs):
+        args = {
+            'sender': 'stu',
+            'contract': 'testing',
+            'function': 'increment',
+            'kwargs': {'amount': 5},
+            'stamps': None,
+            'stamp_cost': 20_000,
+            'timestamp': 0,
+            'block_hash': '0' * 64,
+            'block_num': 1
+        }
+        args.update(kwargs)
+        return decode(simulation.simulate(**args))
+
+    def test_reports_result_writes_and_stamps(self):
+        output = self.simulate()
+
+        self.assertEqual(output['status'], 0)
+        self.assertEqual(output['result'], '5')
+        self.assertIn({'key': 'testing.counter', 'value': 5}, output['writes'])
+        self.assertGreater(output['stamps_used'], 0)
+
+    def test_nothing_is_committed(self):
+        self.simulate()
+        self.simulate()
+
+        self.assertEqual(self.client.raw_driver.driver.get('testing.counter'), 0)
+        self.assertEqual(self.simulate()['result'], '5')
+
+    def test_failure_is_reported(self):
+        output = self.simulate(function='nothing')
+
+        self.assertEqual(output['status'], 1)
+
+    def test_sender_without_balance_fails(self):
+        output = self.simulate(sender='nobody')
+
+        self.assertEqual(output['status'], 1)
@@ -1,6 +1,8 @@
 from cilantro_ee import storage
-from contracting.db.driver import ContractDriver
+from contracting.db.driver import ContractDriver, InMemDriver, Driver
+from contracting.client import ContractingClient
 from unittest import TestCase
+import json
 
 from cilantro_ee.storage import BlockStorage
 
@@ -444,6 +446,134 @@ class TestUpdatingState(TestCase):
         self.assertEqual(v5, 'else')
 
 
+def block_with_txs(number, stamps):
+    return {
+        'hash': f'{number}' * 4,
+        'number': number,
+        'previous': f'{number - 1}' * 4,
+        'subblocks': [{
+            'subblock': 0,
+            'input_hash': 'i' * 4,
+            'merkle_leaves': ['root', 'l1', 'l2'],
+            'transactions': [{'hash': f'{number}-{i}', 'stamps_used': s} for i, s in enumerate(stamps)]
+        }]
+    }
+
+
+class TestBlockHeaders(TestCase):
+    def setUp(self):
+        self.db = BlockStorage()
+        self.db.drop_collections()
+
+    def tearDown(self):
+        self.db.drop_collections()
+
+    def test_header_from_block_summarizes(self):
+        header = storage.header_from_block(block_with_txs(3, [10, 20]))
+
+        self.assertEqual(header, {
+            'hash': '3333',
+            'number': 3,
+            'previous': '2222',
+            'transactions': 2,
+            'stamps_used': 30,
+            'subblocks': [{'subblock': 0, 'input_hash': 'iiii', 'merkle_root': 'root', 'transactions': 2}]
+        })
+
+    def test_store_block_writes_header(self):
+        self.db.store_block(block_with_txs(1, [5]))
+
+        self.assertEqual(self.db.get_headers(1, 1), [storage.header_from_block(block_with_txs(1, [5]))])
+
+    def test_get_headers_range_is_inclusive_and_ordered(self):
+        for i in [3, 1, 2, 4]:
+            self.db.store_block(block_with_txs(i, [i]))
+
+        headers = self.db.get_headers(2, 3)
+
+        self.assertEqual([h['number'] for h in headers], [2, 3])
+
+    def test_rebuild_indexes_backfills_headers_from_blocks(self):
+        for i in range(1, 4):
+            self.db.put(block_with_txs(i, [i]))
+
+        self.assertEqual(self.db.get_headers(1, 3), [])
+
+        self.db.rebuild_indexes()
+
+        self.assertEqual([h['number'] for h in self.db.get_headers(1, 3)], [1, 2, 3])
+
+
+def block_from(number, senders):
+    return {
+        'hash': f'{number}' * 4,
+        'number': number,
+        'previous': f'{number - 1}' * 4,
+        'subblocks': [{
+            'subblock': 0,
+            'transactions': [{
+                'hash': f'{number}-{i}',
+                'transaction': {'payload': {'sender': sender, 'contract': 'currency', 'function': 'transfer'}}
+            } for i, sender in enumerate(senders)]
+        }]
+    }
+
+
+class TestTxHistory(TestCase):
+    def setUp(self):
+        self.db = BlockStorage()
+        self.db.drop_collections()
+
+        for i in range(1, 5):
+            self.db.store_block(block_from(i, ['stu', 'jeff', 'stu']))
+
+    def tearDown(self):
+        self.db.drop_collections()
+
+    def test_get_tx_hides_chain_position(self):
+        tx = self.db.get_tx('1-0')
+
+        self.assertNotIn(storage.TX_BLOCK, tx)
+        self.assertNotIn(storage.TX_POSITION, tx)
+
+    def test_history_is_newest_first(self):
+        txs = list(self.db.get_tx_history(limit=4))
+
+        self.assertEqual([tx['hash'] for tx in txs], ['4-2', '4-1', '4-0', '3-2'])
+
+    def test_history_filters_by_sender(self):
+        txs = list(self.db.get_tx_history(sender='jeff'))
+
+        self.assertEqual([tx['hash'] for tx in txs], ['4-1', '3-1', '2-1', '1-1'])
+
+    def test_history_filters_by_contract_and_function(self):
+        self.assertEqual(len(list(self.db.get_tx_history(contract='currency', function='transfer'))), 12)
+        self.assertEqual(len(list(self.db.get_tx_history(contract='currency', function='approve'))), 0)
+
+    def test_history_pages_with_cursor(self):
+        seen = []
+        before = None
+        while True:
+            page = list(self.db.get_tx_history(sender='stu', before=before, limit=3))
+            if len(page) == 0:
+                break
+
+            seen.extend(tx['hash'] for tx in page)
+            before = (page[-1][storage.TX_BLOCK], page[-1][storage.TX_POSITION])
+
+        self.assertEqual(seen, ['4-2', '4-0', '3-2', '3-0', '2-2', '2-0', '1-2', '1-0'])
+
+    def test_rebuild_indexes_backfills_positions(self):
+        self.db.drop_collections()
+        self.db.put(block_from(1, ['stu', 'jeff']))
+        for tx in block_from(1, ['stu', 'jeff'])['subblocks'][0]['transactions']:
+            self.db.put(tx, BlockStorage.TX)
+
+        self.db.rebuild_indexes()
+
+        self.assertEqual([tx['hash'] for tx in self.db.get_tx_history(before=(1, 1))], ['1-0'])
+
+
 class TestMasterStorage(TestCase):
     def setUp(self):
         self.db = BlockStorage()
@@ -707,3 +837,229 @@ class TestMasterStorage(TestCase):
 
     def test_get_block_v_none_returns_none(self):
         self.assertIsNone(self.db.get_block())
+
+
+class TestGovernanceCache(TestCase):
+    def setUp(self):
+        self.client = ContractingClient(driver=ContractDriver(driver=InMemDriver()))
+        self.client.set_var(contract='masternodes', variable='S', arguments=['members'], value=['a', 'b'])
+        self.client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=20_000)
+        self.client.set_var(contract='currency', variable='balances', arguments=['a'], value=100)
+
+        self.cache = storage.GovernanceCache(client=self.client)
+
+    def block_writing(self, key, value):
+        return {
+            'subblocks': [{
+                'transactions': [{
+                    'state': [{'key': key, 'value': value}]
+                }]
+            }]
+        }
+
+    def test_governance_value_read_through(self):
+        self.assertEqual(self.cache.get_var(contract='masternodes', variable='S', arguments=['members']), ['a', 'b'])
+        self.assertIn('masternodes.S:members', self.cache.values)
+
+    def test_cached_value_survives_direct_writes_until_invalidated(self):
+        self.cache.get_var(contract='stamp_cost', variable='S', arguments=['value'])
+
+        self.client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=1)
+
+        self.assertEqual(self.cache.get_var(contract='stamp_cost', variable='S', arguments=['value']), 20_000)
+
+        self.cache.invalidate_block(self.block_writing('stamp_cost.S:value', 1))
+
+        self.assertEqual(self.cache.get_var(contract='stamp_cost', variable='S', arguments=['value']), 1)
+
+    def test_block_without_governance_writes_keeps_cache(self):
+        self.cache.get_var(contract='masternodes', variable='S', arguments=['members'])
+
+        self.cache.invalidate_block(self.block_writing('currency.balances:a', 50))
+
+        self.assertIn('masternodes.S:members', self.cache.values)
+
+    def test_other_keys_are_not_cached(self):
+        self.assertEqual(self.cache.get_var(contract='currency', variable='balances', arguments=['a']), 100)
+
+        self.client.set_var(contract='currency', variable='balances', arguments=['a'], value=5)
+
+        self.assertEqual(self.cache.get_var(contract='currency', variable='balances', arguments=['a']), 5)
+        self.assertEqual(len(self.cache.values), 0)
+
+    def test_clear(self):
+        self.cache.get_var(contract='masternodes', variable='S', arguments=['members'])
+        self.cache.clear()
+
+        self.assertEqual(len(self.cache.values), 0)
+
+    def test_passes_through_other_client_methods(self):
+        self.cache.set_var(contract='currency', variable='balances', arguments=['b'], value=7)
+
+        self.assertEqual(self.client.get_var(contract='currency', variable='balances', arguments=['b']), 7)
+
+
+CONTRACT = '''
+v = Variable()
+
+@export
+def get():
+    return v.get()
+'''
+
+
+class TestContractCache(TestCase):
+    def setUp(self):
+        self.client = ContractingClient(driver=ContractDriver(driver=InMemDriver()))
+        self.client.flush()
+        self.client.submit(CONTRACT, name='testing')
+
+        self.cache = storage.ContractCache(client=self.client)
+
+    def block_writing(self, key, value):
+        return {'subblocks': [{'transactions': [{'state': [{'key': key, 'value': value}]}]}]}
+
+    def test_get_parses_once(self):
+        entry = self.cache.get('testing')
+
+        self.assertEqual([m['name'] for m in json.loads(entry['methods'])['methods']], ['get'])
+        self.assertEqual(json.loads(entry['variables'])['variables'], ['v'])
+        self.assertIs(self.cache.get('testing'), entry)
+
+    def test_missing_contract_is_none_and_not_cached(self):
+        self.assertIsNone(self.cache.get('nothing'))
+        self.assertNotIn('nothing', self.cache.entries)
+
+    def test_new_code_invalidates(self):
+        self.cache.get('testing')
+        self.cache.get_names()
+
+        self.cache.invalidate_block(self.block_writing('testing.__code__', 'different code'))
+
+        self.assertNotIn('testing', self.cache.entries)
+        self.assertIsNone(self.cache.names)
+
+    def test_same_code_keeps_entry(self):
+        entry = self.cache.get('testing')
+
+        self.cache.invalidate_block(self.block_writing('testing.__code__', self.client.raw_driver.get_contract('testing')))
+
+        self.assertIs(self.cache.get('testing'), entry)
+
+    def test_other_writes_keep_entry(self):
+        self.cache.get('testing')
+
+        self.cache.invalidate_block(self.block_writing('testing.v', 1))
+
+        self.assertIn('testing', self.cache.entries)
+
+
+class TestTxStatusIndex(TestCase):
+    def setUp(self):
+        self.index = storage.TxStatusIndex(collection='test_tx_status')
+        self.index.flush()
+
+    def tearDown(self):
+        self.index.flush()
+
+    def block(self, number, hashes, input_hash='i' * 64):
+        return {'number': number, 'subblocks': [
+            {'input_hash': input_hash, 'transactions': [{'hash': h, 'status': 0} for h in hashes]}
+        ]}
+
+    def test_pending_then_batched(self):
+        self.index.pending(['a'])
+        self.assertEqual(self.index.get('a')['status'], storage.TX_PENDING)
+
+        self.index.batched('i' * 64, ['a'])
+        self.assertEqual(self.index.get('a')['status'], storage.TX_BATCHED)
+
+    def test_finalize_marks_included_and_drops_rejected(self):
+        self.index.batched('i' * 64, ['a', 'b'])
+
+        rejected = self.index.finalize_block(self.block(5, ['a']))
+
+        self.assertEqual(list(rejected), ['b'])
+
+        a = self.index.get('a')
+        self.assertEqual((a['status'], a['block'], a['code']), (storage.TX_IN_BLOCK, 5, 0))
+
+        b = self.index.get('b')
+        self.assertEqual(b['status'], storage.TX_DROPPED)
+        self.assertEqual(b['reason'], 'Rejected by delegates in block 5.')
+
+        self.assertEqual(self.index.in_flight, {})
+
+    def test_batches_not_in_block_stay_in_flight(self):
+        self.index.batched('i' * 64, ['a'])
+        self.index.batched('j' * 64, ['b'])
+
+        self.index.finalize_block(self.block(5, ['a']))
+
+        self.assertEqual(self.index.get('b')['status'], storage.TX_BATCHED)
+        self.assertEqual(self.index.in_flight, {'j' * 64: {'b'}})
+
+    def test_dropped_marks_whole_batch(self):
+        self.index.batched('i' * 64, ['a', 'b'])
+
+        records = self.index.dropped('i' * 64, 'Lost.')
+
+        self.assertEqual(set(records), {'a', 'b'})
+
+        self.assertEqual(self.index.get('a'), self.index.get('b'))
+        self.assertEqual(self.index.get('a')['reason'], 'Lost.')
+        self.assertEqual(self.index.in_flight, {})
+
+    def test_final_states_survive_restart(self):
+        self.index.pending(['p'])
+        self.index.batched('i' * 64, ['a', 'b'])
+        self.index.finalize_block(self.block(1, ['a']))
+
+        restarted = storage.TxStatusIndex(collection='test_tx_status')
+
+        self.assertEqual(restarted.get('a')['status'], storage.TX_IN_BLOCK)
+        self.assertEqual(restarted.get('b')['status'], storage.TX_DROPPED)
+        self.assertIsNone(restarted.get('p'))
+
+    def test_cache_is_bounded(self):
+        index = storage.TxStatusIndex(collection='test_tx_status', max_cached=2)
+
+        index.pending(['a', 'b', 'c'])
+
+        self.assertEqual(list(index.cache.keys()), ['b', 'c'])
+
+
+class TestIteratePrefix(TestCase):
+    def setUp(self):
+        self.driver = Driver(collection='test-iterate')
+        self.driver.flush()
+
+        for i in range(5):
+            self.driver.set(f'currency.balances:{i}', i)
+
+        self.driver.set('currency.balances_old:0', 100)
+        self.driver.set('currency.allowances:0', 100)
+
+    def tearDown(self):
+        self.driver.flush()
+
+    def test_only_returns_keys_under_prefix_in_order(self):
+        items = storage.iterate_prefix(self.driver, 'currency.balances:')
+
+        self.assertEqual(items, [(f'currency.balances:{i}', i) for i in range(5)])
+
+    def test_limit_and_after_page(self):
+        first = storage.iterate_prefix(self.driver, 'currency.balances:', limit=2)
+        second = storage.iterate_prefix(self.driver, 'currency.balances:', after=first[-1][0], limit=2)
+
+        self.assertEqual([k for k, _ in first + second], [f'currency.balances:{i}' for i in range(4)])
+
+    def test_get_many_skips_missing_keys(self):
+        values = storage.get_many(self.driver, ['currency.balances:1', 'currency.balances:3', 'currency.balances:x'])
+
+        self.assertEqual(values, {'currency.balances:1': 1, 'currency.balances:3': 3})
+
+    def test_after_outside_prefix_starts_at_prefix(self):
+        items = storage.iterate_prefix(self.driver, 'currency.balances:', after='a')
+
+        self.assertEqual(len(items), 5)
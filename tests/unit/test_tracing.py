@@ -0,0 +1,110 @@
+from unittest import TestCase
+from cilantro_ee import tracing
+import json
+import os
+import tempfile
+
+
+class TestTracer(TestCase):
+    def test_span_records_name_block_and_tags(self):
+        t = tracing.Tracer(node='abc')
+
+        with t.span('send_work', block=5, peers='delegates'):
+            pass
+
+        self.assertEqual(len(t.spans), 1)
+
+        s = t.spans[0]
+        self.assertEqual(s.name, 'send_work')
+        self.assertEqual(s.block, 5)
+        self.assertEqual(s.tags, {'peers': 'delegates'})
+        self.assertGreaterEqual(s.end, s.start)
+
+    def test_span_recorded_if_exception_raised(self):
+        t = tracing.Tracer()
+
+        with self.assertRaises(ValueError):
+            with t.span('execute_work', block=1):
+                raise ValueError
+
+        self.assertEqual(len(t.spans), 1)
+
+    def test_disabled_tracer_records_nothing(self):
+        t = tracing.Tracer(enabled=False)
+
+        with t.span('send_work', block=1):
+            pass
+
+        t.record('x', 0, 1)
+
+        self.assertEqual(len(t.spans), 0)
+
+    def test_ring_buffer_drops_oldest(self):
+        t = tracing.Tracer(max_spans=3)
+
+        for i in range(5):
+            t.record('phase', i, i + 1, block=i)
+
+        self.assertEqual([s.block for s in t.spans], [2, 3, 4])
+
+    def test_spans_for_block(self):
+        t = tracing.Tracer()
+
+        t.record('a', 0, 1, block=1)
+        t.record('b', 1, 2, block=2)
+        t.record('c', 2, 3, block=1)
+
+        self.assertEqual([s.name for s in t.spans_for_block(1)], ['a', 'c'])
+
+    def test_chrome_trace_format(self):
+        t = tracing.Tracer(node='abc')
+        t.record('gather_subblocks', 1.5, 2.0, block=7)
+
+        trace = t.to_chrome_trace()
+
+        meta, event = trace['traceEvents']
+
+        self.assertEqual(meta['ph'], 'M')
+        self.assertEqual(meta['args'], {'name': 'abc'})
+
+        self.assertEqual(event['name'], 'gather_subblocks')
+        self.assertEqual(event['ph'], 'X')
+        self.assertEqual(event['ts'], 1_500_000)
+        self.assertEqual(event['dur'], 500_000)
+        self.assertEqual(event['args'], {'node': 'abc', 'block': 7})
+
+    def test_dump_writes_json(self):
+        t = tracing.Tracer(node='abc')
+        t.record('a', 0, 1, block=1)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'trace.json')
+            t.dump(path)
+
+            with open(path) as f:
+                self.assertEqual(json.load(f), t.to_chrome_trace())
+
+
+class TestMergeTraces(TestCase):
+    def test_merge_assigns_process_per_node(self):
+        a = tracing.Tracer(node='master')
+        b = tracing.Tracer(node='delegate')
+
+        a.record('send_work', 0, 1, block=1)
+        b.record('execute_work', 1, 2, block=1)
+
+        merged = tracing.merge_chrome_traces([a.to_chrome_trace(), b.to_chrome_trace()])
+
+        pids = {e['args']['node']: e['pid'] for e in merged['traceEvents'] if e['ph'] == 'X'}
+
+        self.assertEqual(pids, {'master': 0, 'delegate': 1})
+        self.assertEqual(len(merged['traceEvents']), 4)
+
+    def test_merge_does_not_mutate_inputs(self):
+        a = tracing.Tracer(node='master')
+        a.record('send_work', 0, 1, block=1)
+
+        trace = a.to_chrome_trace()
+        tracing.merge_chrome_traces([{'traceEvents': []}, trace])
+
+        self.assertEqual(trace['traceEvents'][1]['pid'], 0)
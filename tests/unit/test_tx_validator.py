@@ -395,3 +395,82 @@ class TestValidator(TestCase):
             client=client,
             nonces=self.driver
         )
+
+
+class TestValidateBatch(TestCase):
+    def setUp(self):
+        self.driver = storage.NonceStorage()
+        self.driver.flush()
+
+        self.client = ContractingClient()
+        self.client.flush()
+
+        self.client.set_var(contract='stamp_cost', variable='S', arguments=['value'], value=20_000)
+
+    def tearDown(self):
+        self.driver.flush()
+        self.client.flush()
+
+    def funded(self):
+        w = Wallet()
+        self.client.set_var(contract='currency', variable='balances', arguments=[w.verifying_key], value=1_000_000)
+        return w
+
+    def tx(self, w, nonce, processor='b' * 64):
+        return decode(build_transaction(
+            wallet=w,
+            processor=processor,
+            stamps=123,
+            nonce=nonce,
+            contract='currency',
+            function='transfer',
+            kwargs={'amount': 123, 'to': 'jeff'}
+        ))
+
+    def test_nonces_run_on_within_batch(self):
+        w = self.funded()
+
+        errors, pending = transaction.validate_batch(
+            [self.tx(w, i) for i in range(3)], expected_processor='b' * 64, client=self.client, nonces=self.driver
+        )
+
+        self.assertEqual(errors, [None, None, None])
+        self.assertEqual(pending, {(w.verifying_key, 'b' * 64): 3})
+
+    def test_errors_reported_per_transaction(self):
+        w = self.funded()
+        broke = Wallet()
+
+        bad_signature = self.tx(w, 1)
+        bad_signature['metadata']['signature'] = '0' * 128
+
+        txs = [
+            self.tx(w, 0),
+            bad_signature,
+            self.tx(w, 1, processor='c' * 64),
+            self.tx(broke, 0),
+            self.tx(w, 5),
+            self.tx(w, 1)
+        ]
+
+        errors, pending = transaction.validate_batch(txs, expected_processor='b' * 64, client=self.client, nonces=self.driver)
+
+        self.assertEqual(errors, [
+            None,
+            transaction.TransactionSignatureInvalid,
+            transaction.TransactionProcessorInvalid,
+            transaction.TransactionSenderTooFewStamps,
+            transaction.TransactionNonceInvalid,
+            None
+        ])
+        self.assertEqual(pending, {(w.verifying_key, 'b' * 64): 2})
+
+    def test_matches_single_validation(self):
+        w = self.funded()
+        tx = self.tx(w, 0)
+
+        transaction.transaction_is_valid(transaction=tx, expected_processor='b' * 64, client=self.client, nonces=self.driver)
+        errors, _ = transaction.validate_batch([tx], expected_processor='b' * 64, client=self.client, nonces=self.driver)
+
+        self.assertEqual(errors, [None])
+
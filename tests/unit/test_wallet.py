@@ -1,5 +1,5 @@
 from unittest import TestCase
-from cilantro_ee.crypto.wallet import Wallet, verify
+from cilantro_ee.crypto.wallet import Wallet, verify, verify_batch
 from cilantro_ee.crypto.zbase import bytes_to_zbase32
 
 
@@ -83,4 +83,24 @@ class TestWallet(TestCase):
 
         b = 'priv_' + bytes_to_zbase32(bytes.fromhex(w.signing_key))[:-4]
 
-        self.assertEqual(w.sk_pretty, b)
\ No newline at end of file
+        self.assertEqual(w.sk_pretty, b)
+
+    def test_verify_batch_returns_result_per_item(self):
+        w = Wallet()
+        w2 = Wallet()
+
+        items = [
+            (w.verifying_key, 'hello', w.sign('hello')),
+            (w.verifying_key, 'hello', w2.sign('hello')),
+            (w2.verifying_key, 'there', w2.sign('there')),
+            (w.verifying_key, 'hello', 'not_hex'),
+        ]
+
+        self.assertEqual(verify_batch(items), [True, False, True, False])
+
+    def test_verify_batch_handles_duplicates(self):
+        w = Wallet()
+
+        item = (w.verifying_key, 'hello', w.sign('hello'))
+
+        self.assertEqual(verify_batch([item, item]), [True, True])